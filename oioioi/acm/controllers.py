@@ -1,20 +1,20 @@
 # pylint: disable=W0631
 # W0631 Using possibly undefined loop variable
-import itertools
 import datetime
-from operator import attrgetter, itemgetter
 from collections import defaultdict
 
 from django.template.loader import render_to_string
 from django.template import RequestContext
-from django.contrib.auth.models import User
+from django.contrib.auth.models import User, AnonymousUser
 from django.utils.translation import ugettext_lazy as _
 
+from oioioi.base.utils import memoized_property
 from oioioi.programs.controllers import ProgrammingContestController
 from oioioi.rankings.controllers import DefaultRankingController, \
         CONTEST_RANKING_KEY
 from oioioi.contests.models import SubmissionReport, Submission, \
-        ProblemInstance, UserResultForProblem
+        UserResultForProblem
+from oioioi.acm.models import FrozenUserResultForProblem
 from oioioi.acm.score import BinaryScore, format_time, ACMScore
 from oioioi.contests.utils import is_contest_admin, is_contest_observer, \
         rounds_times
@@ -76,7 +76,8 @@ class ACMContestController(ProgrammingContestController):
                 submission.status = '?'
         submission.save()
 
-    def get_submission_relative_time(self, submission):
+    @memoized_property
+    def _rounds_starts(self):
         # FIXME: SIO-1387 RoundTimes shouldn't require request
         # Workaround by mock Request object
         class DummyRequest(object):
@@ -84,8 +85,15 @@ class ACMContestController(ProgrammingContestController):
                 self.contest = contest
                 self.user = user
 
-        rtimes = rounds_times(DummyRequest(self.contest, submission.user))
-        round_start = rtimes[submission.problem_instance.round].get_start()
+        # Round time extensions do not change the start of a round, so
+        # the times may be determined once for all users.
+        rtimes = rounds_times(DummyRequest(self.contest, AnonymousUser()))
+        return dict((round.id, times.get_start())
+                    for round, times in rtimes.iteritems())
+
+    def get_submission_relative_time(self, submission):
+        round_start = self._rounds_starts[
+                submission.problem_instance.round_id]
         submission_time = submission.date - round_start
         # Python2.6 does not support submission_time.total_seconds()
         return submission_time.days * 24 * 3600 + submission_time.seconds
@@ -118,15 +126,41 @@ class ACMContestController(ProgrammingContestController):
             result.status = None
             return None
 
+    def freeze_user_result_for_problem(self, user, problem_instance,
+            submissions):
+        """Updates the
+           :class:`~oioioi.acm.models.FrozenUserResultForProblem` of the
+           user for the problem instance.
+
+           ``submissions`` should contain the user's submissions (ordered by
+           date) which are taken into account in the ranking; those sent
+           after the freeze time are ignored.
+
+           :returns: the updated result or ``None`` if the round is never
+                     frozen.
+        """
+        freeze_time = self.get_round_freeze_time(problem_instance.round)
+        if freeze_time is None:
+            return None
+        frozen, _created = FrozenUserResultForProblem.objects.get_or_create(
+                user=user, problem_instance=problem_instance,
+                defaults={'freeze_time': freeze_time})
+        frozen.freeze_time = freeze_time
+        self._fill_user_result_for_problem(frozen,
+                [s for s in submissions if s.date < freeze_time])
+        frozen.save()
+        return frozen
+
     def update_user_result_for_problem(self, result):
         submissions = Submission.objects \
                 .filter(problem_instance=result.problem_instance,
                     user=result.user, kind='NORMAL') \
                 .exclude(status__in=IGNORED_STATUSES) \
                 .order_by('date')
+        submissions_list = list(submissions)
 
         last_submission = self._fill_user_result_for_problem(
-                result, submissions)
+                result, submissions_list)
         if last_submission:
             result.submission_report = last_submission \
                     .submissionreport_set.get(status='ACTIVE', kind='FULL')
@@ -139,6 +173,8 @@ class ACMContestController(ProgrammingContestController):
             result.submission_report = None
 
         result.save()
+        self.freeze_user_result_for_problem(result.user,
+                result.problem_instance, submissions_list)
 
     def results_visible(self, request, submission):
         return False
@@ -168,23 +204,6 @@ class ACMContestController(ProgrammingContestController):
         return rtimes.is_active(request.timestamp)
 
 
-class _FakeUserResultForProblem(object):
-    def __init__(self, user, problem_instance):
-        self.problem_instance = problem_instance
-        self.user = user
-
-    @property
-    def user_id(self):
-        return self.user.id
-
-    @property
-    def problem_instance_id(self):
-        return self.problem_instance.id
-
-    def __repr__(self):
-        return str(self.__dict__)
-
-
 class ACMRankingController(DefaultRankingController):
     description = _("ACM style ranking")
 
@@ -203,8 +222,15 @@ class ACMRankingController(DefaultRankingController):
                 if not rtimes.is_future(request.timestamp):
                     yield round
 
-    def render_ranking(self, request, key):
-        data = self.serialize_ranking(request, key)
+    def get_ranking_visibility(self, request, key):
+        visibility = super(ACMRankingController, self) \
+                .get_ranking_visibility(request, key)
+        rounds = self._ranked_rounds(request, key)
+        frozen = [str(round.id)
+                  for round in self._frozen_rounds(request, rounds)]
+        return '%s:%s' % (visibility, ','.join(frozen))
+
+    def _render_ranking_data(self, request, data):
         return render_to_string('acm/acm_ranking.html',
                 context_instance=RequestContext(request, data))
 
@@ -219,27 +245,44 @@ class ACMRankingController(DefaultRankingController):
         return request.contest.controller.registration_controller() \
             .filter_participants(queryset)
 
-    def _get_old_results(self, request, freeze_time, pis, users):
-        controller = request.contest.controller
-        submissions = Submission.objects \
+    def _get_frozen_results(self, request, freeze_time, pis, users):
+        results = list(FrozenUserResultForProblem.objects
                 .filter(problem_instance__in=pis, user__in=users,
-                     kind='NORMAL', date__lt=freeze_time) \
+                        freeze_time=freeze_time)
+                .prefetch_related('problem_instance__round'))
+
+        # Frozen results are missing for users who have not submitted
+        # anything since they were introduced (or since the freeze time was
+        # changed). They are computed here, once.
+        known = set((r.user_id, r.problem_instance_id) for r in results)
+        missing = [key for key in UserResultForProblem.objects
+                   .filter(problem_instance__in=pis, user__in=users)
+                   .values_list('user', 'problem_instance')
+                   if key not in known]
+        if not missing:
+            return results
+
+        controller = request.contest.controller
+        submissions = defaultdict(list)
+        for submission in Submission.objects \
+                .filter(problem_instance__in=pis,
+                        user__in=set(user_id for user_id, _pi_id in missing),
+                        kind='NORMAL', date__lt=freeze_time) \
                 .exclude(status__in=IGNORED_STATUSES) \
-                .select_related('user', 'problem_instance') \
-                .order_by('user', 'problem_instance', 'date')
-        results = []
-        for user, user_submissions in \
-                itertools.groupby(submissions, attrgetter('user')):
-            for pi, user_pi_submissions in itertools.groupby(user_submissions,
-                    attrgetter('problem_instance')):
-                result = _FakeUserResultForProblem(user, pi)
-                controller._fill_user_result_for_problem(result,
-                    user_pi_submissions)
-                results.append(result)
+                .select_related('problem_instance') \
+                .order_by('date'):
+            submissions[(submission.user_id, submission.problem_instance_id)] \
+                    .append(submission)
+        users_by_id = User.objects.in_bulk(
+                [user_id for user_id, _pi_id in missing])
+        pis_by_id = dict((pi.id, pi) for pi in pis)
+        for user_id, pi_id in missing:
+            results.append(controller.freeze_user_result_for_problem(
+                    users_by_id[user_id], pis_by_id[pi_id],
+                    submissions[(user_id, pi_id)]))
         return results
 
-    def serialize_ranking(self, request, key):
-        controller = request.contest.controller
+    def _ranked_rounds(self, request, key):
         rounds = list(self._rounds_for_ranking(request, key))
         # If at least one visible round is not trial we don't want to show
         # trial rounds in default ranking.
@@ -247,41 +290,42 @@ class ACMRankingController(DefaultRankingController):
             not_trial = [r for r in rounds if not r.is_trial]
             if not_trial:
                 rounds = not_trial
+        return rounds
 
-        freeze_times = [controller.get_round_freeze_time(round)
-                        for round in rounds]
-
-        pis = list(ProblemInstance.objects.filter(round__in=rounds)
-                .select_related('problem').prefetch_related('round'))
-        rtopis = defaultdict(lambda: [])
-
-        for pi in pis:
-            rtopis[pi.round].append(pi)
-
-        users = self.filter_users_for_ranking(request, key, User.objects.all())
-
+    def _is_round_frozen(self, request, round):
+        controller = request.contest.controller
+        freeze_time = controller.get_round_freeze_time(round)
+        rtimes = controller.get_round_times(request, round)
+        return not (freeze_time is None or
+                is_contest_admin(request) or
+                rtimes.results_visible(request.timestamp) or
+                request.timestamp <= freeze_time)
+
+    def _frozen_rounds(self, request, rounds):
+        return [round for round in rounds
+                if self._is_round_frozen(request, round)]
+
+    def _get_results(self, request, key, rounds, pis, users):
+        controller = request.contest.controller
         results = []
-        ccontroller = self.contest.controller
-
-        frozen = False
-        for round, freeze_time in zip(rounds, freeze_times):
-            rpis = rtopis[round]
-            rtimes = ccontroller.get_round_times(request, round)
-            if freeze_time is None or \
-                    is_contest_admin(request) or \
-                    rtimes.results_visible(request.timestamp) or \
-                    request.timestamp <= freeze_time:
+        for round in rounds:
+            rpis = [pi for pi in pis if pi.round_id == round.id]
+            if not self._is_round_frozen(request, round):
                 results += UserResultForProblem.objects \
                     .filter(problem_instance__in=rpis, user__in=users) \
                     .prefetch_related('problem_instance__round')
             else:
-                results += self._get_old_results(request, freeze_time,
-                                                 rpis, users)
-                frozen = True
+                freeze_time = controller.get_round_freeze_time(round)
+                results += self._get_frozen_results(request, freeze_time,
+                                                    rpis, users)
+        return results
 
-        data = self._get_users_results(pis, results, rounds, users)
-        self._assign_places(data, itemgetter('sum'))
-        return {'rows': data, 'problem_instances': pis, 'frozen': frozen}
+    def serialize_ranking(self, request, key):
+        data = super(ACMRankingController, self) \
+                .serialize_ranking(request, key)
+        rounds = self._ranked_rounds(request, key)
+        data['frozen'] = bool(self._frozen_rounds(request, rounds))
+        return data
 
 
 class NotificationsMixinForACMContestController(object):
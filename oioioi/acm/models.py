@@ -1,9 +1,32 @@
+from django.contrib.auth.models import User
+from django.db import models
 from django.utils.translation import ugettext_lazy as _
+from oioioi.base.fields import EnumField
 from oioioi.base.utils.deps import check_django_app_dependencies
-from oioioi.contests.models import submission_statuses
+from oioioi.contests.fields import ScoreField
+from oioioi.contests.models import submission_statuses, ProblemInstance
 
 
 check_django_app_dependencies(__name__, ['oioioi.participants'])
 
 
 submission_statuses.register('IGN', _("Ignored"))
+
+
+class FrozenUserResultForProblem(models.Model):
+    """User result for the problem as of the ranking freeze time of its
+       round, i.e. computed only from submissions sent before
+       ``freeze_time``.
+
+       Maintained by
+       :meth:`~oioioi.acm.controllers.ACMContestController.update_user_result_for_problem`
+       and shown to contestants in frozen rankings.
+    """
+    user = models.ForeignKey(User)
+    problem_instance = models.ForeignKey(ProblemInstance)
+    freeze_time = models.DateTimeField()
+    score = ScoreField(blank=True, null=True)
+    status = EnumField(submission_statuses, blank=True, null=True)
+
+    class Meta(object):
+        unique_together = ('user', 'problem_instance')
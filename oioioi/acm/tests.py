@@ -1,9 +1,11 @@
+import json
 from datetime import datetime
 from django.test import TestCase
 from django.core.urlresolvers import reverse
 from django.utils.timezone import utc
 from oioioi.base.tests import fake_time
-from oioioi.contests.models import Contest
+from oioioi.contests.models import Contest, Submission
+from oioioi.acm.models import FrozenUserResultForProblem
 
 # The following tests use full-contest fixture, which may be changed this way:
 # 1. Create new database, do syncdb and migrate
@@ -90,3 +92,46 @@ class TestACMRanking(TestCase):
             for task in ['A', 'sum', 'test']:
                 self.assertTaskIn(task, response.content)
             self.assertNotIn('The ranking is frozen.', response.content)
+
+    def test_ranking_export(self):
+        contest = Contest.objects.get()
+        kwargs = {'contest_id': contest.id, 'key': 'c'}
+
+        self.client.login(username='test_admin')
+        with fake_time(datetime(2013, 12, 15, 9, 0, tzinfo=utc)):
+            response = self.client.get(reverse('ranking_csv', kwargs=kwargs))
+            csv_lines = ''.join(response.streaming_content).splitlines()
+            self.assertIn('Test1,User1', '\n'.join(csv_lines))
+
+            response = self.client.get(reverse('ranking_jsonl',
+                                               kwargs=kwargs))
+            rows = [json.loads(line) for line in
+                    ''.join(response.streaming_content).splitlines()]
+            self.assertEqual(len(rows), len(csv_lines) - 1)
+            self.assertEqual(rows[0]['place'], 1)
+            self.assertIn('%s,%s' % (rows[0]['first_name'],
+                                     rows[0]['last_name']), csv_lines[1])
+
+    def test_frozen_results_are_stored(self):
+        contest = Contest.objects.get()
+        controller = contest.controller
+        url = reverse('default_ranking', kwargs={'contest_id': contest.id})
+
+        self.client.login(username='test_user')
+        with fake_time(datetime(2013, 12, 15, 1, 0, tzinfo=utc)):
+            response = self.client.get(url)
+            self.assertIn('The ranking is frozen.', response.content)
+
+        frozen = FrozenUserResultForProblem.objects.all()
+        self.assertTrue(frozen.exists())
+        for result in frozen:
+            round = result.problem_instance.round
+            self.assertEqual(result.freeze_time,
+                    controller.get_round_freeze_time(round))
+            solved_before_freeze = Submission.objects.filter(
+                    user=result.user,
+                    problem_instance=result.problem_instance,
+                    date__lt=result.freeze_time, status='OK').exists()
+            self.assertEqual(bool(result.score and
+                                  result.score.problems_solved),
+                             solved_before_freeze)
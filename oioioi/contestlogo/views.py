@@ -12,7 +12,7 @@ def last_change(request, image_object):
 
 @condition(last_modified_func=last_change)
 def stream_if_changed(request, image_object):
-    return stream_file(image_object.image)
+    return stream_file(image_object.image, request=request)
 
 
 @cache_control(max_age=1200)
@@ -18,7 +18,9 @@ from oioioi.contests.menu import contest_admin_menu_registry, \
         contest_observer_menu_registry
 from oioioi.contests.models import Contest, Round, ProblemInstance, \
         Submission, ContestAttachment, RoundTimeExtension, ContestPermission, \
-        submission_kinds
+        BulkRejudge, submission_kinds
+from oioioi.contests.tasks import start_bulk_rejudge, resume_bulk_rejudge, \
+        cancel_bulk_rejudge
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
 
 
@@ -362,15 +364,12 @@ class SubmissionAdmin(admin.ModelAdmin):
     score_display.admin_order_field = 'score'
 
     def rejudge_action(self, request, queryset):
-        # Otherwise the submissions are rejudged in their default display
-        # order which is "newest first"
-        queryset = queryset.order_by('id')
-
-        controller = request.contest.controller
-        counter = 0
-        for submission in queryset:
-            controller.judge(submission)
-            counter += 1
+        # The submissions are rejudged in the background, in the order of
+        # their ids (rather than in the default display order, which is
+        # "newest first").
+        rejudge = start_bulk_rejudge(request.contest,
+                queryset.values_list('id', flat=True), creator=request.user)
+        counter = rejudge.total
         self.message_user(
             request,
             ungettext_lazy("Queued one submission for rejudge.",
@@ -410,6 +409,62 @@ contest_observer_menu_registry.register('submissions_admin', _("Submissions"),
         order=40)
 
 
+class BulkRejudgeAdmin(admin.ModelAdmin):
+    list_display = ['id', 'creation_date', 'creator', 'state',
+                    'progress_display', 'last_progress_date', 'eta_display']
+    actions = ['cancel_action', 'resume_action']
+
+    def __init__(self, *args, **kwargs):
+        super(BulkRejudgeAdmin, self).__init__(*args, **kwargs)
+        self.list_display_links = (None, )
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        if obj:
+            return False
+        return is_contest_admin(request)
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def get_actions(self, request):
+        actions = super(BulkRejudgeAdmin, self).get_actions(request)
+        if 'delete_selected' in actions:
+            del actions['delete_selected']
+        return actions
+
+    def progress_display(self, instance):
+        return '%d/%d' % (instance.processed, instance.total)
+    progress_display.short_description = _("Progress")
+
+    def eta_display(self, instance):
+        return instance.get_eta() or ''
+    eta_display.short_description = _("Estimated finish")
+
+    def cancel_action(self, request, queryset):
+        for rejudge in queryset.filter(state='ACTIVE'):
+            cancel_bulk_rejudge(rejudge)
+    cancel_action.short_description = _("Cancel selected rejudges")
+
+    def resume_action(self, request, queryset):
+        for rejudge in queryset.filter(state='ACTIVE'):
+            resume_bulk_rejudge(rejudge)
+    resume_action.short_description = \
+            _("Resume selected rejudges if they are stuck")
+
+    def queryset(self, request):
+        qs = super(BulkRejudgeAdmin, self).queryset(request)
+        return qs.filter(contest=request.contest).select_related('creator')
+
+admin.site.register(BulkRejudge, BulkRejudgeAdmin)
+
+contest_admin_menu_registry.register('bulkrejudge_admin', _("Rejudges"),
+        lambda request: reverse('oioioiadmin:contests_bulkrejudge_changelist'),
+        order=45)
+
+
 class RoundListFilter(SimpleListFilter):
     title = _("round")
     parameter_name = 'round'
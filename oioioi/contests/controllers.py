@@ -2,6 +2,7 @@ from datetime import timedelta
 import json
 import logging
 import pprint
+import time
 
 from django.db import transaction
 from django.template import RequestContext
@@ -36,6 +37,12 @@ def export_entries(registry, values):
     return result
 
 
+def _same_scores(a, b):
+    if a is None or b is None:
+        return a is None and b is None
+    return a.serialize() == b.serialize()
+
+
 def submission_template_context(request, submission):
     controller = submission.problem_instance.contest.controller
     can_see_status = controller.can_see_submission_status(request, submission)
@@ -132,6 +139,15 @@ class PublicContestRegistrationController(RegistrationController):
         return queryset
 
 
+def get_evalmgr_job_options(environ):
+    """Returns the options for sending the evaluation environment to
+       evalmgr.
+    """
+    if environ.get('is_rejudge') and settings.REJUDGE_EVALMGR_QUEUE:
+        return {'queue': settings.REJUDGE_EVALMGR_QUEUE}
+    return {}
+
+
 class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
     """Contains the contest logic and rules.
 
@@ -331,9 +347,10 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
         """
         return {'hidden_judge': _("Visible only for admins")}
 
-    def judge(self, submission, extra_args=None):
+    def judge(self, submission, extra_args=None, is_rejudge=False):
         environ = {}
         environ['extra_args'] = extra_args or {}
+        environ['is_rejudge'] = is_rejudge
         self.fill_evaluation_environ(environ, submission)
 
         extra_steps = [
@@ -369,9 +386,20 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
         environ['recipe'].insert(0, ('wait_for_submission_in_db',
                 'oioioi.contests.handlers.wait_for_submission_in_db'))
 
-        logger.debug("Judging submission #%d with environ:\n %s",
-                submission.id, pprint.pformat(environ, indent=4))
-        async_result = evalmgr.evalmgr_job.delay(environ)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Judging submission #%d with environ:\n %s",
+                    submission.id, pprint.pformat(environ, indent=4))
+        environ['queued_time'] = time.time()
+        self.enqueue_evaluation(submission, environ)
+
+    def enqueue_evaluation(self, submission, environ):
+        """Sends the evaluation environment of the submission to evalmgr.
+
+           May be overridden to postpone sending it, in which case
+           :meth:`submission_queued` should be called once it is sent.
+        """
+        async_result = evalmgr.evalmgr_job.apply_async((environ,),
+                **get_evalmgr_job_options(environ))
         self.submission_queued(submission, async_result)
 
     def finalize_evaluation_environment(self, environ):
@@ -521,6 +549,11 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
            * :class:`~oioioi.contests.models.UserResultForContest`
 
            and then calls proper methods of ContestController to update them.
+
+           Round and contest results are not touched if the problem score
+           does not change. Otherwise they are recalculated while their rows
+           are locked, so that concurrent updates of results for different
+           problems of the same user see each other's scores.
         """
         round = problem_instance.round
         contest = round.contest
@@ -535,7 +568,16 @@ class ContestController(RegisteredSubclassesBase, ObjectWithMixins):
             result, created = UserResultForProblem.objects \
                 .select_for_update() \
                 .get_or_create(user=user, problem_instance=problem_instance)
+            old_score = result.score
             self.update_user_result_for_problem(result)
+            new_score = result.score
+
+        if not created and _same_scores(old_score, new_score) \
+                and UserResultForRound.objects \
+                    .filter(user=user, round=round).exists() \
+                and UserResultForContest.objects \
+                    .filter(user=user, contest=contest).exists():
+            return
 
         # Second: UserResultForRound
         with transaction.commit_on_success():
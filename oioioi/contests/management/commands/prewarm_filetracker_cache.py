@@ -0,0 +1,114 @@
+import calendar
+import os
+import shutil
+import tempfile
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_models, FileField
+from django.db.models.fields import FieldDoesNotExist
+from django.utils.translation import ugettext as _
+
+from oioioi.contests.models import Contest
+from oioioi.filetracker.client import get_client, CachingClient
+from oioioi.filetracker.utils import django_to_filetracker_path
+from oioioi.problems.models import Problem
+
+
+def _problem_files(problem_ids):
+    """Yields the filetracker paths of all the files of the problems,
+       i.e. the files in models with a ``problem`` foreign key, like tests
+       or statements.
+    """
+    for model in get_models():
+        try:
+            field = model._meta.get_field('problem')
+        except FieldDoesNotExist:
+            continue
+        if getattr(field.rel, 'to', None) is not Problem:
+            continue
+        file_fields = [f.name for f in model._meta.fields
+                       if isinstance(f, FileField)]
+        if not file_fields:
+            continue
+        for obj in model.objects.filter(problem__in=problem_ids):
+            for name in file_fields:
+                value = getattr(obj, name)
+                if value:
+                    yield django_to_filetracker_path(value)
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--no-pin', action='store_false', dest='pin',
+            default=True,
+            help="Does not protect the files from being removed from the "
+                "cache until the end of the contest"),
+        make_option('--unpin', action='store_true', dest='unpin',
+            default=False,
+            help="Only allows the files of the contest to be removed from "
+                "the cache"),
+    )
+
+    args = _("<contest_id>")
+    help = _("Downloads all the files of the problems of the given contest "
+             "(tests, checkers, statements etc.) to the local filetracker "
+             "cache (see remote_cache_factory) and protects them from being "
+             "removed from the cache until the end of the contest.")
+
+    requires_model_validation = True
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(_("Expected one argument"))
+        try:
+            contest = Contest.objects.get(id=args[0])
+        except Contest.DoesNotExist:
+            raise CommandError(_("Contest %s does not exist") % (args[0],))
+        client = get_client()
+        if not isinstance(client, CachingClient):
+            raise CommandError(_("FILETRACKER_CLIENT_FACTORY does not use "
+                                 "a local cache"))
+        cache = client.local_store
+        pin_name = 'contest-%s' % (contest.id,)
+
+        if options['unpin']:
+            cache.unpin_files(pin_name)
+            return
+
+        problem_ids = contest.probleminstance_set \
+                .values_list('problem', flat=True)
+        names = set(_problem_files(problem_ids))
+        if options['pin']:
+            end_dates = [r.end_date for r in contest.round_set.all()]
+            if not end_dates or None in end_dates:
+                expires = None
+            else:
+                expires = calendar.timegm(max(end_dates).utctimetuple())
+            cache.pin_files(pin_name, names, expires)
+
+        downloaded = 0
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tmp_path = os.path.join(tmp_dir, 'file')
+            for name in sorted(names):
+                if not cache.exists(name):
+                    client.get_file(name, tmp_path)
+                    os.remove(tmp_path)
+                    downloaded += 1
+        finally:
+            shutil.rmtree(tmp_dir)
+
+        cache.evict()
+        stats = cache.stats()
+        self.stdout.write(_("%(files)d files of the contest, %(downloaded)d "
+                            "downloaded\n") % {
+            'files': len(names),
+            'downloaded': downloaded,
+        })
+        self.stdout.write(_("Cache: %(files)d files, %(size)d bytes, hit "
+                            "ratio: %(ratio).2f\n") % {
+            'files': stats['files'],
+            'size': stats['size'],
+            'ratio': stats['hit_ratio'],
+        })
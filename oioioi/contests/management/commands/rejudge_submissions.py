@@ -0,0 +1,87 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from oioioi.contests.models import Contest, BulkRejudge, Submission
+from oioioi.contests.tasks import start_bulk_rejudge, resume_bulk_rejudge, \
+        cancel_bulk_rejudge
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-p', '--problem', action='store', dest='problem',
+            help="Rejudges only submissions to the problem instance with "
+                "this short name"),
+        make_option('-k', '--kind', action='append', dest='kinds',
+            default=[],
+            help="Rejudges only submissions of this kind (may be given "
+                "multiple times)"),
+        make_option('-e', '--extra-arg', action='append', dest='extra_args',
+            default=[],
+            help="Passes the given extra argument to the judging, e.g. "
+                "incremental_rejudge to run only the changed tests (may be "
+                "given multiple times)"),
+        make_option('--resume', action='store_true', dest='resume',
+            default=False,
+            help="Resumes the active rejudges of the contest"),
+        make_option('--cancel', action='store_true', dest='cancel',
+            default=False,
+            help="Cancels the active rejudges of the contest"),
+        make_option('--status', action='store_true', dest='status',
+            default=False,
+            help="Shows the progress of the rejudges of the contest"),
+    )
+
+    args = _("<contest_id>")
+    help = _("Rejudges submissions of the given contest in the background "
+             "at the rate given by BULK_REJUDGE_RATE, or manages the "
+             "rejudges in progress.")
+
+    requires_model_validation = True
+
+    def _status(self, contest):
+        for rejudge in BulkRejudge.objects.filter(contest=contest):
+            self.stdout.write(_("%(id)d: %(state)s, %(processed)d/%(total)d, "
+                                "estimated finish: %(eta)s\n") % {
+                'id': rejudge.id,
+                'state': rejudge.get_state_display(),
+                'processed': rejudge.processed,
+                'total': rejudge.total,
+                'eta': rejudge.get_eta() or '-'})
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(_("Expected one argument: the contest id"))
+        try:
+            contest = Contest.objects.get(id=args[0])
+        except Contest.DoesNotExist:
+            raise CommandError(_("Contest %s does not exist") % (args[0],))
+
+        if options['status']:
+            self._status(contest)
+            return
+
+        active = BulkRejudge.objects.filter(contest=contest, state='ACTIVE')
+        if options['resume'] or options['cancel']:
+            for rejudge in active:
+                if options['cancel']:
+                    cancel_bulk_rejudge(rejudge)
+                else:
+                    resume_bulk_rejudge(rejudge)
+            self._status(contest)
+            return
+
+        submissions = Submission.objects \
+                .filter(problem_instance__contest=contest)
+        if options['problem']:
+            submissions = submissions.filter(
+                    problem_instance__short_name=options['problem'])
+        if options['kinds']:
+            submissions = submissions.filter(kind__in=options['kinds'])
+        rejudge = start_bulk_rejudge(contest,
+                submissions.values_list('id', flat=True),
+                extra_args=dict((arg, '') for arg in options['extra_args']))
+        self.stdout.write(_("Started rejudge %(id)d of %(count)d "
+                            "submissions\n")
+                % {'id': rejudge.id, 'count': rejudge.total})
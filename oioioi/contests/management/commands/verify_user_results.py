@@ -0,0 +1,106 @@
+from collections import defaultdict
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.translation import ugettext as _
+
+from oioioi.contests.models import Contest, UserResultForProblem, \
+        UserResultForRound, UserResultForContest
+
+
+def _serialize(score):
+    return score and score.serialize()
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--repair', action='store_true', dest='repair',
+            default=False,
+            help="Saves the recalculated results instead of only "
+                "reporting the inconsistent ones"),
+    )
+
+    args = _("[<contest_id> ...]")
+    help = _("Recalculates users' results for rounds and contests from "
+             "their results for problems and reports (or, with --repair, "
+             "fixes) the inconsistent ones. Checks all contests if none is "
+             "given.")
+
+    requires_model_validation = True
+
+    def _verify_result(self, get_or_create, update):
+        result, created = get_or_create()
+        old_score = _serialize(result.score)
+        update(result)
+        return created or old_score != _serialize(result.score)
+
+    def _verify_user(self, contest, user_id, round_ids, repair):
+        """Recalculates results of a single user. Returns the number of
+           inconsistent results.
+        """
+        controller = contest.controller
+        inconsistent = 0
+        with transaction.commit_manually():
+            try:
+                for round_id in round_ids:
+                    inconsistent += self._verify_result(
+                        lambda: UserResultForRound.objects
+                            .select_for_update()
+                            .get_or_create(user_id=user_id,
+                                           round_id=round_id),
+                        controller.update_user_result_for_round)
+                inconsistent += self._verify_result(
+                    lambda: UserResultForContest.objects
+                        .select_for_update()
+                        .get_or_create(user_id=user_id, contest=contest),
+                    controller.update_user_result_for_contest)
+            except:
+                transaction.rollback()
+                raise
+            if repair:
+                transaction.commit()
+            else:
+                transaction.rollback()
+        return inconsistent
+
+    def _verify_contest(self, contest, repair):
+        rounds = defaultdict(set)
+        for user_id, round_id in UserResultForProblem.objects \
+                .filter(problem_instance__contest=contest) \
+                .values_list('user', 'problem_instance__round') \
+                .distinct():
+            rounds[user_id].add(round_id)
+        for user_id, round_id in UserResultForRound.objects \
+                .filter(round__contest=contest) \
+                .values_list('user', 'round'):
+            rounds[user_id].add(round_id)
+        for user_id in UserResultForContest.objects \
+                .filter(contest=contest).values_list('user', flat=True):
+            rounds.setdefault(user_id, set())
+
+        inconsistent = 0
+        for user_id, round_ids in rounds.iteritems():
+            inconsistent += self._verify_user(contest, user_id,
+                    sorted(round_ids), repair)
+
+        if repair:
+            msg = _("%(contest)s: repaired %(count)d results of "
+                    "%(users)d users\n")
+        else:
+            msg = _("%(contest)s: found %(count)d inconsistent results of "
+                    "%(users)d users\n")
+        self.stdout.write(msg % {'contest': contest.id,
+                                 'count': inconsistent,
+                                 'users': len(rounds)})
+
+    def handle(self, *args, **options):
+        contests = Contest.objects.all()
+        if args:
+            contests = contests.filter(id__in=args)
+            missing = set(args) - set(contests.values_list('id', flat=True))
+            if missing:
+                raise CommandError(_("Contest %s does not exist")
+                        % (', '.join(sorted(missing)),))
+        for contest in contests.order_by('id'):
+            self._verify_contest(contest, options['repair'])
@@ -1,4 +1,5 @@
 import itertools
+import json
 import os.path
 
 from django.conf import settings
@@ -278,10 +279,17 @@ submission_report_statuses.register('SUPERSEDED', _("Superseded"))
 
 
 class SubmissionReport(models.Model):
+    """A report of an evaluation of a submission.
+
+       ``cloned_from`` is set for reports copied from another submission
+       instead of evaluating this one.
+    """
     submission = models.ForeignKey(Submission)
     creation_date = models.DateTimeField(auto_now_add=True)
     kind = EnumField(submission_report_kinds, default='FINAL')
     status = EnumField(submission_report_statuses, default='INACTIVE')
+    cloned_from = models.ForeignKey('self', null=True, blank=True,
+            related_name='clones', on_delete=models.SET_NULL)
 
     @property
     def score_report(self):
@@ -414,3 +422,69 @@ class ContestView(models.Model):
 
     def __unicode__(self):
         return u'%s,%s' % (self.user, self.contest)
+
+
+bulk_rejudge_states = EnumRegistry()
+bulk_rejudge_states.register('ACTIVE', _("Active"))
+bulk_rejudge_states.register('FINISHED', _("Finished"))
+bulk_rejudge_states.register('CANCELLED', _("Cancelled"))
+
+
+class BulkRejudge(models.Model):
+    """A rejudge of many submissions, performed in the background by
+       :func:`oioioi.contests.tasks.bulk_rejudge_job`.
+
+       The submissions are judged in the order of ``submission_ids``,
+       ``processed`` of which have already been sent to judging, with
+       the ``extra_args`` (see
+       :meth:`~oioioi.contests.controllers.ContestController.judge`) stored
+       in ``json_extra_args``.
+    """
+    contest = models.ForeignKey(Contest, verbose_name=_("contest"))
+    creator = models.ForeignKey(User, null=True, blank=True,
+            verbose_name=_("creator"))
+    creation_date = models.DateTimeField(default=timezone.now,
+            verbose_name=_("creation date"))
+    state = EnumField(bulk_rejudge_states, default='ACTIVE',
+            verbose_name=_("state"))
+    submission_ids = models.TextField()
+    total = models.IntegerField(verbose_name=_("submissions"))
+    processed = models.IntegerField(default=0,
+            verbose_name=_("rejudged submissions"))
+    last_progress_date = models.DateTimeField(null=True, blank=True,
+            verbose_name=_("last progress"))
+    json_extra_args = models.TextField(default='{}')
+
+    class Meta(object):
+        verbose_name = _("rejudge")
+        verbose_name_plural = _("rejudges")
+        ordering = ('-creation_date',)
+
+    def __unicode__(self):
+        return u'%s: %d/%d' % (self.contest_id, self.processed, self.total)
+
+    def get_submission_ids(self):
+        return [int(id) for id in self.submission_ids.split()]
+
+    def set_submission_ids(self, ids):
+        ids = list(ids)
+        self.submission_ids = ' '.join(str(id) for id in ids)
+        self.total = len(ids)
+
+    def get_extra_args(self):
+        return json.loads(self.json_extra_args)
+
+    def set_extra_args(self, extra_args):
+        self.json_extra_args = json.dumps(extra_args)
+
+    def get_eta(self):
+        """Estimates when all the submissions will be sent to judging,
+           based on the progress so far. Returns ``None`` if unknown.
+        """
+        if self.state != 'ACTIVE' or not self.processed or \
+                not self.last_progress_date:
+            return None
+        elapsed = self.last_progress_date - self.creation_date
+        remaining = self.total - self.processed
+        return self.last_progress_date + \
+                elapsed * remaining / self.processed
@@ -0,0 +1,92 @@
+import logging
+
+from celery.task import task
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from oioioi.contests.models import BulkRejudge, Submission
+
+
+logger = logging.getLogger(__name__)
+
+
+def start_bulk_rejudge(contest, submission_ids, creator=None,
+        extra_args=None):
+    """Creates a :class:`~oioioi.contests.models.BulkRejudge` of the given
+       submissions and starts it in the background.
+
+       The ``extra_args`` are passed to
+       :meth:`~oioioi.contests.controllers.ContestController.judge`.
+    """
+    rejudge = BulkRejudge(contest=contest, creator=creator)
+    rejudge.set_submission_ids(sorted(submission_ids))
+    rejudge.set_extra_args(extra_args or {})
+    # The task must see the rejudge in the database.
+    with transaction.commit_on_success():
+        rejudge.save()
+    bulk_rejudge_job.delay(rejudge.id)
+    return rejudge
+
+
+def resume_bulk_rejudge(rejudge):
+    """Continues an active bulk rejudge, e.g. after the background task
+       has been lost.
+    """
+    bulk_rejudge_job.delay(rejudge.id)
+
+
+def cancel_bulk_rejudge(rejudge):
+    BulkRejudge.objects.filter(id=rejudge.id, state='ACTIVE') \
+            .update(state='CANCELLED')
+
+
+@task
+def bulk_rejudge_job(rejudge_id):
+    """Sends the next ``settings.BULK_REJUDGE_BATCH_SIZE`` submissions of
+       the bulk rejudge to judging and schedules itself for the next batch,
+       so that at most ``settings.BULK_REJUDGE_RATE`` submissions per second
+       are sent.
+
+       The progress is recorded after each submission is sent, so that
+       a task lost in the middle of a batch may be resumed without skipping
+       any submission. If this task runs twice for the same rejudge, the
+       one which fails to record its progress stops, so at most one
+       submission is judged twice.
+    """
+    try:
+        rejudge = BulkRejudge.objects.select_related('contest') \
+                .get(id=rejudge_id)
+    except BulkRejudge.DoesNotExist:
+        return
+    if rejudge.state != 'ACTIVE':
+        return
+
+    start = rejudge.processed
+    end = min(start + settings.BULK_REJUDGE_BATCH_SIZE, rejudge.total)
+    batch = rejudge.get_submission_ids()[start:end]
+    submissions = Submission.objects.filter(id__in=batch,
+            problem_instance__contest=rejudge.contest_id) \
+            .select_related('problem_instance', 'problem_instance__problem',
+                            'problem_instance__round', 'user') \
+            .in_bulk(batch)
+    controller = rejudge.contest.controller
+    extra_args = rejudge.get_extra_args()
+    for processed, submission_id in enumerate(batch, start + 1):
+        # Submissions deleted in the meantime are skipped.
+        if submission_id in submissions:
+            controller.judge(submissions[submission_id], extra_args,
+                    is_rejudge=True)
+        update = dict(processed=processed, last_progress_date=timezone.now())
+        if processed == rejudge.total:
+            update['state'] = 'FINISHED'
+        if not BulkRejudge.objects.filter(id=rejudge_id, state='ACTIVE',
+                processed=processed - 1).update(**update):
+            # Cancelled, or the progress was recorded by another task.
+            return
+    logger.info("Bulk rejudge %d: sent %d/%d submissions", rejudge_id, end,
+            rejudge.total)
+
+    if end < rejudge.total:
+        bulk_rejudge_job.apply_async((rejudge_id,),
+                countdown=float(end - start) / settings.BULK_REJUDGE_RATE)
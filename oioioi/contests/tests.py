@@ -1,16 +1,25 @@
 # pylint: disable=W0223
 # Method %r is abstract in class %r but is not overridden
+import os
+import shutil
+import tempfile
+import time
+import zipfile
 from datetime import datetime
 from functools import partial
+from StringIO import StringIO
+from django.conf import settings
 from django.core import mail
 
-from django.test import TestCase, RequestFactory
+from django.test import TestCase, TransactionTestCase, RequestFactory
 from django.test.utils import override_settings
 from django.template import Template, RequestContext
 from django.http import HttpResponse
 from django.core.exceptions import ValidationError
 from django.core.urlresolvers import reverse
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.utils.timezone import utc, LocalTimezone
 from django.contrib.auth.models import User, AnonymousUser
 from django.contrib.admin.util import quote
@@ -19,13 +28,15 @@ from oioioi.base.tests import check_not_accessible, fake_time, TestsUtilsMixin
 from oioioi.contests.models import Contest, Round, ProblemInstance, \
         UserResultForContest, Submission, ContestAttachment, \
         RoundTimeExtension, ContestPermission, UserResultForProblem, \
-        ContestView
+        ContestView, UserResultForRound, BulkRejudge, SubmissionReport
 from oioioi.contests.scores import IntegerScore
 from oioioi.contests.controllers import ContestController, \
-        RegistrationController, PastRoundsHiddenContestControllerMixin
+        RegistrationController, PastRoundsHiddenContestControllerMixin, \
+        get_evalmgr_job_options
 from oioioi.contests.date_registration import date_registry
 from oioioi.contests.utils import is_contest_admin, is_contest_observer, \
         can_enter_contest
+from oioioi.filetracker.client import CachingClient, get_client
 from oioioi.filetracker.tests import TestStreamingMixin
 from oioioi.problems.models import Problem, ProblemStatement, ProblemAttachment
 from oioioi.programs.controllers import ProgrammingContestController
@@ -485,6 +496,91 @@ class TestMultilingualStatements(TestCase, TestStreamingMixin):
         self.assertStreamingEqual(response, 'en-txt')
 
 
+class TestZipStatement(TestCase, TestStreamingMixin):
+    fixtures = ['test_users', 'test_contest', 'test_full_package']
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+                PROBLEM_STATEMENT_ZIP_CACHE_DIR=self.cache_dir)
+        self.settings_override.enable()
+        archive = StringIO()
+        zip_file = zipfile.ZipFile(archive, 'w')
+        zip_file.writestr('index.html', '<p>Statement</p>')
+        zip_file.writestr('img/figure.png', 'figure')
+        zip_file.writestr('../outside.txt', 'outside')
+        zip_file.close()
+        self.archive = archive.getvalue()
+        self.statement = ProblemStatement(problem=Problem.objects.get())
+        self.statement.content.save('statement.zip',
+                ContentFile(self.archive))
+        pi = ProblemInstance.objects.get()
+        self.kwargs = {'contest_id': pi.contest.id,
+                       'problem_instance': pi.short_name,
+                       'statement_id': self.statement.id}
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir)
+
+    def _extracted_dirs(self):
+        return [name for name in os.listdir(self.cache_dir)
+                if os.path.isdir(os.path.join(self.cache_dir, name))]
+
+    def _url(self, path):
+        return reverse('problem_statement_zip',
+                kwargs=dict(self.kwargs, path=path))
+
+    def test_zip_statement(self):
+        self.client.login(username='test_user')
+        response = self.client.get(reverse('problem_statement_zip_index',
+                kwargs=self.kwargs))
+        self.assertIn('<p>Statement</p>', response.content)
+        self.assertEqual(len(self._extracted_dirs()), 1)
+
+        response = self.client.get(self._url('img/figure.png'))
+        self.assertStreamingEqual(response, 'figure')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('max-age', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.client.get(self._url('img/figure.png'),
+                HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(self._url('missing.txt'))
+                .status_code, 404)
+        self.assertEqual(self.client.get(self._url('../outside.txt'))
+                .status_code, 404)
+
+        # The statement is extracted once.
+        self.statement.content.delete(save=False)
+        response = self.client.get(self._url('img/figure.png'))
+        self.assertStreamingEqual(response, 'figure')
+
+    def test_zip_statement_cleanup(self):
+        self.client.login(username='test_user')
+        self.client.get(self._url('img/figure.png'))
+        old_dir = os.path.join(self.cache_dir, self._extracted_dirs()[0])
+        timeout = settings.PROBLEM_STATEMENT_ZIP_CACHE_TIMEOUT
+        os.utime(old_dir, (time.time() - timeout - 1,) * 2)
+
+        # Extracting a new version removes the unused ones.
+        self.statement.content.save('statement2.zip',
+                ContentFile(self.archive))
+        response = self.client.get(self._url('img/figure.png'))
+        self.assertStreamingEqual(response, 'figure')
+        self.assertEqual(len(self._extracted_dirs()), 1)
+        self.assertFalse(os.path.exists(old_dir))
+        self.assertFalse(os.path.exists(old_dir + '.lock'))
+
+    def test_zip_statement_permissions(self):
+        self.client.login(username='test_user')
+        Round.objects.update(start_date=datetime(2100, 1, 1, tzinfo=utc))
+        response = self.client.get(self._url('img/figure.png'),
+                HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 403)
+
+
 def failing_handler(env):
     raise RuntimeError('EXPECTED FAILURE')
 
@@ -542,6 +638,135 @@ class TestRejudgeAndFailure(TestCase):
         self.assertNotIn('EXPECTED FAILURE', response.content)
 
 
+class TestBulkRejudge(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_submission']
+
+    def setUp(self):
+        # Each evaluation leaves a failure report.
+        contest = Contest.objects.get()
+        contest.controller_name = \
+                'oioioi.contests.tests.BrokenContestController'
+        contest.save()
+
+    def _report_count(self):
+        return SubmissionReport.objects.filter(submission_id=1,
+                kind='FAILURE').count()
+
+    @override_settings(BULK_REJUDGE_BATCH_SIZE=1)
+    def test_rejudge_command(self):
+        reports_before = self._report_count()
+        out = StringIO()
+        call_command('rejudge_submissions', 'c', extra_args=['hidden_judge'],
+                stdout=out)
+        self.assertIn('Started rejudge', out.getvalue())
+
+        rejudge = BulkRejudge.objects.get()
+        self.assertEqual(rejudge.get_extra_args(), {'hidden_judge': ''})
+        self.assertEqual(rejudge.state, 'FINISHED')
+        self.assertEqual(rejudge.processed, rejudge.total)
+        self.assertEqual(rejudge.get_submission_ids(), [1])
+        self.assertEqual(self._report_count(), reports_before + 1)
+
+        out = StringIO()
+        call_command('rejudge_submissions', 'c', status=True, stdout=out)
+        self.assertIn('1/1', out.getvalue())
+
+    def test_cancel(self):
+        from oioioi.contests.tasks import bulk_rejudge_job
+        rejudge = BulkRejudge(contest=Contest.objects.get())
+        rejudge.set_submission_ids([1])
+        rejudge.save()
+        reports_before = self._report_count()
+        call_command('rejudge_submissions', 'c', cancel=True,
+                stdout=StringIO())
+        bulk_rejudge_job.delay(rejudge.id)
+        rejudge = BulkRejudge.objects.get()
+        self.assertEqual(rejudge.state, 'CANCELLED')
+        self.assertEqual(rejudge.processed, 0)
+        self.assertIsNone(rejudge.get_eta())
+        self.assertEqual(self._report_count(), reports_before)
+
+    @override_settings(BULK_REJUDGE_BATCH_SIZE=3)
+    def test_progress_recorded_per_submission(self):
+        from oioioi.contests.tasks import bulk_rejudge_job
+        rejudge = BulkRejudge(contest=Contest.objects.get())
+        rejudge.set_submission_ids([1, 1, 1])
+        rejudge.save()
+        judged = []
+
+        def judge(self, submission, extra_args=None, is_rejudge=False):
+            if len(judged) == 2:
+                raise RuntimeError('EXPECTED FAILURE')
+            judged.append(submission.id)
+
+        original_judge = BrokenContestController.judge
+        BrokenContestController.judge = judge
+        try:
+            with self.assertRaises(RuntimeError):
+                bulk_rejudge_job(rejudge.id)
+            self.assertEqual(BulkRejudge.objects.get().processed, 2)
+            judged.pop()
+            bulk_rejudge_job(rejudge.id)
+        finally:
+            BrokenContestController.judge = original_judge
+        rejudge = BulkRejudge.objects.get()
+        self.assertEqual(rejudge.processed, 3)
+        self.assertEqual(rejudge.state, 'FINISHED')
+
+    def test_rejudge_queue(self):
+        self.assertEqual(get_evalmgr_job_options({'is_rejudge': True}), {})
+        with override_settings(REJUDGE_EVALMGR_QUEUE='evalmgr-lowprio'):
+            self.assertEqual(get_evalmgr_job_options({'is_rejudge': True}),
+                    {'queue': 'evalmgr-lowprio'})
+            self.assertEqual(get_evalmgr_job_options({}), {})
+
+    def test_admin_action(self):
+        self.client.login(username='test_admin')
+        url = reverse('oioioiadmin:contests_submission_changelist')
+        response = self.client.post(url, {'action': 'rejudge_action',
+                '_selected_action': ['1']}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        rejudge = BulkRejudge.objects.get()
+        self.assertEqual(rejudge.state, 'FINISHED')
+        self.assertEqual(self._report_count(), 1)
+        response = self.client.get(
+                reverse('oioioiadmin:contests_bulkrejudge_changelist'))
+        self.assertContains(response, 'Finished')
+
+
+def _caching_client_factory():
+    return CachingClient(TestPrewarmFiletrackerCache.cache_dir, 10 ** 6,
+            remote_store=default_storage.client.local_store)
+
+
+class TestPrewarmFiletrackerCache(TestCase):
+    fixtures = ['test_contest', 'test_full_package']
+
+    def setUp(self):
+        TestPrewarmFiletrackerCache.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    @override_settings(FILETRACKER_CLIENT_FACTORY=
+            'oioioi.contests.tests._caching_client_factory')
+    def test_prewarm(self):
+        test = Problem.objects.get().test_set.all()[0]
+        test_path = '/' + test.input_file.name.versioned_name
+        cache = get_client().local_store
+        self.assertFalse(cache.exists(test_path))
+
+        out = StringIO()
+        call_command('prewarm_filetracker_cache', 'c', stdout=out)
+        self.assertTrue(cache.exists(test_path))
+        self.assertIn(test_path.split('@')[0], cache.pinned_files())
+        self.assertIn('downloaded', out.getvalue())
+
+        call_command('prewarm_filetracker_cache', 'c', unpin=True)
+        self.assertFalse(cache.pinned_files())
+
+
 class TestContestAdmin(TestCase):
     fixtures = ['test_users']
 
@@ -1144,3 +1369,63 @@ class TestDateRegistry(TestCase):
         rounds_count = Round.objects.filter(contest=contest.id).count()
 
         self.assertEqual(registry_length, 3 * rounds_count)
+
+
+class UserResultsMixin(object):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_multiple_submissions']
+
+    def _set_score(self, score):
+        Submission.objects.filter(user=self.user) \
+                .update(kind='NORMAL', score=IntegerScore(score))
+        self.contest.controller.update_user_results(self.user, self.pi)
+
+    def _check_scores(self, score):
+        self.assertEqual(UserResultForRound.objects.get(user=self.user,
+                round=self.pi.round).score, IntegerScore(score))
+        self.assertEqual(UserResultForContest.objects.get(user=self.user,
+                contest=self.contest).score, IntegerScore(score))
+
+    def setUp(self):
+        self.contest = Contest.objects.get()
+        self.pi = ProblemInstance.objects.get()
+        self.user = User.objects.get(username='test_user')
+
+
+class TestUserResultsAggregation(UserResultsMixin, TestCase):
+    def test_update_user_results(self):
+        self._set_score(30)
+        self._check_scores(30)
+        self._set_score(45)
+        self._check_scores(45)
+        self._set_score(45)
+        self._check_scores(45)
+
+    def test_recalculation_from_problem_results(self):
+        # The round and contest results are recalculated from the stored
+        # results, not adjusted, so an earlier inconsistency is fixed.
+        self._set_score(30)
+        UserResultForRound.objects.filter(user=self.user) \
+                .update(score=IntegerScore(100))
+        self._set_score(45)
+        self._check_scores(45)
+
+
+# verify_user_results relies on rolling back its transaction when not
+# repairing, which TestCase does not allow.
+class TestUserResultsVerification(UserResultsMixin, TransactionTestCase):
+    def test_verify_user_results(self):
+        self._set_score(30)
+        UserResultForContest.objects.filter(user=self.user) \
+                .update(score=IntegerScore(7))
+
+        out = StringIO()
+        call_command('verify_user_results', self.contest.id, stdout=out)
+        self.assertIn('found 1 inconsistent', out.getvalue())
+        self.assertEqual(UserResultForContest.objects.get(user=self.user)
+                .score, IntegerScore(7))
+
+        out = StringIO()
+        call_command('verify_user_results', repair=True, stdout=out)
+        self.assertIn('repaired 1', out.getvalue())
+        self._check_scores(30)
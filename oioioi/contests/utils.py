@@ -134,10 +134,18 @@ def visible_rounds(request):
 
 
 def aggregate_statuses(statuses):
-    """Returns first unsuccessful status or 'OK' if all are successful"""
+    """Returns first unsuccessful status or 'OK' if all are successful.
+
+       Statuses of skipped tests (``'SKIP'``) are only returned if there
+       are no other failures, as tests are skipped only because some other
+       test has failed.
+    """
 
     failures = [s for s in statuses if s != 'OK']
-    if failures:
+    real_failures = [s for s in failures if s != 'SKIP']
+    if real_failures:
+        return real_failures[0]
+    elif failures:
         return failures[0]
     else:
         return 'OK'
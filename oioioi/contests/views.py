@@ -1,6 +1,7 @@
 from operator import itemgetter
+import hashlib
+import os
 import sys
-import zipfile
 import mimetypes
 
 from django.conf import settings
@@ -17,6 +18,8 @@ from django.views.decorators.http import require_POST
 from django.http import Http404
 from django.utils.safestring import mark_safe
 from django.core.exceptions import SuspiciousOperation
+from django.core.files import File
+from django.utils.cache import patch_cache_control
 
 from oioioi.base.menu import menu_registry
 from oioioi.base.permissions import not_anonymous, enforce_condition
@@ -27,8 +30,9 @@ from oioioi.contests.models import ProblemInstance, Submission, \
 from oioioi.contests.utils import visible_contests, can_enter_contest, \
         is_contest_admin, has_any_submittable_problem, visible_rounds, \
         visible_problem_instances, contest_exists, get_submission_or_error
-from oioioi.filetracker.utils import stream_file
+from oioioi.filetracker.utils import stream_file, serve_file
 from oioioi.problems.models import ProblemStatement, ProblemAttachment
+from oioioi.problems.utils import get_statement_zip_dir, statement_zip_key
 
 
 def select_contest_view(request):
@@ -89,25 +93,10 @@ def problem_statement_view(request, contest_id, problem_instance):
     if statement.extension == '.zip':
         return redirect('problem_statement_zip_index', contest_id=contest_id,
             problem_instance=problem_instance, statement_id=statement.id)
-    return stream_file(statement.content)
+    return stream_file(statement.content, request=request)
 
 
-@enforce_condition(contest_exists & can_enter_contest)
-def problem_statement_zip_index_view(request, contest_id, problem_instance,
-        statement_id):
-    response = problem_statement_zip_view(request, contest_id,
-            problem_instance, statement_id, 'index.html')
-
-    problem_statement = get_object_or_404(ProblemStatement, id=statement_id)
-
-    return TemplateResponse(request, 'contests/html_statement.html',
-            {'content': mark_safe(response.content),
-             'problem_name': problem_statement.problem.name})
-
-
-@enforce_condition(contest_exists & can_enter_contest)
-def problem_statement_zip_view(request, contest_id, problem_instance,
-        statement_id, path):
+def _get_zip_statement(request, problem_instance, statement_id):
     controller = request.contest.controller
     pi = get_object_or_404(ProblemInstance, round__contest=request.contest,
             short_name=problem_instance)
@@ -119,17 +108,46 @@ def problem_statement_zip_view(request, contest_id, problem_instance,
 
     if statement.extension != '.zip':
         raise SuspiciousOperation
+    return statement
+
 
-    zip = zipfile.ZipFile(statement.content)
-    try:
-        info = zip.getinfo(path)
-    except KeyError:
+def _statement_zip_file(statement, path):
+    directory = get_statement_zip_dir(statement)
+    local_path = os.path.normpath(os.path.join(directory, path))
+    if not local_path.startswith(directory + os.sep) \
+            or not os.path.isfile(local_path):
         raise Http404
+    return local_path
+
+
+@enforce_condition(contest_exists & can_enter_contest)
+def problem_statement_zip_index_view(request, contest_id, problem_instance,
+        statement_id):
+    statement = _get_zip_statement(request, problem_instance, statement_id)
+    with open(_statement_zip_file(statement, 'index.html'), 'rb') as f:
+        content = f.read()
+
+    return TemplateResponse(request, 'contests/html_statement.html',
+            {'content': mark_safe(content),
+             'problem_name': statement.problem.name})
+
+
+@enforce_condition(contest_exists & can_enter_contest)
+def problem_statement_zip_view(request, contest_id, problem_instance,
+        statement_id, path):
+    statement = _get_zip_statement(request, problem_instance, statement_id)
+    local_path = _statement_zip_file(statement, path)
 
     content_type = mimetypes.guess_type(path)[0] or \
         'application/octet-stream'
-    response = HttpResponse(zip.read(path), content_type=content_type)
-    response['Content-Length'] = info.file_size
+    etag = '"%s"' % (hashlib.sha1('%s:%s' % (statement_zip_key(statement),
+            path.encode('utf-8'))).hexdigest(),)
+    response = serve_file(request, File(open(local_path, 'rb')),
+            content_type, etag=etag)
+    # A new version of the statement gets a new id, so the URLs of its
+    # files do not change their content.
+    patch_cache_control(response, private=True,
+            max_age=settings.PROBLEM_STATEMENT_ZIP_MAX_AGE)
     return response
 
 
@@ -205,7 +223,7 @@ def report_view(request, contest_id, submission_id, report_id):
 def rejudge_submission_view(request, contest_id, submission_id):
     submission = get_submission_or_error(request, contest_id, submission_id)
     controller = request.contest.controller
-    controller.judge(submission, request.GET.dict())
+    controller.judge(submission, request.GET.dict(), is_rejudge=True)
     messages.info(request, _("Rejudge request received."))
     return redirect('submission', contest_id=contest_id,
             submission_id=submission_id)
@@ -268,7 +286,7 @@ def contest_attachment_view(request, contest_id, attachment_id):
         id=attachment_id)
     if attachment.round and attachment.round not in visible_rounds(request):
         raise PermissionDenied
-    return stream_file(attachment.content)
+    return stream_file(attachment.content, request=request)
 
 
 @enforce_condition(contest_exists & can_enter_contest)
@@ -278,4 +296,4 @@ def problem_attachment_view(request, contest_id, attachment_id):
     problem_ids = [pi.problem_id for pi in problem_instances]
     if attachment.problem_id not in problem_ids:
         raise PermissionDenied
-    return stream_file(attachment.content)
+    return stream_file(attachment.content, request=request)
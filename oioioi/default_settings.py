@@ -159,6 +159,7 @@ INSTALLED_APPS = (
     'oioioi.questions',
     'oioioi.rankings',
     'oioioi.sioworkers',
+    'oioioi.evalmgr',
     'oioioi.jotform',
     'oioioi.analytics',
     'oioioi.celery',
@@ -204,8 +205,50 @@ NOSE_ARGS = (
 )
 
 SIOWORKERS_BACKEND = 'oioioi.sioworkers.backends.CeleryBackend'
+# Maximum number of sioworkers jobs dispatched at once by a single call to
+# CeleryBackend.run_jobs and the delay (in seconds) between result polls,
+# which grows up to SIOWORKERS_MAX_POLL_INTERVAL while no job finishes.
+SIOWORKERS_BATCH_SIZE = 100
+SIOWORKERS_POLL_INTERVAL = 0.1
+SIOWORKERS_MAX_POLL_INTERVAL = 2
+# Tests with small time limits are run in batches, whose total time limit
+# is at most this many milliseconds, to save the overhead of dispatching
+# a job for each test. The tests of a batch are still run one by one, each
+# in its own sandbox. 0 disables batching.
+SIOWORKERS_BATCH_MAX_TIME = 0
+# Maximum number of jobs run at once by ParallelLocalBackend. None means
+# the number of CPUs.
+SIOWORKERS_LOCAL_CONCURRENCY = None
+# Jobs run by ParallelLocalBackend for longer than this many seconds are
+# killed.
+SIOWORKERS_LOCAL_JOB_TIMEOUT = 1800
+# Latency (in seconds) and weights of the result codes of compile and exec
+# jobs simulated by FakeBackend, which is used for benchmarks.
+SIOWORKERS_FAKE_LATENCY = {'compile': 0., 'exec': 0.}
+SIOWORKERS_FAKE_VERDICTS = {'compile': {'OK': 1}, 'exec': {'OK': 1}}
 FILETRACKER_CLIENT_FACTORY = 'oioioi.filetracker.client.media_root_factory'
+# Used by oioioi.filetracker.client.remote_cache_factory.
+FILETRACKER_URL = None
+FILETRACKER_CACHE_ROOT = None
+FILETRACKER_CACHE_SIZE = 10 * 1024 ** 3
+# In seconds, None means no limit.
+FILETRACKER_CACHE_MAX_AGE = None
 DEFAULT_FILE_STORAGE = 'oioioi.filetracker.storage.FiletrackerStorage'
+# Store files with the same content only once (see FiletrackerStorage).
+FILETRACKER_DEDUPLICATION = False
+# 'X-Sendfile' or 'X-Accel-Redirect' to let the front-end server send the
+# files from the local Filetracker store (see filetracker.utils.serve_file).
+FILETRACKER_SENDFILE = None
+# The internal location of the store's files for X-Accel-Redirect.
+FILETRACKER_SENDFILE_PREFIX = '/filetracker-files/'
+
+# Directory to which the HTML statements (zip files) are extracted. None
+# means a directory in the system temporary directory.
+PROBLEM_STATEMENT_ZIP_CACHE_DIR = None
+# Extracted statements unused for this many seconds are removed.
+PROBLEM_STATEMENT_ZIP_CACHE_TIMEOUT = 7 * 24 * 3600
+# How long (in seconds) browsers may cache the files of HTML statements.
+PROBLEM_STATEMENT_ZIP_MAX_AGE = 24 * 3600
 
 SUPERVISOR_AUTORELOAD_PATTERNS = [".py", ".pyc", ".pyo"]
 
@@ -295,14 +338,66 @@ BROKER_URL = 'django://'
 
 CELERY_IMPORTS += [
     'oioioi.evalmgr',
+    'oioioi.contests.tasks',
+    'oioioi.sioworkers.backends',
 ]
 
 CELERY_ROUTES.update({
     'oioioi.evalmgr.evalmgr_job': dict(queue='evalmgr'),
+    'oioioi.evalmgr.evalmgr_resume_job': dict(queue='evalmgr'),
+    'celery.chord_unlock': dict(queue='evalmgr'),
+    'oioioi.contests.tasks.bulk_rejudge_job': dict(queue='evalmgr'),
+    'oioioi.sioworkers.backends.sioworkers_batch_job':
+        dict(queue='sioworkers'),
 })
 
 # Number of concurrently evaluated submissions
 EVALMGR_CONCURRENCY = 1
+# Do not block evalmgr workers while waiting for sioworkers jobs. Instead,
+# the evaluation is suspended and resumed in a new evalmgr task once the
+# jobs finish (see oioioi.evalmgr.wait_for_jobs).
+EVALMGR_ASYNC_JOBS = False
+# Handlers after which the evaluation environment is saved in the database,
+# so that a redelivered evalmgr task does not start the recipe over. Tasks
+# are redelivered only with CELERY_ACKS_LATE, see settings.py.template.
+EVALMGR_CHECKPOINT_HANDLERS = ()
+# Record the wall time, database queries and time spent waiting for
+# sioworkers of every evaluation phase (see oioioi.evalmgr.models).
+EVALMGR_PHASE_METRICS = True
+# Metrics older than EVALMGR_METRICS_RETENTION seconds are removed once per
+# EVALMGR_METRICS_PRUNE_INTERVAL evaluations.
+EVALMGR_METRICS_RETENTION = 30 * 24 * 3600
+EVALMGR_METRICS_PRUNE_INTERVAL = 100
+
+# Fair-share scheduling of evaluations (requires oioioi.submitsqueue).
+# Submissions are released to evalmgr at most SUBMITSQUEUE_MAX_IN_FLIGHT
+# (by default twice EVALMGR_CONCURRENCY) at a time, sharing evalmgr
+# between contests and users according to the weights of the kinds of
+# evaluations (see oioioi.submitsqueue.scheduler).
+SUBMITSQUEUE_FAIR_SCHEDULING = False
+SUBMITSQUEUE_MAX_IN_FLIGHT = None
+SUBMITSQUEUE_KIND_WEIGHTS = {
+    'NORMAL': 10,
+    'TESTRUN': 5,
+    'MODEL': 2,
+    'REJUDGE': 1,
+}
+# Seconds after which a released evaluation is assumed to be lost and no
+# longer counted as in progress. Lost evaluations are removed from the
+# queue by the release_queued_submits management command, which should be
+# run periodically.
+SUBMITSQUEUE_IN_FLIGHT_TIMEOUT = 3600
+
+# Rejudges of many submissions are sent to judging in the background, in
+# batches of BULK_REJUDGE_BATCH_SIZE, at most BULK_REJUDGE_RATE submissions
+# per second.
+BULK_REJUDGE_BATCH_SIZE = 50
+BULK_REJUDGE_RATE = 5
+# Evalmgr queue for rejudges, so that they are not judged together with
+# the new submissions, e.g. 'evalmgr-lowprio' (then served by the
+# evalmgr-lowprio worker, see supervisord.conf). None sends rejudges to the
+# evalmgr queue.
+REJUDGE_EVALMGR_QUEUE = None
 
 # Split-priority evaluation
 ENABLE_SPLITEVAL = False
@@ -319,6 +414,50 @@ PRINTING_MAX_FILE_SIZE = 1024 * 100  # in kB
 PRINTING_MAX_FILE_PAGES = 10
 PRINTING_COMMAND = ['lp']  # as argv list
 
+# Do not run the remaining tests of a group once one of them has failed
+# (only for groups scored with min_group_scorer). Skipped tests are shown
+# in reports with the "Skipped" status.
+ABORT_FAILED_TEST_GROUPS = False
+
+# Copy the reports of an earlier submission of the same user to the same
+# problem with an identical source file, instead of judging the submission
+# again, as long as the tests have not changed since.
+DEDUPLICATE_IDENTICAL_SUBMISSIONS = False
+
+# Stale ranking snapshots are served for this many seconds after they were
+# calculated, so that rankings are recalculated at most once per period.
+RANKING_RECALCULATION_DEBOUNCE = 10
+# A ranking is recalculated by one process at a time, while the others serve
+# the stale version. After this many seconds the recalculation is assumed
+# to have failed and may be taken over.
+RANKING_RECALCULATION_TIMEOUT = 300
+# Number of users processed at once when exporting rankings to CSV or JSON.
+RANKING_EXPORT_CHUNK_SIZE = 1000
+
+# Limits of the cache of compiled submissions, which lets rejudges and
+# identical submissions skip compilation in contests where it is enabled
+# (see programs.models.CompilationCacheConfig). The least recently used
+# binaries are removed when the cache has more entries or takes more bytes
+# than allowed, which is checked once per COMPILATION_CACHE_EVICTION_INTERVAL
+# new entries. Set COMPILATION_CACHE_MAX_ENTRIES to 0 to disable the cache.
+COMPILATION_CACHE_MAX_ENTRIES = 10000
+COMPILATION_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+COMPILATION_CACHE_EVICTION_INTERVAL = 100
+# Part of the keys of the compilation cache. Change it (e.g. to the current
+# date) after upgrading the compilers of the workers, so that binaries
+# built by the old compilers are not reused.
+COMPILATION_CACHE_COMPILERS_VERSION = ''
+
+# How long (in seconds) the highlighted sources of submissions and the
+# diffs between them are kept in the cache (see CACHES).
+SOURCE_VIEW_CACHE_TIMEOUT = 24 * 3600
+# If sources differ in more lines than this, the whole fragment between
+# their common beginning and end is shown as changed in the diff view.
+SOURCE_DIFF_MAX_CHANGES = 1000
+
+# Number of threads uploading test files when a sinol package is imported.
+SINOLPACK_UPLOAD_THREADS = 8
+
 # To get unlimited submissions count set to 0.
 DEFAULT_SUBMISSIONS_LIMIT = 10
 WARN_ABOUT_REPEATED_SUBMISSION = True
@@ -4,12 +4,24 @@ import copy
 import sys
 import logging
 import pprint
+import time
 import traceback
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 
 from celery.task import task
 from celery.exceptions import Ignore
+from django.conf import settings
+from django.db import connection
+from django.db.backends import util
+from django.utils import timezone
+from django.utils.timezone import utc
 
 from oioioi.base.utils import get_object_by_dotted_name
+from oioioi.evalmgr.models import EvaluationCheckpoint, PhaseMetric, \
+        QueueMetric
+from oioioi.sioworkers.jobs import send_sioworkers_jobs, \
+        get_sioworkers_wait_time, pack_jobs, unpack_results
 
 
 logger = logging.getLogger(__name__)
@@ -86,6 +98,130 @@ def _run_phase(env, phase, extra_kwargs=None):
     return env
 
 
+class _CountingCursorWrapper(util.CursorWrapper):
+    """A cursor which counts the executed queries in ``counter[0]``.
+
+       Unlike Django's debug cursor, it does not record the queries, which
+       would cost a lot in long phases.
+    """
+
+    def __init__(self, cursor, db, counter):
+        util.CursorWrapper.__init__(self, cursor, db)
+        self.counter = counter
+
+    def execute(self, sql, params=()):
+        self.counter[0] += 1
+        self.set_dirty()
+        return self.cursor.execute(sql, params)
+
+    def executemany(self, sql, param_list):
+        self.counter[0] += 1
+        self.set_dirty()
+        return self.cursor.executemany(sql, param_list)
+
+
+@contextmanager
+def _count_queries():
+    """Counts the database queries run in the block in the yielded
+       ``counter[0]``.
+    """
+    counter = [0]
+    make_debug_cursor = connection.make_debug_cursor
+    use_debug_cursor = connection.use_debug_cursor
+
+    def make_counting_cursor(cursor):
+        if use_debug_cursor or \
+                (use_debug_cursor is None and settings.DEBUG):
+            cursor = make_debug_cursor(cursor)
+        return _CountingCursorWrapper(cursor, connection, counter)
+
+    connection.make_debug_cursor = make_counting_cursor
+    connection.use_debug_cursor = True
+    try:
+        yield counter
+    finally:
+        connection.make_debug_cursor = make_debug_cursor
+        connection.use_debug_cursor = use_debug_cursor
+
+
+def _run_measured_phase(env, phase):
+    """Runs the phase like :func:`_run_phase` and appends its wall time,
+       number of database queries and time spent waiting for sioworkers to
+       ``env['phase_metrics']``.
+    """
+    suspended_wait = env.pop('suspended_wait', 0.)
+    if not settings.EVALMGR_PHASE_METRICS:
+        return _run_phase(env, phase)
+
+    wait_before = get_sioworkers_wait_time()
+    start = time.time()
+    with _count_queries() as queries:
+        try:
+            env = _run_phase(env, phase)
+        finally:
+            wall_time = time.time() - start
+    sioworkers_wait = get_sioworkers_wait_time() - wait_before
+    env.setdefault('phase_metrics', []).append(dict(
+            phase=phase[0],
+            handler=phase[1],
+            start=start,
+            wall_time=wall_time + suspended_wait,
+            queries=queries[0],
+            sioworkers_wait=sioworkers_wait + suspended_wait))
+    return env
+
+
+def _prune_metrics():
+    deadline = timezone.now() - \
+            timedelta(seconds=settings.EVALMGR_METRICS_RETENTION)
+    PhaseMetric.objects.filter(date__lt=deadline).delete()
+    QueueMetric.objects.filter(date__lt=deadline).delete()
+
+
+def _start_metrics(env):
+    """Prepares ``env['phase_metrics']`` for the phases run by the current
+       task and saves the queue latency of the evaluation.
+
+       Metrics older than ``settings.EVALMGR_METRICS_RETENTION`` seconds
+       are removed once per ``settings.EVALMGR_METRICS_PRUNE_INTERVAL``
+       evaluations.
+    """
+    env['phase_metrics'] = []
+    if 'queued_time' not in env:
+        return
+    now = time.time()
+    latency = max(0., now - env.pop('queued_time'))
+    try:
+        metric = QueueMetric.objects.create(
+                contest_id=env.get('contest_id'),
+                submission_id=env.get('submission_id'),
+                date=datetime.fromtimestamp(now, utc), latency=latency)
+        if metric.id % settings.EVALMGR_METRICS_PRUNE_INTERVAL == 0:
+            _prune_metrics()
+    except Exception:
+        logger.warning("Cannot save queue latency of job %s",
+                env.get('job_id'), exc_info=True)
+
+
+def _save_metrics(env):
+    """Saves the metrics of the phases run by the current task."""
+    metrics = env.get('phase_metrics')
+    if not metrics:
+        return
+    try:
+        PhaseMetric.objects.bulk_create([PhaseMetric(
+                contest_id=env.get('contest_id'),
+                submission_id=env.get('submission_id'),
+                phase=metric['phase'], handler=metric['handler'],
+                date=datetime.fromtimestamp(metric['start'], utc),
+                wall_time=metric['wall_time'], queries=metric['queries'],
+                sioworkers_wait=metric['sioworkers_wait'])
+            for metric in metrics])
+    except Exception:
+        logger.warning("Cannot save metrics of job %s", env.get('job_id'),
+                exc_info=True)
+
+
 def _run_error_handlers(env, exc_info):
     logger.debug("Handling exception '%s' in job:\n%s",
             exc_info[0], pprint.pformat(env, indent=4))
@@ -117,6 +253,129 @@ def _run_evaluation_postponed_handlers(async_result, saved_env):
                     traceback.format_exc())
 
 
+def can_suspend(env):
+    """Returns ``True`` if the handlers evaluating ``env`` may use
+       :func:`wait_for_jobs`.
+
+       This is controlled by ``settings.EVALMGR_ASYNC_JOBS``.
+    """
+    return settings.EVALMGR_ASYNC_JOBS and 'job_id' in env
+
+
+def wait_for_jobs(env, jobs, resume_phase, **kwargs):
+    """Suspends the evaluation until the given sioworkers jobs finish.
+
+       Should be used by handlers which would otherwise block waiting for
+       sioworkers, like this::
+
+           return wait_for_jobs(env, jobs, ('finish', 'module.finish'))
+
+       ``jobs`` is a dictionary mapping keys to sioworkers jobs. The jobs
+       are sent after the handler returns. Then the environment is saved
+       and the evalmgr task finishes, freeing the worker.
+
+       When all the jobs finish, the evaluation is resumed in a new evalmgr
+       task. ``resume_phase`` (in the same format as recipe entries) is run
+       first, with additional ``results`` argument: a dictionary mapping the
+       keys of ``jobs`` to their results. Then the rest of the recipe is
+       run as usual. ``postpone_handlers`` are run just as for the
+       :func:`~oioioi.evalmgr.handlers.postpone` handler.
+
+       ``kwargs`` are passed to
+       :func:`~oioioi.sioworkers.jobs.send_sioworkers_jobs`.
+
+       It may be used only if :func:`can_suspend` returns ``True``.
+    """
+    env['waiting_for_jobs'] = dict(jobs=jobs, resume_phase=resume_phase,
+            kwargs=kwargs)
+    return env
+
+
+def _suspend(env):
+    waiting = env.pop('waiting_for_jobs')
+    jobs = pack_jobs(waiting['jobs'])
+    keys = list(jobs)
+    saved_env = copy.copy(env)
+    saved_env['suspended_time'] = time.time()
+    env['recipe'] = []
+    logger.debug('Suspending evaluation of %(env)r', {'env': saved_env})
+    callback = evalmgr_resume_job.s(keys, waiting['resume_phase'],
+            saved_env)
+    async_result = send_sioworkers_jobs([jobs[key] for key in keys],
+            callback, **waiting['kwargs'])
+    _run_evaluation_postponed_handlers(async_result, saved_env)
+    return env
+
+
+def _save_checkpoint(env, phase):
+    checkpoint = EvaluationCheckpoint(job_id=env['job_id'],
+            submission_id=env.get('submission_id'), phase=phase[0])
+    try:
+        checkpoint.set_environ(env)
+    except Exception:
+        logger.warning("Cannot checkpoint job %s after phase %s",
+                env['job_id'], phase[0], exc_info=True)
+        return
+    EvaluationCheckpoint.objects.filter(job_id=env['job_id']).delete()
+    checkpoint.save()
+
+
+def _restore_checkpoint(env):
+    try:
+        checkpoint = EvaluationCheckpoint.objects.get(job_id=env['job_id'])
+    except EvaluationCheckpoint.DoesNotExist:
+        return env
+    logger.info("Resuming job %s after phase %s", checkpoint.job_id,
+            checkpoint.phase)
+    return checkpoint.get_environ()
+
+
+def _run_recipe(env):
+    checkpoint_handlers = settings.EVALMGR_CHECKPOINT_HANDLERS
+    job_id = env.get('job_id')
+    if not job_id:
+        checkpoint_handlers = ()
+    elif checkpoint_handlers:
+        env = _restore_checkpoint(env)
+    if settings.EVALMGR_PHASE_METRICS:
+        _start_metrics(env)
+
+    try:
+        if 'recipe' not in env:
+            raise RuntimeError('No recipe found in job environment. '
+                    'Did you forget to set environ["run_externally"]?')
+
+        while True:
+            recipe = env.get('recipe')
+            if not recipe:
+                break
+            phase = recipe[0]
+            env['recipe'] = recipe[1:]
+            env = _run_measured_phase(env, phase)
+            if 'waiting_for_jobs' in env:
+                _save_metrics(env)
+                return _suspend(env)
+            if phase[1] in checkpoint_handlers and env['recipe']:
+                _save_checkpoint(env, phase)
+
+        _save_metrics(env)
+        return env
+
+    # Throwing up celery.exceptions.Ignore is necessary for our custom revoke
+    # mechanism. Basically, one of the handlers in job's recipe throws Ignore
+    # if the submission had been revoked and this exception has to be passed
+    # up so that celery recognizes it and stops execution of this job.
+    except Ignore:
+        raise
+    except Exception:
+        exc_info = sys.exc_info()
+        _save_metrics(env)
+        return _run_error_handlers(env, exc_info)
+    finally:
+        if checkpoint_handlers:
+            EvaluationCheckpoint.objects.filter(job_id=job_id).delete()
+
+
 @task
 def evalmgr_job(env):
     r"""Takes environment and evaluates it according to its recipe.
@@ -147,32 +406,56 @@ def evalmgr_job(env):
         triple. If any exceptions are thrown there, they are reported to
         the logs and ignored.
 
+        A handler may also suspend the evaluation until some sioworkers jobs
+        finish, see :func:`wait_for_jobs`.
+
+        After the handlers listed in ``settings.EVALMGR_CHECKPOINT_HANDLERS``
+        the environment is saved as an
+        :class:`~oioioi.evalmgr.models.EvaluationCheckpoint`. If the job is
+        run again with the same identifier (i.e. redelivered by Celery), it
+        continues from the last checkpoint.
+
+        If ``settings.EVALMGR_PHASE_METRICS`` is set, the wall time, number
+        of database queries and time spent waiting for sioworkers of each
+        phase run by the task are put in ``env['phase_metrics']`` and saved
+        as :class:`~oioioi.evalmgr.models.PhaseMetric` objects once the task
+        finishes. If ``env['queued_time']`` (a timestamp) is present, the
+        time from then to the start of the task is saved as
+        :class:`~oioioi.evalmgr.models.QueueMetric`.
+
         Returns environment (a processed copy of given environment).
     """
 
     env = copy.deepcopy(env)
     env['job_id'] = evalmgr_job.request.id
+    return _run_recipe(env)
 
-    try:
-        if 'recipe' not in env:
-            raise RuntimeError('No recipe found in job environment. '
-                    'Did you forget to set environ["run_externally"]?')
 
-        while True:
-            recipe = env.get('recipe')
-            if not recipe:
-                break
-            phase = recipe[0]
-            env['recipe'] = recipe[1:]
-            env = _run_phase(env, phase)
+@task
+def evalmgr_resume_job(results, keys, resume_phase, env):
+    """Resumes the evaluation suspended by :func:`wait_for_jobs`.
 
-        return env
+       ``results`` is the list of results of the jobs with the given
+       ``keys``. Failed jobs are represented by their exceptions.
+    """
+    env = copy.deepcopy(env)
+    env['job_id'] = evalmgr_resume_job.request.id
 
-    # Throwing up celery.exceptions.Ignore is necessary for our custom revoke
-    # mechanism. Basically, one of the handlers in job's recipe throws Ignore
-    # if the submission had been revoked and this exception has to be passed
-    # up so that celery recognizes it and stops execution of this job.
-    except Ignore:
-        raise
-    except Exception:
+    # Waiting for the jobs is accounted to the resumed phase.
+    suspended_time = env.pop('suspended_time', None)
+    if suspended_time is not None:
+        env['suspended_wait'] = max(0., time.time() - suspended_time)
+
+    try:
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                raise RuntimeError('Sioworkers job %s failed: %r'
+                        % (key, result))
+    except RuntimeError:
         return _run_error_handlers(env, sys.exc_info())
+
+    name, handler = resume_phase[:2]
+    kwargs = resume_phase[2].copy() if len(resume_phase) == 3 else {}
+    kwargs['results'] = dict(unpack_results(zip(keys, results)))
+    env['recipe'] = [(name, handler, kwargs)] + list(env['recipe'])
+    return _run_recipe(env)
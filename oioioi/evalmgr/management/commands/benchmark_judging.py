@@ -0,0 +1,144 @@
+import time
+from collections import defaultdict
+from optparse import make_option
+
+from celery import current_app
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test.utils import override_settings
+from south.management.commands import patch_for_test_db_setup
+
+from oioioi.contests.models import ProblemInstance
+from oioioi.evalmgr.models import PhaseMetric
+from oioioi.evalmgr.utils import summarize
+from oioioi.programs.models import ProgramSubmission
+
+FIXTURES = ['test_users', 'test_contest', 'test_full_package']
+SOURCE = 'int main() { return 0; } // %d\n'
+
+
+def _parse_verdicts(value):
+    try:
+        verdicts = dict((verdict, float(weight)) for verdict, weight in
+                        (item.split('=') for item in value.split(',')))
+    except ValueError:
+        raise CommandError("Invalid verdicts: %s" % (value,))
+    if not verdicts or sum(verdicts.itervalues()) <= 0:
+        raise CommandError("Invalid verdicts: %s" % (value,))
+    return verdicts
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--submissions', type='int', dest='submissions',
+            default=50,
+            help="Number of submissions to judge"),
+        make_option('--compile-latency', type='float',
+            dest='compile_latency', default=0.,
+            help="Duration of a simulated compilation, in seconds"),
+        make_option('--exec-latency', type='float', dest='exec_latency',
+            default=0.,
+            help="Duration of a simulated test run, in seconds"),
+        make_option('--compile-verdicts', dest='compile_verdicts',
+            default='OK=95,CE=5',
+            help="Weights of the compilation results, e.g. OK=95,CE=5"),
+        make_option('--verdicts', dest='verdicts',
+            default='OK=85,WA=10,TLE=3,RE=2',
+            help="Weights of the test results, e.g. OK=85,WA=10,TLE=3,RE=2"),
+    )
+
+    help = "Judges submissions in a new test database, using the simulated " \
+           "sioworkers backend (oioioi.sioworkers.backends.FakeBackend), " \
+           "and reports the judging throughput, the number of database " \
+           "queries per submission and the durations of the evaluation " \
+           "phases. The database user must be allowed to create databases."
+
+    requires_model_validation = True
+
+    def handle(self, *args, **options):
+        if options['submissions'] <= 0:
+            raise CommandError("Number of submissions must be positive")
+        fake_settings = dict(
+            SIOWORKERS_BACKEND='oioioi.sioworkers.backends.FakeBackend',
+            SIOWORKERS_FAKE_LATENCY={'compile': options['compile_latency'],
+                                     'exec': options['exec_latency']},
+            SIOWORKERS_FAKE_VERDICTS={
+                'compile': _parse_verdicts(options['compile_verdicts']),
+                'exec': _parse_verdicts(options['verdicts'])},
+            SIOWORKERS_BATCH_MAX_TIME=0,
+            EVALMGR_ASYNC_JOBS=False,
+            EVALMGR_PHASE_METRICS=True,
+            COMPILATION_CACHE_MAX_ENTRIES=0,
+            SUBMITSQUEUE_FAIR_SCHEDULING=False,
+            DEDUPLICATE_IDENTICAL_SUBMISSIONS=False,
+            DEBUG=True,
+        )
+
+        patch_for_test_db_setup()
+        old_name = connection.creation.create_test_db(verbosity=0,
+                autoclobber=True)
+        always_eager = current_app.conf.CELERY_ALWAYS_EAGER
+        current_app.conf.CELERY_ALWAYS_EAGER = True
+        try:
+            with override_settings(**fake_settings):
+                call_command('loaddata', *FIXTURES, verbosity=0)
+                self._benchmark(options['submissions'])
+        finally:
+            current_app.conf.CELERY_ALWAYS_EAGER = always_eager
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _create_submissions(self, count):
+        problem_instance = ProblemInstance.objects.get()
+        submissions = []
+        for i in xrange(count):
+            submission = ProgramSubmission(user_id=1001,
+                    problem_instance=problem_instance, kind='NORMAL')
+            submission.source_file.save('benchmark.cpp',
+                    ContentFile(SOURCE % (i,)))
+            submissions.append(submission)
+        return submissions
+
+    def _benchmark(self, count):
+        submissions = self._create_submissions(count)
+        controller = submissions[0].problem_instance.contest.controller
+        try:
+            reset_queries()
+            start = time.time()
+            for submission in submissions:
+                controller.judge(submission)
+            elapsed = time.time() - start
+            queries = len(connection.queries)
+        finally:
+            for submission in submissions:
+                submission.source_file.delete(save=False)
+
+        judged = ProgramSubmission.objects.exclude(status='?').count()
+        if judged != count:
+            raise CommandError("Only %d of %d submissions have been judged"
+                    % (judged, count))
+        self._write_report(count, elapsed, queries)
+
+    def _write_report(self, count, elapsed, queries):
+        self.stdout.write("Submissions:             %d" % (count,))
+        self.stdout.write("Total time:              %.3f s" % (elapsed,))
+        self.stdout.write("Submissions per second:  %.2f"
+                % (count / elapsed,))
+        self.stdout.write("Queries per submission:  %.1f\n"
+                % (float(queries) / count,))
+
+        samples = defaultdict(list)
+        for phase, wall_time, phase_queries in PhaseMetric.objects \
+                .values_list('phase', 'wall_time', 'queries'):
+            samples[phase].append((wall_time, phase_queries))
+        self.stdout.write("%-32s %6s %10s %10s %8s" % ("Phase", "Count",
+                "p50 [ms]", "p95 [ms]", "Queries"))
+        for phase, values in sorted(samples.iteritems(),
+                key=lambda (phase, values): -sum(v[0] for v in values)):
+            wall_times, phase_queries = zip(*values)
+            summary = summarize(wall_times)
+            self.stdout.write("%-32s %6d %10.2f %10.2f %8.1f" % (phase,
+                    len(values), 1000 * summary['p50'],
+                    1000 * summary['p95'],
+                    float(sum(phase_queries)) / len(values)))
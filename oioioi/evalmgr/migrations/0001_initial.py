@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'EvaluationCheckpoint'
+        db.create_table(u'evalmgr_evaluationcheckpoint', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('job_id', self.gf('django.db.models.fields.CharField')(unique=True, max_length=255)),
+            ('submission_id', self.gf('django.db.models.fields.IntegerField')(db_index=True, null=True, blank=True)),
+            ('phase', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('serialized_environ', self.gf('django.db.models.fields.TextField')()),
+            ('date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+        ))
+        db.send_create_signal(u'evalmgr', ['EvaluationCheckpoint'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'EvaluationCheckpoint'
+        db.delete_table(u'evalmgr_evaluationcheckpoint')
+
+
+    models = {
+        u'evalmgr.evaluationcheckpoint': {
+            'Meta': {'object_name': 'EvaluationCheckpoint'},
+            'date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'job_id': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'phase': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'serialized_environ': ('django.db.models.fields.TextField', [], {}),
+            'submission_id': ('django.db.models.fields.IntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['evalmgr']
\ No newline at end of file
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding index on 'QueueMetric', fields ['date']
+        db.create_index(u'evalmgr_queuemetric', ['date'])
+
+        # Adding index on 'PhaseMetric', fields ['date']
+        db.create_index(u'evalmgr_phasemetric', ['date'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'PhaseMetric', fields ['date']
+        db.delete_index(u'evalmgr_phasemetric', ['date'])
+
+        # Removing index on 'QueueMetric', fields ['date']
+        db.delete_index(u'evalmgr_queuemetric', ['date'])
+
+
+    models = {
+        u'evalmgr.evaluationcheckpoint': {
+            'Meta': {'object_name': 'EvaluationCheckpoint'},
+            'date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'job_id': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'phase': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'serialized_environ': ('django.db.models.fields.TextField', [], {}),
+            'submission_id': ('django.db.models.fields.IntegerField', [], {'db_index': 'True', 'null': 'True', 'blank': 'True'})
+        },
+        u'evalmgr.phasemetric': {
+            'Meta': {'object_name': 'PhaseMetric', 'index_together': "[['contest_id', 'date']]"},
+            'contest_id': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True'}),
+            'handler': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'phase': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'queries': ('django.db.models.fields.IntegerField', [], {}),
+            'sioworkers_wait': ('django.db.models.fields.FloatField', [], {}),
+            'submission_id': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'wall_time': ('django.db.models.fields.FloatField', [], {})
+        },
+        u'evalmgr.queuemetric': {
+            'Meta': {'object_name': 'QueueMetric', 'index_together': "[['contest_id', 'date']]"},
+            'contest_id': ('django.db.models.fields.CharField', [], {'max_length': '255', 'null': 'True', 'blank': 'True'}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'db_index': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'latency': ('django.db.models.fields.FloatField', [], {}),
+            'submission_id': ('django.db.models.fields.IntegerField', [], {'null': 'True', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['evalmgr']
\ No newline at end of file
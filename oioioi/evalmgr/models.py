@@ -0,0 +1,59 @@
+import base64
+import cPickle as pickle
+
+from django.db import models
+from django.utils import timezone
+
+
+class EvaluationCheckpoint(models.Model):
+    """Environment of an evaluation job saved after one of its phases.
+
+       If the job is redelivered (for example because the worker running it
+       died), the evaluation resumes from the checkpoint instead of from the
+       beginning of the recipe. See :func:`oioioi.evalmgr._run_recipe`.
+    """
+    job_id = models.CharField(max_length=255, unique=True)
+    submission_id = models.IntegerField(null=True, blank=True,
+            db_index=True)
+    phase = models.CharField(max_length=255)
+    serialized_environ = models.TextField()
+    date = models.DateTimeField(default=timezone.now)
+
+    def get_environ(self):
+        return pickle.loads(base64.b64decode(self.serialized_environ))
+
+    def set_environ(self, env):
+        self.serialized_environ = base64.b64encode(
+                pickle.dumps(env, pickle.HIGHEST_PROTOCOL))
+
+
+class PhaseMetric(models.Model):
+    """Resources used by a single phase of an evaluation recipe.
+
+       Stored when the evaluation finishes, see
+       :func:`oioioi.evalmgr._save_metrics`.
+    """
+    contest_id = models.CharField(max_length=255, null=True, blank=True)
+    submission_id = models.IntegerField(null=True, blank=True)
+    phase = models.CharField(max_length=255)
+    handler = models.CharField(max_length=255)
+    date = models.DateTimeField(db_index=True)
+    wall_time = models.FloatField()
+    queries = models.IntegerField()
+    sioworkers_wait = models.FloatField()
+
+    class Meta(object):
+        index_together = [['contest_id', 'date']]
+
+
+class QueueMetric(models.Model):
+    """Time an evaluation spent waiting in the queue, i.e. between sending
+       it to evalmgr and starting its first phase.
+    """
+    contest_id = models.CharField(max_length=255, null=True, blank=True)
+    submission_id = models.IntegerField(null=True, blank=True)
+    date = models.DateTimeField(db_index=True)
+    latency = models.FloatField()
+
+    class Meta(object):
+        index_together = [['contest_id', 'date']]
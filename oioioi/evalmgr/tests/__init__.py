@@ -1,11 +1,21 @@
 from django.utils import unittest
 from django.test.utils import override_settings
-from django.test import SimpleTestCase
-from oioioi.evalmgr import evalmgr_job
+from django.test import SimpleTestCase, TestCase
+from django.core.urlresolvers import reverse
+from django.utils import timezone
+from oioioi.evalmgr import evalmgr_job, wait_for_jobs, _count_queries
+from oioioi.evalmgr.models import EvaluationCheckpoint, PhaseMetric, \
+        QueueMetric
+from oioioi.evalmgr.utils import summarize
+from oioioi.evalmgr.management.commands.benchmark_judging import \
+        Command as BenchmarkCommand
 from oioioi.sioworkers.jobs import run_sioworkers_job
 from oioioi.filetracker.client import get_client
 
 import copy
+import time
+from StringIO import StringIO
+from datetime import timedelta
 import uuid
 import os.path
 
@@ -186,6 +196,168 @@ class TestRemoteJobs(SimpleTestCase):
         self.assertEqual('OK', good_result.get()['result_code'])
         self.assertEqual('WA', wrong_result.get()['result_code'])
 
+class ResultsSioworkersBackend(object):
+    def run_jobs(self, dict_of_jobs, **kwargs):
+        return dict((key, dict(job, result_code='OK'))
+                    for key, job in dict_of_jobs.iteritems())
+
+
+suspended_jobs = []
+
+
+def dispatch_handler(env, **kwargs):
+    jobs = dict((animal, {'animal': animal}) for animal in env['animals'])
+    return wait_for_jobs(env, jobs, ('Count',
+            'oioioi.evalmgr.tests.count_handler', {'prey': 'hedgehog'}))
+
+
+def count_handler(env, results, prey, **kwargs):
+    env['hunted'] = sorted(result['animal'] for result in results.values()
+                           if result['result_code'] == 'OK')
+    env['prey_hunted'] = prey in env['hunted']
+    return env
+
+
+def save_suspended_job(env, async_result, **kwargs):
+    suspended_jobs.append(async_result)
+    return env
+
+
+class TestSuspendedJobs(unittest.TestCase):
+    recipe = [('Hunt',
+                  'oioioi.evalmgr.tests.dispatch_handler'),
+              ('Rest',
+                  'oioioi.evalmgr.tests.prepare_handler')]
+
+    @override_settings(EVALMGR_ASYNC_JOBS=True,
+            SIOWORKERS_BACKEND='oioioi.evalmgr.tests.'
+                               'ResultsSioworkersBackend')
+    def test_suspend_and_resume(self):
+        del suspended_jobs[:]
+        env = dict(recipe=self.recipe, animals=['hedgehog', 'fox'],
+                postpone_handlers=[('Save',
+                    'oioioi.evalmgr.tests.save_suspended_job')])
+        env = evalmgr_job.delay(env).get()
+        self.assertNotIn('hunted', env)
+        self.assertEqual(len(suspended_jobs), 1)
+
+        resumed_env = suspended_jobs[0].get()
+        self.assertEqual(resumed_env['hunted'], ['fox', 'hedgehog'])
+        self.assertTrue(resumed_env['prey_hunted'])
+        self.assertTrue(resumed_env['prepared'])
+        self.assertNotEqual(env['job_id'], resumed_env['job_id'])
+
+
+def inspect_checkpoint_handler(env, **kwargs):
+    checkpoint = EvaluationCheckpoint.objects.get(job_id=env['job_id'])
+    env['checkpointed_phase'] = checkpoint.phase
+    return env
+
+
+@override_settings(EVALMGR_CHECKPOINT_HANDLERS=(
+        'oioioi.evalmgr.tests.prepare_handler',))
+class TestCheckpoints(TestCase):
+    recipe = [hunting[0],
+              ('Inspect',
+                  'oioioi.evalmgr.tests.inspect_checkpoint_handler')] \
+            + hunting[1:]
+
+    def test_checkpoint(self):
+        env = dict(recipe=self.recipe, area='forest', submission_id=7)
+        env = evalmgr_job.delay(env).get()
+        self.assertEqual(env['checkpointed_phase'], 'Prepare guns')
+        self.assertEqual('Hedgehog hunted.', env['output'])
+        self.assertFalse(EvaluationCheckpoint.objects.exists())
+
+    def test_resume_from_checkpoint(self):
+        checkpoint = EvaluationCheckpoint(job_id='redelivered',
+                submission_id=7, phase='Hunt')
+        checkpoint.set_environ(dict(recipe=hunting[2:], area='forest',
+                result='Hedgehog hunted.', job_id='redelivered'))
+        checkpoint.save()
+
+        env = dict(recipe=self.recipe, area='city')
+        env = evalmgr_job.apply((env,), task_id='redelivered').get()
+        self.assertEqual('Hedgehog hunted.', env['output'])
+        self.assertNotIn('prepared', env)
+        self.assertFalse(EvaluationCheckpoint.objects.exists())
+
+
+class TestPhaseMetrics(TestCase):
+    fixtures = ['test_users', 'test_contest']
+
+    def test_metrics(self):
+        env = dict(recipe=hunting, area='forest', contest_id='c',
+                submission_id=7, queued_time=time.time() - 5)
+        env = evalmgr_job.delay(env).get()
+        self.assertEqual([m['phase'] for m in env['phase_metrics']],
+                ['Prepare guns', 'Hunt', 'Rest'])
+        self.assertNotIn('queued_time', env)
+
+        self.assertEqual(PhaseMetric.objects.filter(contest_id='c',
+                submission_id=7).count(), 3)
+        latency = QueueMetric.objects.get(contest_id='c').latency
+        self.assertTrue(5 <= latency < 60)
+
+    def test_query_counting(self):
+        with _count_queries() as queries:
+            list(QueueMetric.objects.all())
+            QueueMetric.objects.create(date=timezone.now(), latency=1.)
+        self.assertEqual(queries[0], 2)
+
+    @override_settings(EVALMGR_METRICS_PRUNE_INTERVAL=1)
+    def test_metrics_pruning(self):
+        PhaseMetric.objects.create(contest_id='c', phase='Hunt',
+                handler='oioioi.evalmgr.tests.hunting_handler',
+                date=timezone.now() - timedelta(days=365), wall_time=1.,
+                queries=3, sioworkers_wait=0.5)
+        env = dict(recipe=hunting, area='forest', contest_id='c',
+                queued_time=time.time())
+        evalmgr_job.delay(env).get()
+        self.assertEqual(PhaseMetric.objects.count(), 3)
+        self.assertEqual(QueueMetric.objects.count(), 1)
+
+    def test_metrics_view(self):
+        for wall_time in [1., 2., 10.]:
+            PhaseMetric.objects.create(contest_id='c', phase='Hunt',
+                    handler='oioioi.evalmgr.tests.hunting_handler',
+                    date=timezone.now(), wall_time=wall_time, queries=3,
+                    sioworkers_wait=0.5)
+        QueueMetric.objects.create(contest_id='c', date=timezone.now(),
+                latency=4.)
+
+        url = reverse('evaluation_metrics', kwargs={'contest_id': 'c'})
+        self.client.login(username='test_user')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.client.login(username='test_admin')
+        response = self.client.get(url)
+        phase = response.context['phases'][0]
+        self.assertEqual(phase['count'], 3)
+        self.assertEqual(phase['wall_time'], {'p50': 2., 'p95': 10.})
+        self.assertEqual(response.context['queue_latency']['p50'], 4.)
+        self.assertIn('Hunt', response.content)
+
+    def test_summarize(self):
+        self.assertEqual(summarize([10., 1., 2.]), {'p50': 2., 'p95': 10.})
+        self.assertEqual(summarize([3]), {'p50': 3, 'p95': 3})
+
+    def test_benchmark_report(self):
+        for wall_time in [0.001, 0.002, 0.01]:
+            PhaseMetric.objects.create(phase='Hunt',
+                    handler='oioioi.evalmgr.tests.hunting_handler',
+                    date=timezone.now(), wall_time=wall_time, queries=3,
+                    sioworkers_wait=0.)
+        command = BenchmarkCommand()
+        command.stdout = StringIO()
+        command._write_report(3, 1.5, 30)
+        output = command.stdout.getvalue()
+        self.assertIn('Submissions per second:  2.00', output)
+        self.assertIn('Queries per submission:  10.0', output)
+        self.assertRegexpMatches(output,
+                r'Hunt +3 +2\.00 +10\.00 +3\.0')
+
+
 police_files = {}
 
 
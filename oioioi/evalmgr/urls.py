@@ -0,0 +1,10 @@
+from django.conf.urls import patterns, include, url
+
+contest_patterns = patterns('oioioi.evalmgr.views',
+    url(r'^evaluation_metrics/$', 'evaluation_metrics_view',
+        name='evaluation_metrics'),
+)
+
+urlpatterns = patterns('oioioi.evalmgr.views',
+    url(r'^c/(?P<contest_id>[a-z0-9_-]+)/', include(contest_patterns)),
+)
@@ -0,0 +1,34 @@
+def _nearest_rank(count, fraction):
+    return min(max(0, int(count * fraction + 0.5) - 1), count - 1)
+
+
+def percentile(sorted_values, fraction):
+    """Returns the given percentile (using the nearest-rank method) of
+       a non-empty sorted list.
+    """
+    return sorted_values[_nearest_rank(len(sorted_values), fraction)]
+
+
+def summarize(values):
+    """Returns the median and the 95th percentile of a non-empty list of
+       values, as a dict with keys ``p50`` and ``p95``.
+    """
+    values = sorted(values)
+    return {'p50': percentile(values, 0.5), 'p95': percentile(values, 0.95)}
+
+
+def queryset_percentile(queryset, field, count, fraction):
+    """Like :func:`percentile`, but of the values of the field in the
+       queryset of ``count`` (non-zero) rows. Only the chosen value is
+       fetched from the database.
+    """
+    return queryset.order_by(field).values_list(field, flat=True) \
+            [_nearest_rank(count, fraction)]
+
+
+def summarize_queryset(queryset, field, count):
+    """Like :func:`summarize`, but of the values of the field in the
+       queryset of ``count`` (non-zero) rows.
+    """
+    return {'p50': queryset_percentile(queryset, field, count, 0.5),
+            'p95': queryset_percentile(queryset, field, count, 0.95)}
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.core.urlresolvers import reverse
+from django.db.models import Count, Sum
+from django.template.response import TemplateResponse
+from django.utils.translation import ugettext_lazy as _
+
+from oioioi.base.permissions import enforce_condition
+from oioioi.contests.menu import contest_admin_menu_registry
+from oioioi.contests.utils import is_contest_admin, contest_exists
+from oioioi.evalmgr.models import PhaseMetric, QueueMetric
+from oioioi.evalmgr.utils import summarize_queryset
+
+
+METRICS_PERIODS = [
+    (1, _("Last hour")),
+    (24, _("Last day")),
+    (24 * 7, _("Last week")),
+]
+
+
+@contest_admin_menu_registry.register_decorator(_("Evaluation metrics"),
+    lambda request: reverse('evaluation_metrics',
+        kwargs={'contest_id': request.contest.id}),
+    order=480)
+@enforce_condition(contest_exists & is_contest_admin)
+def evaluation_metrics_view(request, contest_id):
+    periods = dict(METRICS_PERIODS)
+    try:
+        hours = int(request.GET.get('hours', 24))
+    except ValueError:
+        hours = 24
+    if hours not in periods:
+        hours = 24
+    since = request.timestamp - timedelta(hours=hours)
+
+    # The metrics are aggregated by the database, as there may be a lot of
+    # them. Only the percentiles need a query per phase.
+    metrics = PhaseMetric.objects.filter(contest_id=contest_id,
+            date__gte=since)
+    phases = []
+    for group in metrics.values('phase', 'handler') \
+            .annotate(count=Count('id'), total_time=Sum('wall_time')) \
+            .order_by('-total_time'):
+        phase_metrics = metrics.filter(phase=group['phase'],
+                handler=group['handler'])
+        for field in ('wall_time', 'queries', 'sioworkers_wait'):
+            group[field] = summarize_queryset(phase_metrics, field,
+                    group['count'])
+        phases.append(group)
+
+    latencies = QueueMetric.objects.filter(contest_id=contest_id,
+            date__gte=since)
+    latency_count = latencies.count()
+    queue_latency = latency_count and dict(
+            summarize_queryset(latencies, 'latency', latency_count),
+            count=latency_count)
+
+    return TemplateResponse(request, 'evalmgr/metrics.html', {
+        'periods': METRICS_PERIODS,
+        'hours': hours,
+        'phases': phases,
+        'queue_latency': queue_latency,
+    })
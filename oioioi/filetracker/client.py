@@ -9,6 +9,18 @@ from oioioi.base.utils import memoized, get_object_by_dotted_name, \
 import filetracker
 import filetracker.dummy
 
+import fcntl
+import json
+import logging
+import os
+import os.path
+import shutil
+import tempfile
+import time
+
+
+logger = logging.getLogger(__name__)
+
 
 @memoized
 def get_client():
@@ -51,3 +63,240 @@ def media_root_factory():
     """A filetracker factory which sets up local client in
        ``settings.MEDIA_ROOT`` folder."""
     return filetracker.Client(cache_dir=settings.MEDIA_ROOT, remote_store=None)
+
+
+class LRUCacheDataStore(filetracker.LocalDataStore):
+    """A :class:`filetracker.LocalDataStore` used as a cache of a remote
+       store, which keeps at most ``max_size`` bytes of files, removing the
+       least recently used ones first. Files not used for ``max_age``
+       seconds are removed, too.
+
+       As the modification time of a file is its version, the access time
+       is used to track the usage. It is set explicitly, so the cache works
+       on filesystems mounted with ``noatime``, too.
+
+       Files may be pinned (see :meth:`pin_files`), so that they are never
+       removed, e.g. tests of a contest which is in progress.
+
+       The files are removed by :meth:`evict`, which walks the whole cache
+       and hence is not called when files are added, but periodically by
+       the ``evict_filetracker_cache`` management command. The counters of
+       cache hits and misses of all the processes using the cache are
+       stored in ``<dir>/stats``, to which each process adds its counters
+       at most every ``stats_interval`` seconds.
+    """
+
+    def __init__(self, dir, max_size, max_age=None, stats_interval=60):
+        filetracker.LocalDataStore.__init__(self, dir)
+        self.base_dir = dir
+        self.pins_dir = os.path.join(dir, 'pins')
+        self.max_size = max_size
+        self.max_age = max_age
+        self.stats_interval = stats_interval
+        self._counters = dict(hits=0, misses=0, evictions=0)
+        self._last_stats_update = time.time()
+
+    def _touch(self, path):
+        try:
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+
+    def touch(self, name):
+        """Marks the file as used, e.g. when it is read directly from
+           the local filesystem.
+        """
+        path, _version = self._parse_name(name)
+        self._touch(path)
+        self._count('hits')
+
+    def _count(self, counter):
+        self._counters[counter] += 1
+        if time.time() - self._last_stats_update > self.stats_interval:
+            self._update_stats()
+
+    def count_miss(self):
+        self._count('misses')
+
+    def get_stream(self, name):
+        stream, vname = filetracker.LocalDataStore.get_stream(self, name)
+        self._touch(stream.name)
+        self._count('hits')
+        return stream, vname
+
+    def add_stream(self, name, stream):
+        vname = filetracker.LocalDataStore.add_stream(self, name, stream)
+        path, _version = self._parse_name(name)
+        self._touch(path)
+        return vname
+
+    def _pin_path(self, pin_name):
+        if not pin_name or '/' in pin_name or pin_name.startswith('.'):
+            raise ValueError("Invalid pin name: %r" % (pin_name,))
+        return os.path.join(self.pins_dir, pin_name)
+
+    def pin_files(self, pin_name, names, expires=None):
+        """Protects the given files from being removed from the cache
+           until ``expires`` (a timestamp) or until :meth:`unpin_files`
+           is called for the same ``pin_name``.
+        """
+        filetracker._mkdir(self.pins_dir)
+        names = sorted(set(filetracker.split_name(name)[0]
+                           for name in names))
+        fd, tmp_path = tempfile.mkstemp(dir=self.pins_dir, prefix='.')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(dict(expires=expires, names=names), f)
+        os.rename(tmp_path, self._pin_path(pin_name))
+
+    def unpin_files(self, pin_name):
+        try:
+            os.remove(self._pin_path(pin_name))
+        except OSError:
+            pass
+
+    def pinned_files(self):
+        """Returns the set of (unversioned) names of the pinned files."""
+        names = set()
+        if not os.path.isdir(self.pins_dir):
+            return names
+        for pin_name in os.listdir(self.pins_dir):
+            if pin_name.startswith('.'):
+                continue
+            try:
+                with open(self._pin_path(pin_name)) as f:
+                    pin = json.load(f)
+            except (IOError, ValueError):
+                continue
+            if pin['expires'] is not None and pin['expires'] < time.time():
+                self.unpin_files(pin_name)
+                continue
+            names.update(pin['names'])
+        return names
+
+    def _update_stats(self, **values):
+        self._last_stats_update = time.time()
+        with open(os.path.join(self.base_dir, 'stats'), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                stats = json.load(f)
+            except ValueError:
+                stats = dict(hits=0, misses=0, evictions=0)
+            for counter, value in self._counters.iteritems():
+                stats[counter] = stats.get(counter, 0) + value
+                self._counters[counter] = 0
+            stats.update(values)
+            f.seek(0)
+            f.truncate()
+            json.dump(stats, f)
+        return stats
+
+    def stats(self):
+        """Returns a dict with the numbers of cache ``hits``, ``misses`` and
+           ``evictions`` of all the processes, the ``hit_ratio``, the
+           ``size`` of the cache and the number of ``files`` in it (as of
+           the last check).
+        """
+        stats = self._update_stats()
+        stats.setdefault('size', 0)
+        stats.setdefault('files', 0)
+        requests = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = requests and float(stats['hits']) / requests
+        return stats
+
+    def evict(self):
+        """Removes the least recently used files which do not fit in the
+           cache and the files not used for ``max_age`` seconds."""
+        now = time.time()
+        pinned = self.pinned_files()
+        entries = []
+        size = file_count = 0
+        for root, _dirs, files in os.walk(self.dir):
+            for basename in files:
+                path = os.path.join(root, basename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                size += stat.st_size
+                file_count += 1
+                if '/' + os.path.relpath(path, self.dir) not in pinned:
+                    entries.append((stat.st_atime, path, stat.st_size))
+
+        evictions = 0
+        entries.sort()
+        for atime, path, file_size in entries:
+            if size <= self.max_size and (self.max_age is None
+                    or now - atime <= self.max_age):
+                break
+            try:
+                os.remove(path)
+                os.removedirs(os.path.dirname(path))
+            except OSError:
+                pass
+            size -= file_size
+            evictions += 1
+        self._counters['evictions'] += evictions
+        stats = self._update_stats(size=size, files=file_count - evictions)
+        logger.info("Filetracker cache: %d files removed, %d bytes used, "
+                "%d hits, %d misses", evictions, size, stats['hits'],
+                stats['misses'])
+
+
+class CachingClient(filetracker.Client):
+    """A filetracker client which keeps the files downloaded from a remote
+       filetracker server in a bounded local cache (see
+       :class:`LRUCacheDataStore`).
+
+       Unlike :class:`filetracker.Client`, the files read with
+       :meth:`get_stream` are cached, too.
+    """
+
+    def __init__(self, cache_dir, max_size, max_age=None, remote_url=None,
+            remote_store='auto'):
+        filetracker.Client.__init__(self,
+                local_store=LRUCacheDataStore(cache_dir, max_size, max_age),
+                remote_store=remote_store, cache_dir=cache_dir,
+                remote_url=remote_url)
+
+    def _add_to_cache(self, name, filename):
+        self.local_store.count_miss()
+        filetracker.Client._add_to_cache(self, name, filename)
+
+    def get_stream(self, name, force_refresh=False):
+        _uname, version = filetracker.split_name(name)
+        if version is None or force_refresh or \
+                self.local_store.exists(name):
+            if version is None:
+                self.local_store.count_miss()
+            return filetracker.Client.get_stream(self, name, force_refresh)
+        # The file is downloaded to a new path, as filetracker does not
+        # overwrite existing files which seem to be newer.
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            tmp_path = os.path.join(tmp_dir, 'file')
+            vname = self.get_file(name, tmp_path)
+            return open(tmp_path, 'rb'), vname
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+def remote_cache_factory():
+    """A filetracker factory which sets up a client of the filetracker
+       server at ``settings.FILETRACKER_URL``, which caches the files in
+       ``settings.FILETRACKER_CACHE_ROOT`` (see :class:`CachingClient`).
+
+       The cache size is limited by ``settings.FILETRACKER_CACHE_SIZE``
+       and ``settings.FILETRACKER_CACHE_MAX_AGE``.
+    """
+    if not settings.FILETRACKER_URL or not settings.FILETRACKER_CACHE_ROOT:
+        raise ImproperlyConfigured("remote_cache_factory needs "
+                "FILETRACKER_URL and FILETRACKER_CACHE_ROOT to be set")
+    if os.path.abspath(settings.FILETRACKER_CACHE_ROOT) == \
+            os.path.abspath(settings.MEDIA_ROOT):
+        raise ImproperlyConfigured("FILETRACKER_CACHE_ROOT must not be "
+                "MEDIA_ROOT, which may be the filetracker server's storage")
+    return CachingClient(settings.FILETRACKER_CACHE_ROOT,
+            settings.FILETRACKER_CACHE_SIZE,
+            settings.FILETRACKER_CACHE_MAX_AGE,
+            remote_url=settings.FILETRACKER_URL)
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from oioioi.filetracker.client import get_client, CachingClient
+
+
+class Command(BaseCommand):
+    help = _("Removes the least recently used files from the local "
+             "filetracker cache (see remote_cache_factory), so that it fits "
+             "in FILETRACKER_CACHE_SIZE, and the files not used for "
+             "FILETRACKER_CACHE_MAX_AGE. Should be run periodically (e.g. "
+             "every few minutes from cron) when the cache is used.")
+
+    def handle(self, *args, **options):
+        if args:
+            raise CommandError(_("Unexpected arguments"))
+        client = get_client()
+        if not isinstance(client, CachingClient):
+            raise CommandError(_("FILETRACKER_CLIENT_FACTORY does not use "
+                                 "a local cache"))
+        cache = client.local_store
+        cache.evict()
+        stats = cache.stats()
+        self.stdout.write(_("Cache: %(files)d files, %(size)d bytes, hit "
+                            "ratio: %(ratio).2f\n") % {
+            'files': stats['files'],
+            'size': stats['size'],
+            'ratio': stats['hit_ratio'],
+        })
@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.conf import settings
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'FileBlob'
+        db.create_table(u'filetracker_fileblob', (
+            ('digest', self.gf('django.db.models.fields.CharField')(max_length=40, primary_key=True)),
+            ('refcount', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('uploaded', self.gf('django.db.models.fields.BooleanField')(default=False)),
+        ))
+        db.send_create_signal(u'filetracker', ['FileBlob'])
+
+        # Adding model 'TestFileModel', which exists only in tests
+        if getattr(settings, 'TESTS', False):
+            db.create_table(u'filetracker_testfilemodel', (
+                (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+                ('file_field', self.gf('oioioi.filetracker.fields.FileField')(max_length=100)),
+            ))
+            db.send_create_signal(u'filetracker', ['TestFileModel'])
+
+
+    def backwards(self, orm):
+        # Deleting model 'FileBlob'
+        db.delete_table(u'filetracker_fileblob')
+
+        # Deleting model 'TestFileModel'
+        if getattr(settings, 'TESTS', False):
+            db.delete_table(u'filetracker_testfilemodel')
+
+
+    models = {
+        u'filetracker.fileblob': {
+            'Meta': {'object_name': 'FileBlob'},
+            'digest': ('django.db.models.fields.CharField', [], {'max_length': '40', 'primary_key': 'True'}),
+            'refcount': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'uploaded': ('django.db.models.fields.BooleanField', [], {'default': 'False'})
+        },
+        u'filetracker.testfilemodel': {
+            'Meta': {'object_name': 'TestFileModel'},
+            'file_field': ('oioioi.filetracker.fields.FileField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        }
+    }
+
+    complete_apps = ['filetracker']
\ No newline at end of file
@@ -1,7 +1,23 @@
 from django.conf import settings
 from django.db import models
+from django.utils.translation import ugettext_lazy as _
 from oioioi.filetracker.fields import FileField
 
+
+class FileBlob(models.Model):
+    """A file stored by a deduplicating
+       :class:`~oioioi.filetracker.storage.FiletrackerStorage` under the
+       hash of its content, and the number of files referring to it.
+    """
+    digest = models.CharField(max_length=40, primary_key=True)
+    refcount = models.IntegerField(default=0)
+    uploaded = models.BooleanField(default=False)
+
+    class Meta(object):
+        verbose_name = _("file blob")
+        verbose_name_plural = _("file blobs")
+
+
 if getattr(settings, 'TESTS', False):
     class TestFileModel(models.Model):
         file_field = FileField(upload_to='tests')
@@ -1,34 +1,190 @@
+from django.conf import settings
 from django.core.files.storage import Storage
 from django.core.files import File
 from django.core.urlresolvers import reverse
+from django.db import transaction
+from django.db.models import F
 from oioioi.filetracker.client import get_client
+from oioioi.filetracker.models import FileBlob
 from oioioi.filetracker.utils import FileInFiletracker
 from oioioi.filetracker.filename import FiletrackerFilename
 
+import filetracker
+
+import collections
+import hashlib
 import os
 import os.path
+import re
 import tempfile
 import datetime
 
 
+BLOBS_DIR = 'blobs'
+# All blobs have the same version, so uploading an existing blob again
+# changes nothing, and its cached copies stay valid.
+BLOB_VERSION = 1
+# The length of names of files in the database (as in FileField).
+MAX_NAME_LENGTH = 100
+
+_blob_name_re = re.compile(r'^%s/([0-9a-f]{40})(/[^/]*)?$' % (BLOBS_DIR,))
+
+
+def file_digest(filename):
+    """Returns the hash of the content of the file, which identifies
+       its blob in a deduplicating :class:`FiletrackerStorage`.
+    """
+    digest = hashlib.sha1()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
 class FiletrackerStorage(Storage):
-    def __init__(self, prefix='/', client=None):
+    """A Django storage which keeps the files in Filetracker.
+
+       If ``deduplicate`` is set (by default, if
+       ``settings.FILETRACKER_DEDUPLICATION`` is), the files are stored
+       by the hash of their content, so that the files with the same
+       content (e.g. the same tests of many problems) are stored only once.
+       A file saved as ``problems/1/abc0in.in`` is then stored as the blob
+       ``<prefix>/blobs/<hash>``, and named ``blobs/<hash>/abc0in.in``.
+       The name keeps the base name of the file, as it may be needed e.g.
+       to determine the language of a source file.
+
+       The number of files referring to each blob is kept in
+       :class:`~oioioi.filetracker.models.FileBlob`, so that a blob is
+       removed when the last of its files is deleted.
+    """
+
+    def __init__(self, prefix='/', client=None, deduplicate=None):
         if client is None:
             client = get_client()
         assert prefix.startswith('/'), \
                 'FiletrackerStorage.__init__ prefix must start with /'
         self.client = client
         self.prefix = prefix
+        self._deduplicate = deduplicate
 
-    def _make_filetracker_path(self, name):
+    @property
+    def deduplicate(self):
+        if self._deduplicate is None:
+            return settings.FILETRACKER_DEDUPLICATION
+        return self._deduplicate
+
+    def _normalize_name(self, name):
         if isinstance(name, FiletrackerFilename):
             name = name.versioned_name
         name = os.path.normcase(os.path.normpath(name))
         if os.path.isabs(name):
             raise ValueError('FiletrackerStorage does not support absolute '
                     'paths')
+        return name
+
+    def _make_filetracker_path(self, name):
+        name = self._normalize_name(name)
+        digest = self._blob_digest(name)
+        if digest:
+            return self._blob_path(digest)
         return os.path.join(self.prefix, name).replace(os.sep, '/')
 
+    def _blob_digest(self, name):
+        """Returns the hash of the blob if the file is a blob, otherwise
+           ``None``.
+        """
+        match = _blob_name_re.match(filetracker.split_name(name)[0])
+        return match and match.group(1)
+
+    def _blob_path(self, digest):
+        path = os.path.join(self.prefix, BLOBS_DIR, digest)
+        return filetracker.versioned_name(path.replace(os.sep, '/'),
+                BLOB_VERSION)
+
+    def blob_name(self, digest, name):
+        """Returns the name of a file with the given name and content."""
+        basename = os.path.basename(filetracker.split_name(name)[0])
+        name_format = '%s/%s/%%s@%d' % (BLOBS_DIR, digest, BLOB_VERSION)
+        max_length = MAX_NAME_LENGTH - len(name_format % ('',))
+        if len(basename) > max_length:
+            root, ext = os.path.splitext(basename)
+            basename = root[:max(max_length - len(ext), 0)] + ext
+        return FiletrackerFilename(name_format % (basename,))
+
+    def add_references(self, digests):
+        """Adds a reference to the blob of each of the hashes (which may
+           repeat).
+
+           Returns the set of the hashes of the blobs which are not stored
+           yet. They must be stored with :meth:`upload_blob` and then
+           marked with :meth:`blobs_uploaded`. If that fails, the references
+           must be removed with :meth:`remove_references`.
+
+           This is separate from uploading, so that the (slow) uploads
+           may be run in other threads, without the database.
+        """
+        missing = set()
+        for digest, count in collections.Counter(digests).iteritems():
+            while True:
+                blob, created = FileBlob.objects.get_or_create(
+                        digest=digest, defaults={'refcount': count})
+                # The update fails if the blob has just been removed.
+                if created or FileBlob.objects.filter(digest=digest) \
+                        .update(refcount=F('refcount') + count):
+                    break
+            if created or not blob.uploaded:
+                missing.add(digest)
+        return missing
+
+    def add_name_references(self, names):
+        """Adds a reference to the blob of each of the files which are
+           blobs, e.g. when rows with the files are copied without saving
+           the files again.
+        """
+        digests = [self._blob_digest(self._normalize_name(name))
+                   for name in names]
+        self.add_references([digest for digest in digests if digest])
+
+    def upload_blob(self, digest, filename):
+        self.client.put_file(self._blob_path(digest), filename)
+
+    def blobs_uploaded(self, digests):
+        FileBlob.objects.filter(digest__in=digests).update(uploaded=True)
+
+    def remove_references(self, digests):
+        """Removes the references added by :meth:`add_references`, e.g.
+           when uploading the blobs has failed. The blobs with no references
+           left are removed.
+        """
+        for digest, count in collections.Counter(digests).iteritems():
+            FileBlob.objects.filter(digest=digest) \
+                    .update(refcount=F('refcount') - count)
+            # The blob stays locked until it is removed, so that nobody adds
+            # a reference to it in the meantime.
+            with transaction.commit_on_success():
+                unused = list(FileBlob.objects.select_for_update()
+                        .filter(digest=digest, refcount__lte=0))
+                if not unused:
+                    continue
+                try:
+                    self.client.delete_file(self._blob_path(digest))
+                except Exception:
+                    # The upload of the blob may have failed at any point.
+                    if unused[0].uploaded:
+                        raise
+                FileBlob.objects.filter(digest=digest).delete()
+
+    def _save_blob(self, name, filename):
+        digest = file_digest(filename)
+        if self.add_references([digest]):
+            try:
+                self.upload_blob(digest, filename)
+            except:
+                self.remove_references([digest])
+                raise
+            self.blobs_uploaded([digest])
+        return self.blob_name(digest, name)
+
     def _cut_prefix(self, path):
         assert path.startswith(self.prefix), \
                 'Path passed to _cut_prefix does not start with prefix'
@@ -57,6 +213,9 @@ class FiletrackerStorage(Storage):
             # This happens when used with field assignment
             # We are ignoring suggested name, as copying files in filetracker
             # isn't implemented
+            digest = self._blob_digest(content.file.name)
+            if digest:
+                self.add_references([digest])
             return content.file.name
         elif isinstance(content, FileInFiletracker):
             # This happens when file_field.save(path, file) is called
@@ -68,8 +227,11 @@ class FiletrackerStorage(Storage):
                 f.write(chunk)
             f.flush()
             filename = f.name
-        name = self._cut_prefix(self.client.put_file(path, filename))
-        name = FiletrackerFilename(name)
+        if self.deduplicate:
+            name = self._save_blob(name, filename)
+        else:
+            name = self._cut_prefix(self.client.put_file(path, filename))
+            name = FiletrackerFilename(name)
         content.close()
         return name
 
@@ -85,6 +247,10 @@ class FiletrackerStorage(Storage):
         return self._save(name, content)
 
     def delete(self, name):
+        digest = self._blob_digest(self._normalize_name(name))
+        if digest:
+            self.remove_references([digest])
+            return
         path = self._make_filetracker_path(name)
         self.client.delete_file(path)
 
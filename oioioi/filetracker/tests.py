@@ -1,19 +1,24 @@
 from django.utils import unittest
-from django.test import TestCase
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
 from django.core.files.base import ContentFile
 from django.db.models.fields.files import FieldFile, FileField
 from django.core.files.storage import default_storage
-from oioioi.filetracker.models import TestFileModel
+from oioioi.filetracker.client import CachingClient
+from oioioi.filetracker.models import TestFileModel, FileBlob
 from oioioi.filetracker.storage import FiletrackerStorage
 from oioioi.filetracker.utils import django_to_filetracker_path, \
-        filetracker_to_django_file
+        filetracker_to_django_file, serve_file, _range_iterator
 import filetracker
 import filetracker.dummy
 
+from cStringIO import StringIO
 import tempfile
 import shutil
 import datetime
+import os
+import time
 
 
 class TestFileField(TestCase):
@@ -118,6 +123,141 @@ class TestFileStorage(unittest.TestCase):
             shutil.rmtree(dir)
 
 
+class TestCachingClient(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.remote = filetracker.dummy.DummyDataStore()
+        self.client = CachingClient(self.dir, max_size=10,
+                remote_store=self.remote)
+        self.cache = self.client.local_store
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _add(self, name, data):
+        return self.remote.add_stream(name, StringIO(data))
+
+    def _read(self, name):
+        return self.client.get_stream(name)[0].read()
+
+    def test_lru_eviction(self):
+        a = self._add('/a', 'aaaaa')
+        b = self._add('/b', 'bbbbb')
+        c = self._add('/c', 'ccccc')
+        self.assertEqual(self._read(a), 'aaaaa')
+        self.assertEqual(self._read(b), 'bbbbb')
+        self.assertEqual(self._read(a), 'aaaaa')
+        self.assertTrue(self.cache.exists(a))
+        self.assertTrue(self.cache.exists(b))
+
+        self.assertEqual(self._read(c), 'ccccc')
+        self.assertTrue(self.cache.exists(b))
+        self.cache.evict()
+        self.assertTrue(self.cache.exists(a))
+        self.assertFalse(self.cache.exists(b))
+        self.assertTrue(self.cache.exists(c))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 3)
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['size'], 10)
+        self.assertEqual(stats['hit_ratio'], 0.25)
+
+    def test_pinning(self):
+        a = self._add('/a', 'aaaaa')
+        b = self._add('/b', 'bbbbb')
+        self.cache.pin_files('test', [a])
+        self.cache.pin_files('expired', [b], expires=time.time() - 1)
+        self.assertEqual(self.cache.pinned_files(), set(['/a']))
+        self.assertEqual(os.listdir(self.cache.pins_dir), ['test'])
+
+        self._read(a)
+        self._read(b)
+        self._read(self._add('/c', 'ccccc'))
+        self.cache.evict()
+        self.assertTrue(self.cache.exists(a))
+        self.assertFalse(self.cache.exists(b))
+
+        self.cache.unpin_files('test')
+        self._read(b)
+        self.cache.evict()
+        self.assertFalse(self.cache.exists(a))
+
+    def test_stats_flushed_periodically(self):
+        a = self._add('/a', 'aaaaa')
+        self._read(a)
+        self._read(a)
+        other = CachingClient(self.dir, max_size=10,
+                remote_store=self.remote).local_store
+        self.assertEqual(other.stats()['hits'], 0)
+
+        self.cache.stats_interval = 0
+        self._read(a)
+        self.assertEqual(other.stats()['hits'], 2)
+        self.assertEqual(other.stats()['misses'], 1)
+
+    def test_max_age(self):
+        self.cache.max_age = 3600
+        a = self._add('/a', 'aaaaa')
+        self._read(a)
+        path = self.cache._parse_name(a)[0]
+        os.utime(path, (time.time() - 7200, os.stat(path).st_mtime))
+        self.cache.evict()
+        self.assertFalse(self.cache.exists(a))
+
+
+class TestDeduplication(TestCase):
+    def setUp(self):
+        self.storage = FiletrackerStorage(
+                client=filetracker.dummy.DummyClient(), deduplicate=True)
+
+    def test_deduplication(self):
+        name = self.storage.save('a/foo.in', ContentFile('eloziom'))
+        other_name = self.storage.save('b/bar.out', ContentFile('eloziom'))
+        self.assertTrue(name.startswith('blobs/'))
+        self.assertTrue(name.endswith('/foo.in'))
+        self.assertTrue(other_name.endswith('/bar.out'))
+        path = self.storage._make_filetracker_path(name)
+        self.assertEqual(path,
+                self.storage._make_filetracker_path(other_name))
+        self.assertEqual(self.storage.open(other_name).read(), 'eloziom')
+        self.assertEqual(FileBlob.objects.get().refcount, 2)
+
+        self.storage.delete(name)
+        self.assertEqual(self.storage.open(other_name).read(), 'eloziom')
+        self.storage.delete(other_name)
+        self.assertFalse(FileBlob.objects.exists())
+        self.assertFalse(self.storage.exists(other_name))
+
+    def test_existing_file_assignment(self):
+        name = self.storage.save('foo.in', ContentFile('eloziom'))
+        path = self.storage._make_filetracker_path(name)
+        model = TestFileModel()
+        model.file_field = filetracker_to_django_file(path, self.storage)
+        self.storage.save(None, model.file_field)
+        self.assertEqual(FileBlob.objects.get().refcount, 2)
+
+    def test_failed_upload(self):
+        def upload_blob(digest, filename):
+            raise IOError('EXPECTED FAILURE')
+        self.storage.upload_blob = upload_blob
+        with self.assertRaises(IOError):
+            self.storage.save('foo.in', ContentFile('eloziom'))
+        self.assertFalse(FileBlob.objects.exists())
+
+    def test_name_references(self):
+        name = self.storage.save('foo.in', ContentFile('eloziom'))
+        self.storage.add_name_references([name, 'foo.in'])
+        self.assertEqual(FileBlob.objects.get().refcount, 2)
+
+    def test_long_names(self):
+        name = self.storage.save('x' * 200 + '.in', ContentFile('eloziom'))
+        self.assertEqual(len(name.versioned_name), 100)
+        self.assertTrue(name.endswith('xx.in'))
+        self.assertEqual(self.storage.open(name).read(), 'eloziom')
+
+
 class TestStreamingMixin(object):
     def assertStreamingEqual(self, response, content):
         self.assertEqual(self.streamingContent(response), content)
@@ -127,6 +267,86 @@ class TestStreamingMixin(object):
         return ''.join(response.streaming_content)
 
 
+class TestServeFile(TestCase, TestStreamingMixin):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.storage = FiletrackerStorage(client=filetracker.Client(
+                cache_dir=self.dir, remote_store=None))
+        self.name = self.storage.save('foo.txt', ContentFile('0123456789'))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _serve(self, **headers):
+        request = RequestFactory().get('/', **headers)
+        field_file = FieldFile(None, FileField(storage=self.storage),
+                self.name)
+        return serve_file(request, field_file, 'text/plain')
+
+    def test_ranges(self):
+        response = self._serve(HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertStreamingEqual(response, '234')
+        self.assertStreamingEqual(self._serve(HTTP_RANGE='bytes=-3'), '789')
+        self.assertStreamingEqual(self._serve(HTTP_RANGE='bytes=5-'),
+                '56789')
+        self.assertEqual(self._serve(HTTP_RANGE='bytes=20-').status_code,
+                416)
+
+        response = self._serve(HTTP_RANGE='bytes=1-2,5-6')
+        self.assertEqual(response.status_code, 200)
+        self.assertStreamingEqual(response, '0123456789')
+        response = self._serve(HTTP_RANGE='bytes=2-4',
+                HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_etag(self):
+        etag = self._serve()['ETag']
+        self.assertEqual(self._serve(HTTP_IF_NONE_MATCH=etag).status_code,
+                304)
+        self.assertEqual(self._serve(HTTP_IF_NONE_MATCH='"other"')
+                .status_code, 200)
+        response = self._serve(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_sendfile(self):
+        with override_settings(FILETRACKER_SENDFILE='X-Sendfile'):
+            response = self._serve()
+            self.assertEqual(response['X-Sendfile'],
+                    os.path.join(self.dir, 'files', 'foo.txt'))
+            self.assertEqual(response.content, '')
+        with override_settings(FILETRACKER_SENDFILE='X-Accel-Redirect'):
+            self.assertEqual(self._serve()['X-Accel-Redirect'],
+                    '/filetracker-files/foo.txt')
+
+    def test_sendfile_touches_cached_file(self):
+        client = CachingClient(self.dir, max_size=100,
+                remote_store=filetracker.dummy.DummyDataStore())
+        self.storage = FiletrackerStorage(client=client)
+        self.name = self.storage.save('bar.txt', ContentFile('0123456789'))
+        path = os.path.join(self.dir, 'files', 'bar.txt')
+        os.utime(path, (time.time() - 7200, os.stat(path).st_mtime))
+        with override_settings(FILETRACKER_SENDFILE='X-Sendfile'):
+            self.assertEqual(self._serve()['X-Sendfile'], path)
+        self.assertGreater(os.stat(path).st_atime, time.time() - 3600)
+
+    def test_range_of_truncated_stream(self):
+        class Stream(object):
+            def __init__(self, data):
+                self.stream = StringIO(data)
+                self.read = self.stream.read
+                self.close = self.stream.close
+
+            def seek(self, offset):
+                raise IOError("Illegal seek")
+
+        self.assertEqual(list(_range_iterator(Stream('0123456789'), 2, 3)),
+                ['234'])
+        self.assertEqual(list(_range_iterator(Stream('012'), 5, 3)), [])
+
+
 class TestFileStorageViews(TestCase, TestStreamingMixin):
     fixtures = ['test_users']
 
@@ -145,6 +365,9 @@ class TestFileStorageViews(TestCase, TestStreamingMixin):
             self.client.login(username='test_admin')
             response = self.client.get(url)
             self.assertStreamingEqual(response, content)
+            response = self.client.get(url, HTTP_RANGE='bytes=1-')
+            self.assertEqual(response.status_code, 206)
+            self.assertStreamingEqual(response, content[1:])
         finally:
             default_storage.delete(filename)
 
@@ -1,11 +1,17 @@
 # pylint: disable=W0201
 # Attribute '_size' defined outside __init__
+from django.conf import settings
 from django.core.servers.basehttp import FileWrapper
 from django.core.files.storage import default_storage
 from django.core.files import File
-from django.http import StreamingHttpResponse
+from django.http import HttpResponse, HttpResponseNotModified, \
+        StreamingHttpResponse
+from oioioi.filetracker.client import LRUCacheDataStore
 from oioioi.filetracker.filename import FiletrackerFilename
+import filetracker
+import hashlib
 import mimetypes
+import re
 
 
 class FileInFiletracker(File):
@@ -62,7 +68,165 @@ def filetracker_to_django_file(filetracker_path, storage=None):
             FiletrackerFilename(filetracker_path[prefix_len + 1:]))
 
 
-def stream_file(django_file, name=None, showable=None):
+def _filetracker_path(django_file, storage=None):
+    """Returns a pair ``(client, path)`` for a file stored in Filetracker,
+       or ``(None, None)``.
+    """
+    storage = storage or getattr(django_file, 'storage', None)
+    if not hasattr(storage, '_make_filetracker_path'):
+        return None, None
+    name = django_file.name
+    if hasattr(name, 'versioned_name'):
+        name = name.versioned_name
+    return storage.client, storage._make_filetracker_path(name)
+
+
+def _local_file_path(client, path):
+    """Returns the path of the file in the local Filetracker store, if it
+       is there and is up to date.
+    """
+    local_store = client.local_store
+    if not isinstance(local_store, filetracker.LocalDataStore):
+        return None
+    if client.remote_store and filetracker.split_name(path)[1] is None:
+        # The local copy may be out of date.
+        return None
+    if not local_store.exists(path):
+        return None
+    return local_store.dir + filetracker.split_name(path)[0]
+
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _parse_range(header, size):
+    """Parses the value of the ``Range`` header.
+
+       Returns a pair ``(start, end)`` (inclusive) for a single satisfiable
+       byte range, ``False`` for an unsatisfiable one and ``None`` if the
+       header should be ignored (e.g. multiple ranges are requested).
+    """
+    match = _range_re.match(header.replace(' ', ''))
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if not start:
+        # The last bytes of the file.
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return False
+    return start, end
+
+
+def _range_iterator(django_file, start, length, chunk_size=65536):
+    try:
+        django_file.seek(start)
+    except (AttributeError, IOError, ValueError):
+        # E.g. streams from a remote Filetracker server cannot seek.
+        while start > 0:
+            data = django_file.read(min(start, chunk_size))
+            if not data:
+                # The file is shorter than its size.
+                break
+            start -= len(data)
+    while length > 0:
+        data = django_file.read(min(length, chunk_size))
+        if not data:
+            break
+        length -= len(data)
+        yield data
+    django_file.close()
+
+
+def serve_file(request, django_file, content_type, storage=None,
+        etag=None):
+    """Returns a response with the content of ``django_file``.
+
+       If the file is stored in Filetracker (either ``django_file``, like
+       a ``FieldFile``, or ``storage`` refers to the
+       :class:`~oioioi.filetracker.storage.FiletrackerStorage`), its
+       versioned name is used for the ``ETag`` header, so that conditional
+       requests are answered with ``304 Not Modified``. The version is not
+       used as ``Last-Modified``, as files stored by their content all have
+       the same version.
+
+       Single byte ranges (``Range`` and ``If-Range`` headers) are supported,
+       so that interrupted downloads may be resumed.
+
+       If ``settings.FILETRACKER_SENDFILE`` is set and the file is in the
+       local Filetracker store, sending it is left to the front-end server,
+       with the ``X-Sendfile`` or ``X-Accel-Redirect`` header. A file in
+       a :class:`~oioioi.filetracker.client.LRUCacheDataStore` is marked as
+       used then, so that it is not removed from the cache as unused.
+
+       The ``etag`` argument may be used to give the ``ETag`` of a file
+       which is not stored in Filetracker.
+
+       ``request`` may be ``None``, and then the whole file is sent.
+    """
+    client, path = _filetracker_path(django_file, storage)
+    version = path and filetracker.split_name(path)[1]
+    headers = {}
+    if version is not None:
+        headers['ETag'] = '"%s"' % (
+                hashlib.sha1(path.encode('utf-8')).hexdigest(),)
+    if etag is not None:
+        headers['ETag'] = etag
+    meta = request.META if request is not None else {}
+
+    if_none_match = [value.strip() for value
+                     in meta.get('HTTP_IF_NONE_MATCH', '').split(',')]
+    if 'ETag' in headers and (headers['ETag'] in if_none_match
+                              or '*' in if_none_match):
+        response = HttpResponseNotModified()
+        response['ETag'] = headers['ETag']
+        return response
+
+    local_path = settings.FILETRACKER_SENDFILE and client and \
+            _local_file_path(client, path)
+    if local_path:
+        if isinstance(client.local_store, LRUCacheDataStore):
+            # The front-end server reads the file behind the cache's back.
+            client.local_store.touch(path)
+        response = HttpResponse(content_type=content_type)
+        if settings.FILETRACKER_SENDFILE == 'X-Accel-Redirect':
+            response['X-Accel-Redirect'] = \
+                    settings.FILETRACKER_SENDFILE_PREFIX.rstrip('/') + \
+                    filetracker.split_name(path)[0]
+        else:
+            response['X-Sendfile'] = local_path
+    else:
+        size = django_file.size
+        byte_range = None
+        if_range = meta.get('HTTP_IF_RANGE')
+        if 'HTTP_RANGE' in meta and (if_range is None
+                or 'ETag' in headers and if_range == headers['ETag']):
+            byte_range = _parse_range(meta['HTTP_RANGE'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % (size,)
+            return response
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                    _range_iterator(django_file, start, end - start + 1),
+                    status=206, content_type=content_type)
+            response['Content-Range'] = 'bytes %d-%d/%d' % (start, end, size)
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(FileWrapper(django_file),
+                    content_type=content_type)
+            response['Content-Length'] = size
+        response['Accept-Ranges'] = 'bytes'
+    for header, value in headers.iteritems():
+        response[header] = value
+    return response
+
+
+def stream_file(django_file, name=None, showable=None, request=None):
     """Returns a :class:`HttpResponse` representing a file download.
 
        Optional argument ``name`` sets default filename under which
@@ -72,14 +236,15 @@ def stream_file(django_file, name=None, showable=None):
        by default be displayed in browser. Other are forced to be downloaded.
        Using ``showable`` flag, default behaviour may be overriden in both
        directions.
+
+       If the ``request`` is given, conditional and partial requests are
+       handled, too (see :func:`serve_file`).
     """
     if name is None:
         name = unicode(django_file.name.rsplit('/', 1)[-1])
     content_type = mimetypes.guess_type(name)[0] or \
         'application/octet-stream'
-    response = StreamingHttpResponse(FileWrapper(django_file),
-        content_type=content_type)
-    response['Content-Length'] = django_file.size
+    response = serve_file(request, django_file, content_type)
     showable_exts = ['pdf', 'ps', 'txt']
     if showable is None:
         extension = name.rsplit('.')[-1]
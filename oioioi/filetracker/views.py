@@ -1,7 +1,7 @@
 from django.core.files.storage import default_storage
-from django.http import Http404, StreamingHttpResponse
+from django.http import Http404
 from django.core.exceptions import PermissionDenied
-from django.core.servers.basehttp import FileWrapper
+from oioioi.filetracker.utils import serve_file
 import mimetypes
 
 
@@ -16,7 +16,4 @@ def raw_file_view(request, filename):
     file = default_storage.open(filename, 'rb')
     content_type = mimetypes.guess_type(file.name)[0] or \
         'application/octet-stream'
-    response = StreamingHttpResponse(FileWrapper(file),
-                                     content_type=content_type)
-    response['Content-Length'] = file.size
-    return response
+    return serve_file(request, file, content_type, storage=default_storage)
@@ -1,5 +1,7 @@
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
@@ -8,6 +10,7 @@ from oioioi.base.utils.deps import check_django_app_dependencies
 from oioioi.contests.models import Contest
 from oioioi.participants.fields import \
         OneToOneBothHandsCascadingParticipantField
+from oioioi.rankings.models import invalidate_rankings
 
 
 check_django_app_dependencies(__name__, ['oioioi.contestexcl'])
@@ -43,6 +46,15 @@ class Participant(models.Model):
         return unicode(self.user)
 
 
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def _invalidate_rankings_on_participant_change(sender, instance, raw=False,
+        **kwargs):
+    # Some rankings show only the participants of the contest.
+    if not raw:
+        invalidate_rankings(instance.contest_id)
+
+
 class RegistrationModel(models.Model):
     participant = OneToOneBothHandsCascadingParticipantField(Participant,
             related_name='%(app_label)s_%(class)s')
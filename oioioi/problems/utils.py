@@ -1,5 +1,17 @@
+import errno
+import fcntl
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+
 from oioioi.base.utils import request_cached
 from oioioi.contests.utils import is_contest_admin
+from oioioi.filetracker.utils import django_to_filetracker_path
 
 
 @request_cached
@@ -17,3 +29,144 @@ def can_change_problem(request, problem):
             problem.contest):
         return True
     return False
+
+
+def get_statement_zip_cache_dir():
+    return settings.PROBLEM_STATEMENT_ZIP_CACHE_DIR or \
+            os.path.join(tempfile.gettempdir(), 'oioioi-statement-zips')
+
+
+def statement_zip_key(statement):
+    """Returns a key identifying the version of the content of the zip
+       statement.
+    """
+    path = django_to_filetracker_path(statement.content)
+    return hashlib.sha1(('%d:%s' % (statement.id, path)).encode('utf-8')) \
+            .hexdigest()
+
+
+def _extract_zip(zip_file, target_dir):
+    for info in zip_file.infolist():
+        name = info.filename
+        if name.endswith('/'):
+            continue
+        local_path = os.path.normpath(os.path.join(target_dir, name))
+        if os.path.isabs(name) or \
+                not local_path.startswith(target_dir + os.sep):
+            continue
+        if not os.path.isdir(os.path.dirname(local_path)):
+            os.makedirs(os.path.dirname(local_path))
+        source = zip_file.open(info)
+        try:
+            with open(local_path, 'wb') as f:
+                shutil.copyfileobj(source, f)
+        finally:
+            source.close()
+
+
+def _extract_statement_zip(statement, target_dir):
+    cache_dir = os.path.dirname(target_dir)
+    tmp_dir = tempfile.mkdtemp(dir=cache_dir, prefix='.tmp')
+    try:
+        with tempfile.TemporaryFile() as archive:
+            # The zip file must be seekable, which the Filetracker stream
+            # need not be.
+            statement.content.open('rb')
+            try:
+                shutil.copyfileobj(statement.content, archive)
+            finally:
+                statement.content.close()
+            zip_file = zipfile.ZipFile(archive)
+            try:
+                _extract_zip(zip_file, tmp_dir)
+            finally:
+                zip_file.close()
+        try:
+            os.rename(tmp_dir, target_dir)
+        except OSError:
+            # Extracted concurrently by a process which locked a lock file
+            # just removed by the cleanup.
+            if not os.path.isdir(target_dir):
+                raise
+    finally:
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+
+
+def cleanup_statement_zip_cache():
+    """Removes the extracted zip statements which have not been used for
+       ``settings.PROBLEM_STATEMENT_ZIP_CACHE_TIMEOUT`` seconds.
+
+       The extracted versions of statements which are still in use are
+       locked, so they are skipped.
+    """
+    cache_dir = get_statement_zip_cache_dir()
+    deadline = time.time() - settings.PROBLEM_STATEMENT_ZIP_CACHE_TIMEOUT
+    try:
+        names = os.listdir(cache_dir)
+    except OSError, e:
+        if e.errno != errno.ENOENT:
+            raise
+        return
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        try:
+            if os.path.getmtime(path) >= deadline:
+                continue
+        except OSError:
+            continue
+        if name.startswith('.tmp'):
+            # Left by an interrupted extraction.
+            shutil.rmtree(path, ignore_errors=True)
+            continue
+        if name.endswith('.lock'):
+            continue
+        with open(path + '.lock', 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                continue
+            if os.path.getmtime(path) < deadline:
+                shutil.rmtree(path, ignore_errors=True)
+                os.unlink(path + '.lock')
+
+
+def get_statement_zip_dir(statement):
+    """Returns the local directory with the extracted content of the zip
+       statement.
+
+       Each version of the statement is extracted only once, to
+       a subdirectory of ``settings.PROBLEM_STATEMENT_ZIP_CACHE_DIR``, so
+       that serving the files of an HTML statement does not require
+       fetching and decompressing the whole zip again. Members with
+       absolute names or leading outside of the archive are skipped.
+
+       The extraction is guarded by a lock on ``<key>.lock``, so that
+       concurrent requests wait for a single process to extract the
+       statement. Versions unused for
+       ``settings.PROBLEM_STATEMENT_ZIP_CACHE_TIMEOUT`` seconds are removed
+       whenever a new one is extracted.
+    """
+    cache_dir = get_statement_zip_cache_dir()
+    target_dir = os.path.join(cache_dir, statement_zip_key(statement))
+    try:
+        os.makedirs(cache_dir)
+    except OSError, e:
+        if e.errno != errno.EEXIST:
+            raise
+
+    extracted = False
+    with open(target_dir + '.lock', 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_SH)
+        if not os.path.isdir(target_dir):
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if not os.path.isdir(target_dir):
+                _extract_statement_zip(statement, target_dir)
+                extracted = True
+        # The modification time tells the cleanup when the statement was
+        # last used.
+        os.utime(target_dir, None)
+
+    if extracted:
+        cleanup_statement_zip_cache()
+    return target_dir
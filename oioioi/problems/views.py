@@ -22,14 +22,14 @@ def show_statement_view(request, statement_id):
     statement = get_object_or_404(ProblemStatement, id=statement_id)
     if not request.user.has_perm('problems.problem_admin', statement.problem):
         raise PermissionDenied
-    return stream_file(statement.content)
+    return stream_file(statement.content, request=request)
 
 
 def show_problem_attachment_view(request, attachment_id):
     attachment = get_object_or_404(ProblemAttachment, id=attachment_id)
     if not request.user.has_perm('problems.problem_admin', attachment.problem):
         raise PermissionDenied
-    return stream_file(attachment.content)
+    return stream_file(attachment.content, request=request)
 
 
 def add_or_update_problem_view(request, contest_id=None):
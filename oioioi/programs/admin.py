@@ -2,17 +2,20 @@ from django.contrib import admin, messages
 from django.template.response import TemplateResponse
 from django.conf.urls import patterns, url
 from django.core.exceptions import PermissionDenied
-from django.utils.translation import ugettext_lazy as _
+from django.utils.translation import ugettext_lazy as _, ungettext_lazy
 from django.shortcuts import redirect
 from django.core.urlresolvers import reverse
 from django.contrib.admin.util import unquote
 from django.utils.html import conditional_escape
 from django.utils.encoding import force_unicode
 from oioioi.base.utils import make_html_link
-from oioioi.contests.admin import ProblemInstanceAdmin, SubmissionAdmin
+from oioioi.contests.admin import ContestAdmin, ProblemInstanceAdmin, \
+        SubmissionAdmin
 from oioioi.contests.scores import IntegerScore
+from oioioi.contests.tasks import start_bulk_rejudge
 from oioioi.programs.models import Test, ModelSolution, TestReport, \
-        GroupReport, ModelProgramSubmission, OutputChecker
+        GroupReport, ModelProgramSubmission, OutputChecker, \
+        CompilationCacheConfig
 from collections import defaultdict
 
 
@@ -220,7 +223,8 @@ SubmissionAdmin.mix_in(ModelSubmissionAdminMixin)
 class ProgramSubmissionAdminMixin(object):
     def __init__(self, *args, **kwargs):
         super(ProgramSubmissionAdminMixin, self).__init__(*args, **kwargs)
-        self.actions += ['submission_diff_action']
+        self.actions += ['submission_diff_action',
+                'rejudge_changed_tests_action']
 
     def submission_diff_action(self, request, queryset):
         if len(queryset) != 2:
@@ -234,4 +238,32 @@ class ProgramSubmissionAdminMixin(object):
                         submission1_id=id_older, submission2_id=id_newer)
     submission_diff_action.short_description = _("Diff submissions")
 
+    def rejudge_changed_tests_action(self, request, queryset):
+        rejudge = start_bulk_rejudge(request.contest,
+                queryset.values_list('id', flat=True), creator=request.user,
+                extra_args={'incremental_rejudge': ''})
+        counter = rejudge.total
+        self.message_user(
+            request,
+            ungettext_lazy("Queued one submission for rejudge of the "
+                           "changed tests.",
+                           "Queued %(counter)d submissions for rejudge of "
+                           "the changed tests.",
+                           counter)
+            % {'counter': counter})
+    rejudge_changed_tests_action.short_description = \
+            _("Rejudge changed tests of selected submissions")
+
 SubmissionAdmin.mix_in(ProgramSubmissionAdminMixin)
+
+
+class CompilationCacheConfigInline(admin.TabularInline):
+    model = CompilationCacheConfig
+
+
+class CompilationCacheAdminMixin(object):
+    def __init__(self, *args, **kwargs):
+        super(CompilationCacheAdminMixin, self).__init__(*args, **kwargs)
+        self.inlines = self.inlines + [CompilationCacheConfigInline]
+
+ContestAdmin.mix_in(CompilationCacheAdminMixin)
@@ -19,7 +19,7 @@ from oioioi.contests.models import SubmissionReport, ScoreReport
 from oioioi.contests.controllers import submission_template_context
 from oioioi.programs.models import ProgramSubmission, OutputChecker, \
         CompilationReport, TestReport, GroupReport, ModelProgramSubmission, \
-        Submission
+        Submission, is_compilation_cache_enabled
 from oioioi.filetracker.utils import django_to_filetracker_path
 from oioioi.evalmgr import recipe_placeholder, add_before_placeholder, \
         extend_after_placeholder
@@ -28,6 +28,13 @@ from oioioi.contests.utils import is_contest_admin, is_contest_observer
 logger = logging.getLogger(__name__)
 
 
+def _hash_file(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
 class ProgrammingProblemController(ProblemController):
     description = _("Simple programming problem")
 
@@ -140,6 +147,12 @@ class ProgrammingProblemController(ProblemController):
 
         recipe_body = self.generate_recipe(environ['report_kinds'])
 
+        if 'incremental_rejudge' in environ.get('extra_args', {}):
+            index = [entry[0] for entry in recipe_body] \
+                    .index('collect_tests')
+            recipe_body.insert(index + 1, ('reuse_test_results',
+                    'oioioi.programs.handlers.reuse_test_results'))
+
         extend_after_placeholder(environ, 'after_compile', recipe_body)
 
         environ.setdefault('group_scorer',
@@ -163,6 +176,12 @@ class ProgrammingContestController(ContestController):
     def get_compilation_result_size_limit(self):
         return 10 * 1024 * 1024
 
+    def get_supported_extra_args(self, submission):
+        extra_args = super(ProgrammingContestController, self) \
+                .get_supported_extra_args(submission)
+        extra_args['incremental_rejudge'] = _("Only changed tests")
+        return extra_args
+
     def _get_language(self, source_file):
         return os.path.splitext(source_file.name)[1][1:]
 
@@ -173,12 +192,52 @@ class ProgrammingContestController(ContestController):
         environ['language'] = self._get_language(submission.source_file)
         environ['compilation_result_size_limit'] = \
             self.get_compilation_result_size_limit()
+        # Model solutions and admins' submissions should have full reports.
+        environ['abort_failed_groups'] = submission.kind == 'NORMAL' and \
+            getattr(settings, 'ABORT_FAILED_TEST_GROUPS', False)
+        environ['use_compilation_cache'] = \
+            settings.COMPILATION_CACHE_MAX_ENTRIES > 0 and \
+            is_compilation_cache_enabled(
+                submission.problem_instance.contest_id)
 
         super(ProgrammingContestController,
                 self).fill_evaluation_environ(environ, submission)
 
         self.fill_evaluation_environ_post_problem(environ, submission)
 
+        if settings.DEDUPLICATE_IDENTICAL_SUBMISSIONS and \
+                not environ.get('is_rejudge') and \
+                not environ.get('extra_args'):
+            identical = self.get_identical_submission(submission)
+            if identical is not None:
+                environ['identical_submission_id'] = identical.id
+                environ['recipe'].insert(0,
+                        ('clone_identical_submission_reports',
+                            'oioioi.programs.handlers.'
+                            'clone_identical_submission_reports'))
+
+    def get_identical_submission(self, submission):
+        """Returns the latest judged submission of the same user to the same
+           problem instance, with an identical source file in the same
+           language, or ``None``.
+
+           Its reports may be copied instead of judging the ``submission``
+           (see ``settings.DEDUPLICATE_IDENTICAL_SUBMISSIONS``).
+        """
+        if not submission.source_hash or submission.user_id is None \
+                or submission.kind != 'NORMAL':
+            return None
+        language = self._get_language(submission.source_file)
+        candidates = ProgramSubmission.objects.filter(
+                problem_instance=submission.problem_instance_id,
+                user=submission.user_id, kind=submission.kind,
+                source_hash=submission.source_hash, id__lt=submission.id) \
+                .exclude(status='?').order_by('-id')
+        for candidate in candidates:
+            if self._get_language(candidate.source_file) == language:
+                return candidate
+        return None
+
     def fill_evaluation_environ_post_problem(self, environ, submission):
         """Run after ProblemController.fill_evaluation_environ."""
         if 'INITIAL' in environ['report_kinds']:
@@ -360,6 +419,7 @@ class ProgrammingContestController(ContestController):
             extension = lang_exts[form_data['prog_lang']][0]
             file = ContentFile(form_data['code'], '__pasted_code.' + extension)
 
+        submission.source_hash = _hash_file(file)
         submission.source_file.save(file.name, file)
         submission.save()
         if judge_after_create:
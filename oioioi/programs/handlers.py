@@ -1,17 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
 from django.db import transaction
+from django.db.models import Count, Sum, FileField
+from django.utils import timezone
+from oioioi import evalmgr
 from oioioi.base.utils import get_object_by_dotted_name
-from oioioi.sioworkers.jobs import run_sioworkers_job, run_sioworkers_jobs
+from oioioi.sioworkers.jobs import run_sioworkers_job, \
+        run_sioworkers_jobs_iter
 from oioioi.contests.scores import ScoreValue
 from oioioi.contests.models import Submission, SubmissionReport, \
         ScoreReport
 from oioioi.programs.models import CompilationReport, TestReport, \
-        GroupReport, Test
+        GroupReport, Test, CompiledBinary, get_tests_version
 from oioioi.programs.utils import slice_str
-from oioioi.problems.models import Problem
 from oioioi.filetracker.client import get_client
 from oioioi.filetracker.utils import django_to_filetracker_path
 import logging
 import functools
+import hashlib
 from collections import defaultdict
 import types
 
@@ -24,6 +31,12 @@ DEFAULT_GROUP_SCORER = \
 DEFAULT_SCORE_AGGREGATOR = \
         'oioioi.programs.utils.sum_score_aggregator'
 
+#: Group scorers for which a single failed test determines the group result,
+#: so the remaining tests of the group may be skipped.
+ABORTABLE_GROUP_SCORERS = [
+        'oioioi.programs.utils.min_group_scorer',
+]
+
 
 def _make_filename(env, base_name):
     """Create a filename in the filetracker for storing outputs
@@ -77,6 +90,11 @@ def compile(env, **kwargs):
             env['compilation_result'] is set to OK and contains compiled
             binary path
           * env['compilation_message'] - contains compiler stdout and stderr
+
+       If ``env['use_compilation_cache']`` is set, the results of identical
+       compilations are reused (see
+       :class:`~oioioi.programs.models.CompiledBinary`). Cached executables
+       are not removed by :func:`delete_executable`.
     """
 
     compilation_job = env.copy()
@@ -85,20 +103,181 @@ def compile(env, **kwargs):
     if 'language' in env and 'compiler' not in env:
         compilation_job['compiler'] = 'default-' + env['language']
 
+    if env.get('use_compilation_cache'):
+        key = compilation_cache_key(compilation_job)
+        try:
+            entry = CompiledBinary.objects.get(key=key)
+        except CompiledBinary.DoesNotExist:
+            env['compilation_cache_key'] = key
+            compilation_job['out_file'] = '/compilation_cache/' + key
+        else:
+            CompiledBinary.objects.filter(id=entry.id) \
+                    .update(last_used=timezone.now())
+            env['compiled_file'] = entry.compiled_file or None
+            env['compiled_file_cached'] = True
+            env['compilation_message'] = entry.compilation_message
+            env['compilation_result'] = entry.compilation_result
+            return env
+
+    if evalmgr.can_suspend(env):
+        return evalmgr.wait_for_jobs(env, {'compile': compilation_job},
+                ('compile_finished', 'oioioi.programs.handlers.'
+                 'compile_finished'))
+
     new_env = run_sioworkers_job(compilation_job)
+    return compile_finished(env, {'compile': new_env})
+
 
+def compile_finished(env, results, **kwargs):
+    """Stores the result of the compilation job started by :func:`compile`.
+    """
+    new_env = results['compile']
     env['compiled_file'] = new_env.get('out_file')
     env['compilation_message'] = new_env.get('compiler_output', '')
     env['compilation_result'] = new_env.get('result_code', 'CE')
+
+    key = env.pop('compilation_cache_key', None)
+    # Compilation errors are not cached, as they may be caused by a problem
+    # of the worker (e.g. lack of memory or a timeout).
+    if key and env['compilation_result'] == 'OK':
+        _cache_compilation(key, env)
     return env
 
 
+def _hash_filetracker_file(path):
+    reader, _version = get_client().get_stream(path)
+    digest = hashlib.sha256()
+    try:
+        for chunk in iter(lambda: reader.read(65536), ''):
+            digest.update(chunk)
+    finally:
+        reader.close()
+    return digest.hexdigest()
+
+
+def compilation_cache_key(job):
+    """Returns the compilation cache key of a ``compile`` job.
+
+       The key is a hash of the contents of the source file and extra
+       files, the compiler, the language, the extra compilation arguments
+       and ``settings.COMPILATION_CACHE_COMPILERS_VERSION``.
+    """
+    digest = hashlib.sha256(_hash_filetracker_file(job['source_file']))
+    for name, path in sorted(job.get('extra_files', {}).iteritems()):
+        digest.update('\0%s\0%s' % (name, _hash_filetracker_file(path)))
+    digest.update('\0%r\0%r\0%r\0%r' % (job.get('compiler'),
+            job.get('language'), job.get('extra_compilation_args'),
+            settings.COMPILATION_CACHE_COMPILERS_VERSION))
+    return digest.hexdigest()
+
+
+def _cache_compilation(key, env):
+    compiled_file = env['compiled_file'] or ''
+    size = 0
+    if compiled_file:
+        size = get_client().file_size(compiled_file)
+    entry, created = CompiledBinary.objects.get_or_create(key=key,
+            defaults=dict(compiled_file=compiled_file,
+                          size=size,
+                          compilation_result=env['compilation_result'],
+                          compilation_message=env['compilation_message']))
+    env['compiled_file_cached'] = True
+    # Computing the size of the cache needs a scan of the whole table, so
+    # it is done only once in a while.
+    if created and \
+            entry.id % settings.COMPILATION_CACHE_EVICTION_INTERVAL == 0:
+        _evict_compilation_cache()
+
+
+# Recently used executables are never evicted, as they may still be used by
+# running evaluations.
+COMPILATION_CACHE_MIN_AGE = timedelta(hours=1)
+
+
+def _evict_compilation_cache():
+    """Removes the least recently used entries of the compilation cache
+       until it fits in ``settings.COMPILATION_CACHE_MAX_ENTRIES`` and
+       ``settings.COMPILATION_CACHE_MAX_SIZE``.
+    """
+    max_entries = settings.COMPILATION_CACHE_MAX_ENTRIES
+    max_size = settings.COMPILATION_CACHE_MAX_SIZE
+    stats = CompiledBinary.objects.aggregate(count=Count('id'),
+            size=Sum('size'))
+    count, size = stats['count'], stats['size'] or 0
+    if count <= max_entries and size <= max_size:
+        return
+
+    entries = CompiledBinary.objects \
+            .filter(last_used__lt=timezone.now() - COMPILATION_CACHE_MIN_AGE) \
+            .order_by('last_used')
+    for entry in entries.iterator():
+        if count <= max_entries and size <= max_size:
+            break
+        entry.delete()
+        if entry.compiled_file:
+            get_client().delete_file(entry.compiled_file)
+        count -= 1
+        size -= entry.size
+
+
+# Test environments of recently judged problems, mapping problem ids to
+# pairs (tests version, dict of test environments).
+_tests_cache = {}
+_tests_cache_stats = {'hits': 0, 'misses': 0}
+
+
+def get_tests_cache_stats():
+    """Returns a dictionary with the numbers of ``hits`` and ``misses`` of
+       the tests cache used by :func:`collect_tests` in this process.
+    """
+    return dict(_tests_cache_stats)
+
+
+def _make_test_env(test):
+    test_env = {}
+    test_env['id'] = test.id
+    test_env['name'] = test.name
+    test_env['in_file'] = django_to_filetracker_path(test.input_file)
+    test_env['hint_file'] = django_to_filetracker_path(test.output_file)
+    test_env['kind'] = test.kind
+    test_env['group'] = test.group or test.name
+    test_env['max_score'] = test.max_score
+    if test.time_limit:
+        test_env['exec_time_limit'] = test.time_limit
+    if test.memory_limit:
+        test_env['exec_mem_limit'] = test.memory_limit
+    return test_env
+
+
+def _get_test_envs(problem_id):
+    # The version must be read before the tests. Otherwise a change made
+    # between the two queries could be cached as the older version.
+    version = get_tests_version(problem_id)
+    cached = _tests_cache.get(problem_id)
+    if cached is not None and cached[0] == version:
+        _tests_cache_stats['hits'] += 1
+        return cached[1]
+
+    _tests_cache_stats['misses'] += 1
+    test_envs = dict((test.name, _make_test_env(test))
+                     for test in Test.objects.filter(problem=problem_id))
+    _tests_cache[problem_id] = (version, test_envs)
+    logger.info("Tests cache miss for problem %d (hits: %d, misses: %d)",
+            problem_id, _tests_cache_stats['hits'],
+            _tests_cache_stats['misses'])
+    return test_envs
+
+
 @_if_compiled
 @transaction.commit_on_success
 def collect_tests(env, **kwargs):
     """Collects tests from the database and converts them to
        evaluation environments.
 
+       Test environments are cached in the process and reloaded only
+       when the version stamp of the problem's tests changes (see
+       :class:`~oioioi.programs.models.TestsVersion`).
+
        Used ``environ`` keys:
          * ``problem_id``
 
@@ -108,24 +287,154 @@ def collect_tests(env, **kwargs):
 
     env.setdefault('tests', {})
 
-    problem = Problem.objects.get(id=env['problem_id'])
-
-    tests = Test.objects.filter(problem=problem)
-    for test in tests:
-        test_env = {}
-        test_env['id'] = test.id
-        test_env['name'] = test.name
-        test_env['in_file'] = django_to_filetracker_path(test.input_file)
-        test_env['hint_file'] = django_to_filetracker_path(test.output_file)
-        test_env['kind'] = test.kind
-        test_env['group'] = test.group or test.name
-        test_env['max_score'] = test.max_score
-        if test.time_limit:
-            test_env['exec_time_limit'] = test.time_limit
-        if test.memory_limit:
-            test_env['exec_mem_limit'] = test.memory_limit
-        env['tests'][test.name] = test_env
+    for name, test_env in _get_test_envs(env['problem_id']).iteritems():
+        env['tests'][name] = test_env.copy()
+
+    return env
+
+
+def _test_fingerprint(env, test_env):
+    """Returns a hash of everything which may influence the result of
+       the test, except for the tested program.
+
+       Test files are identified by their filetracker paths, which change
+       whenever a file is replaced.
+    """
+    fields = (test_env.get('in_file'), test_env.get('hint_file'),
+            test_env.get('kind'), test_env.get('group'),
+            test_env.get('max_score'), test_env.get('exec_time_limit'),
+            test_env.get('exec_mem_limit'), env.get('checker'))
+    return hashlib.sha1('\0'.join(unicode(field).encode('utf-8')
+                                   for field in fields)).hexdigest()
+
+
+@_if_compiled
+def reuse_test_results(env, **kwargs):
+    """Finds the tests which have not changed since the submission was
+       last judged, so that :func:`run_tests` does not run them again,
+       but reuses their graded results.
+
+       Only the tests from the active reports of the submission are
+       considered. A test is reused if its fingerprint (see
+       :class:`~oioioi.programs.models.TestReport`) has not changed.
+       Skipped tests are always run again.
+
+       Used ``environ`` keys:
+         * ``tests``
+         * ``submission_id``
+         * ``checker``
+
+       Produced ``environ`` keys:
+         * ``reused_test_results``: a dictionary mapping test names to
+           graded results, in the format of ``env['test_results']``
+    """
+    tests_by_id = dict((test_env['id'], test_name)
+                       for test_name, test_env in env['tests'].iteritems()
+                       if test_env.get('id') is not None)
+    reports = TestReport.objects.filter(
+            submission_report__submission=env['submission_id'],
+            submission_report__status='ACTIVE',
+            test__in=tests_by_id.keys()) \
+            .exclude(status='SKIP').order_by('id')
+
+    reused = {}
+    for report in reports:
+        test_name = tests_by_id[report.test_id]
+        if report.max_score is None or report.test_fingerprint != \
+                _test_fingerprint(env, env['tests'][test_name]):
+            continue
+        reused[test_name] = {
+            'result_code': report.status,
+            'result_string': report.comment,
+            'time_used': report.time_used,
+            'mem_used': 0,
+            'num_syscalls': 0,
+            'score': report.score and report.score.serialize(),
+            'max_score': report.max_score.serialize(),
+            'status': report.status,
+            'reused': True,
+        }
+    env['reused_test_results'] = reused
+    logger.info("Submission %s: reusing results of %d of %d tests",
+            env['submission_id'], len(reused), len(env['tests']))
+    return env
+
+
+def _clone_report(report, submission_id):
+    clone = SubmissionReport(submission_id=submission_id, kind=report.kind,
+            cloned_from=report)
+    clone.save()
+    for related in SubmissionReport._meta.get_all_related_objects():
+        if related.model is SubmissionReport:
+            continue
+        field_name = related.field.name
+        objects = list(related.model.objects.filter(**{field_name: report}))
+        file_fields = [field.name for field in related.model._meta.fields
+                       if isinstance(field, FileField)]
+        for obj in objects:
+            obj.pk = None
+            setattr(obj, field_name, clone)
+            # The copied files stored by their content (see
+            # FiletrackerStorage) are referred to by one more row.
+            for name in file_fields:
+                value = getattr(obj, name)
+                if value and hasattr(value.storage, 'add_name_references'):
+                    value.storage.add_name_references([value.name])
+        if objects:
+            related.model.objects.bulk_create(objects)
+    return clone
+
+
+@transaction.commit_on_success
+def clone_identical_submission_reports(env, **kwargs):
+    """Copies the reports of an earlier submission with an identical source
+       file instead of evaluating this submission again (see
+       ``ProgrammingContestController.get_identical_submission``).
+
+       The reports are copied only if the earlier submission has an active
+       report of every kind from ``env['report_kinds']`` and the reports
+       contain results of all the current tests of the problem, none of
+       which has changed since (see :func:`reuse_test_results`). Otherwise
+       the submission is evaluated as usual.
 
+       If the reports are copied, the following phases of the recipe up to
+       ``delete_executable`` are skipped.
+
+       Used ``environ`` keys:
+         * ``identical_submission_id``
+         * ``submission_id``
+         * ``report_kinds``
+         * ``problem_id``
+         * ``checker``
+
+       Produced ``environ`` keys:
+         * ``cloned_report_ids``: ids of the copied reports
+    """
+    names = [entry[0] for entry in env['recipe']]
+    if 'delete_executable' not in names:
+        return env
+
+    reports = list(SubmissionReport.objects.filter(
+            submission=env['identical_submission_id'], status='ACTIVE',
+            kind__in=env['report_kinds']))
+    if sorted(report.kind for report in reports) != \
+            sorted(env['report_kinds']):
+        return env
+
+    fingerprints = dict((test_env['id'], _test_fingerprint(env, test_env))
+            for test_env in _get_test_envs(env['problem_id']).itervalues())
+    reported = TestReport.objects.filter(submission_report__in=reports) \
+            .values_list('test', 'test_fingerprint')
+    if set(test_id for test_id, _fingerprint in reported) != \
+            set(fingerprints) or any(fingerprints[test_id] != fingerprint
+                                     for test_id, fingerprint in reported):
+        return env
+
+    env['cloned_report_ids'] = [_clone_report(report, env['submission_id']).id
+                                for report in reports]
+    env['recipe'] = env['recipe'][names.index('delete_executable') + 1:]
+    logger.info("Submission %s: copied reports of identical submission %s",
+            env['submission_id'], env['identical_submission_id'])
     return env
 
 
@@ -150,8 +459,14 @@ def run_tests(env, kind=None, **kwargs):
            test results should have its output file attached.
          * ``sioworkers_extra_args``: dict mappting kinds to additional
            arguments passed to
-           :fun:`oioioi.sioworkers.jobs.run_sioworkers_jobs`
+           :fun:`oioioi.sioworkers.jobs.run_sioworkers_jobs_iter`
            (kwargs).
+         * ``abort_failed_groups``: if set to ``True`` and the group scorer
+           is one of ``ABORTABLE_GROUP_SCORERS``, tests from a group in
+           which some test has already failed are not run. They are
+           recorded with the ``SKIP`` result code instead.
+         * ``reused_test_results``: results of the tests which should not
+           be run again (see :func:`reuse_test_results`).
 
        Produced ``environ`` keys:
          * ``test_results``: a dictionary, mapping test names into
@@ -173,12 +488,28 @@ def run_tests(env, kind=None, **kwargs):
                ``env['save_outputs']`` was set)
 
            If the dictionary already exists, new test results are appended.
+
+       Results are stored as soon as they arrive from the workers, in the
+       order in which the tests finish.
+
+       If :func:`oioioi.evalmgr.can_suspend` allows, the evaluation is
+       suspended until all the tests finish, unless some tests may need to
+       be skipped due to ``abort_failed_groups``.
     """
 
+    env.setdefault('test_results', {})
+    reused = env.get('reused_test_results', {})
+    failed_groups = set()
     jobs = dict()
     for test_name, test_env in env['tests'].iteritems():
         if kind and test_env['kind'] != kind:
             continue
+        if test_name in reused:
+            result = reused[test_name]
+            env['test_results'][test_name] = result.copy()
+            if result['result_code'] != 'OK':
+                failed_groups.add(test_env['group'])
+            continue
         job = test_env.copy()
         job['job_type'] = (env.get('exec_mode', '') + '-exec').lstrip('-')
         job['exe_file'] = env['compiled_file']
@@ -190,14 +521,50 @@ def run_tests(env, kind=None, **kwargs):
             job['upload_out'] = True
         jobs[test_name] = job
 
+    skip_job = None
+    if env.get('abort_failed_groups') and env.get('group_scorer',
+            DEFAULT_GROUP_SCORER) in ABORTABLE_GROUP_SCORERS:
+        skip_job = lambda test_name: \
+                env['tests'][test_name]['group'] in failed_groups
+
     extra_args = env.get('sioworkers_extra_args', {}).get(kind, {})
-    jobs = run_sioworkers_jobs(jobs, **extra_args)
-    env.setdefault('test_results', {})
-    for test_name, result in jobs.iteritems():
+    if jobs and skip_job is None and evalmgr.can_suspend(env):
+        return evalmgr.wait_for_jobs(env, jobs,
+                ('store_test_results', 'oioioi.programs.handlers.'
+                 'store_test_results'), **extra_args)
+    finished = set()
+    for test_name, result in run_sioworkers_jobs_iter(jobs,
+            skip_job=skip_job, **extra_args):
+        env['test_results'].setdefault(test_name, {}).update(result)
+        finished.add(test_name)
+        if result.get('result_code') != 'OK':
+            failed_groups.add(env['tests'][test_name]['group'])
+
+    for test_name in jobs:
+        if test_name not in finished:
+            env['test_results'][test_name] = _skipped_test_result()
+    return env
+
+
+def store_test_results(env, results, **kwargs):
+    """Stores the results of the tests run by :func:`run_tests` after
+       resuming a suspended evaluation.
+    """
+    for test_name, result in results.iteritems():
         env['test_results'].setdefault(test_name, {}).update(result)
     return env
 
 
+def _skipped_test_result():
+    return {
+        'result_code': 'SKIP',
+        'result_string': '',
+        'time_used': 0,
+        'mem_used': 0,
+        'num_syscalls': 0,
+    }
+
+
 @_if_compiled
 def grade_tests(env, **kwargs):
     """Grades tests using a scoring function.
@@ -216,6 +583,9 @@ def grade_tests(env, **kwargs):
 
        Produced ``environ`` keys:
          * `score`, `max_score` and `status` keys in ``env['test_result']``
+
+       Reused test results (see :func:`reuse_test_results`) are already
+       graded.
     """
 
     fun = get_object_by_dotted_name(env.get('test_scorer')
@@ -223,6 +593,8 @@ def grade_tests(env, **kwargs):
     tests = env['tests']
 
     for test_name, test_result in env['test_results'].iteritems():
+        if test_result.get('reused'):
+            continue
         score, max_score, status = fun(tests[test_name], test_result)
         assert isinstance(score, (types.NoneType, ScoreValue))
         assert isinstance(max_score, (types.NoneType, ScoreValue))
@@ -370,6 +742,28 @@ def _make_base_report(env, kind):
     return submission, submission_report
 
 
+def _bulk_create_reports(submission_report, reports, name_field, results,
+        id_key):
+    """Saves the given unsaved reports of ``submission_report`` using
+       a single query and stores the id of every created report in
+       ``results[name][id_key]``, where ``name`` is the value of the
+       report's ``name_field``.
+
+       All the reports must be instances of the same model.
+    """
+    if not reports:
+        return
+    model = type(reports[0])
+    model.objects.bulk_create(reports)
+    # bulk_create does not set primary keys of the created objects.
+    names = [getattr(report, name_field) for report in reports]
+    for name, report_id in model.objects \
+            .filter(submission_report=submission_report,
+                    **{name_field + '__in': names}) \
+            .values_list(name_field, 'id'):
+        results[name][id_key] = report_id
+
+
 @transaction.commit_on_success
 def make_report(env, kind='NORMAL', **kwargs):
     """Builds entities for tests results in a database.
@@ -387,6 +781,12 @@ def make_report(env, kind='NORMAL', **kwargs):
        Produced ``environ`` keys:
            * ``report_id``: id of the produced
              :class:`~oioioi.contests.models.SubmissionReport`
+           * ``report_id`` key in ``env['test_results']``: id of the
+             produced :class:`~oioioi.programs.models.TestReport`
+           * ``result_id`` key in ``env['group_results']``: id of the
+             produced :class:`~oioioi.programs.models.GroupReport`
+
+       Test and group reports are inserted in bulk.
     """
     _submission, submission_report = _make_base_report(env, kind)
 
@@ -395,6 +795,7 @@ def make_report(env, kind='NORMAL', **kwargs):
 
     tests = env['tests']
     test_results = env.get('test_results', {})
+    test_reports = []
     for test_name, result in test_results.iteritems():
         test = tests[test_name]
         if 'report_id' in result:
@@ -406,6 +807,8 @@ def make_report(env, kind='NORMAL', **kwargs):
         test_report.test_time_limit = test.get('exec_time_limit')
         test_report.test_max_score = test['max_score']
         test_report.score = result['score']
+        test_report.max_score = result['max_score']
+        test_report.test_fingerprint = _test_fingerprint(env, test)
         test_report.status = result['status']
         test_report.time_used = result['time_used']
         comment = result.get('result_string', '')
@@ -413,10 +816,12 @@ def make_report(env, kind='NORMAL', **kwargs):
             comment = ''
         test_report.comment = slice_str(comment, TestReport.
                 _meta.get_field('comment').max_length)
-        test_report.save()
-        result['report_id'] = test_report.id
+        test_reports.append(test_report)
+    _bulk_create_reports(submission_report, test_reports, 'test_name',
+            test_results, 'report_id')
 
     group_results = env.get('group_results', {})
+    group_reports = []
     for group_name, group_result in group_results.iteritems():
         if 'report_id' in group_result:
             continue
@@ -424,13 +829,14 @@ def make_report(env, kind='NORMAL', **kwargs):
         group_report.group = group_name
         group_report.score = group_result['score']
         group_report.status = group_result['status']
-        group_report.save()
-        group_result['result_id'] = group_report.id
+        group_reports.append(group_report)
+    _bulk_create_reports(submission_report, group_reports, 'group',
+            group_results, 'result_id')
 
     return env
 
 
 def delete_executable(env, **kwargs):
-    if 'compiled_file' in env:
+    if 'compiled_file' in env and not env.get('compiled_file_cached'):
         get_client().delete_file(env['compiled_file'])
     return env
@@ -1,16 +1,18 @@
 from django.core.exceptions import ValidationError
 from django.db import models, transaction
+from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 from django.dispatch import receiver
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from oioioi.base.fields import EnumRegistry, EnumField
 from oioioi.problems.models import Problem, make_problem_filename
 from oioioi.filetracker.fields import FileField
-from oioioi.contests.models import Submission, SubmissionReport, \
+from oioioi.contests.models import Contest, Submission, SubmissionReport, \
         submission_statuses, submission_report_kinds, ProblemInstance
 from oioioi.contests.fields import ScoreField
 
 import os.path
+import uuid
 
 test_kinds = EnumRegistry()
 test_kinds.register('NORMAL', _("Normal test"))
@@ -45,6 +47,58 @@ class Test(models.Model):
         verbose_name_plural = _("tests")
 
 
+def _new_tests_version():
+    return uuid.uuid4().hex
+
+
+class TestsVersion(models.Model):
+    """Version stamp of the tests of a problem.
+
+       It is changed to a new random value whenever the tests change, so
+       that processes caching the tests (see
+       :func:`oioioi.programs.handlers.collect_tests`) know when to reload
+       them.
+    """
+    problem = models.OneToOneField(Problem, primary_key=True)
+    version = models.CharField(max_length=32, default=_new_tests_version)
+
+
+@receiver(post_save, sender=Problem)
+def _add_tests_version_to_problem(sender, instance, created, **kwargs):
+    if created:
+        TestsVersion.objects.get_or_create(problem=instance)
+
+
+def get_tests_version(problem_id):
+    """Returns the current version stamp of the tests of the given problem.
+    """
+    versions = TestsVersion.objects.filter(problem=problem_id) \
+            .values_list('version', flat=True)[:1]
+    if versions:
+        return versions[0]
+    # The stamp may be missing, e.g. for problems created before the stamps
+    # were introduced.
+    tests_version, _created = \
+            TestsVersion.objects.get_or_create(problem_id=problem_id)
+    return tests_version.version
+
+
+def bump_tests_version(problem_id):
+    """Marks the tests of the given problem as changed.
+
+       Must be called after modifying tests without saving the
+       :class:`Test` objects (e.g. with ``QuerySet.update``).
+    """
+    TestsVersion.objects.filter(problem=problem_id) \
+            .update(version=_new_tests_version())
+
+
+@receiver(post_save, sender=Test)
+@receiver(post_delete, sender=Test)
+def _bump_tests_version_on_test_change(sender, instance, **kwargs):
+    bump_tests_version(instance.problem_id)
+
+
 class OutputChecker(models.Model):
     problem = models.OneToOneField(Problem)
     exe_file = FileField(upload_to=make_problem_filename,
@@ -139,9 +193,14 @@ def make_submission_filename(instance, filename):
 
 
 class ProgramSubmission(Submission):
+    """A submission of a program.
+
+       ``source_hash`` is the SHA-256 hash of the source file, if known.
+    """
     source_file = FileField(upload_to=make_submission_filename)
     source_length = models.IntegerField(verbose_name=_("Source code length"),
                                         blank=True, null=True)
+    source_hash = models.CharField(max_length=64, blank=True, db_index=True)
 
     def save(self, *args, **kwargs):
         if self.source_file:
@@ -160,6 +219,7 @@ submission_statuses.register('MLE', _("Memory limit exceeded"))
 submission_statuses.register('OLE', _("Output limit exceeded"))
 submission_statuses.register('SE', _("System error"))
 submission_statuses.register('RV', _("Rule violation"))
+submission_statuses.register('SKIP', _("Skipped"))
 
 submission_statuses.register('INI_OK', _("Initial tests: OK"))
 submission_statuses.register('INI_ERR', _("Initial tests: failed"))
@@ -178,10 +238,18 @@ class CompilationReport(models.Model):
 
 
 class TestReport(models.Model):
+    """The result of a single test.
+
+       ``test_fingerprint`` identifies the version of the test (and of the
+       output checker) which was run, so that an incremental rejudge may
+       reuse the result if the test has not changed since (see
+       :func:`oioioi.programs.handlers.reuse_test_results`).
+    """
     submission_report = models.ForeignKey(SubmissionReport)
     status = EnumField(submission_statuses)
     comment = models.CharField(max_length=255, blank=True)
     score = ScoreField(null=True, blank=True)
+    max_score = ScoreField(null=True, blank=True)
     time_used = models.IntegerField(blank=True)
 
     test = models.ForeignKey(Test, blank=True, null=True,
@@ -190,6 +258,7 @@ class TestReport(models.Model):
     test_group = models.CharField(max_length=30)
     test_time_limit = models.IntegerField(null=True, blank=True)
     test_max_score = models.IntegerField(null=True, blank=True)
+    test_fingerprint = models.CharField(max_length=40, blank=True)
 
 
 class GroupReport(models.Model):
@@ -197,3 +266,40 @@ class GroupReport(models.Model):
     group = models.CharField(max_length=30)
     score = ScoreField(null=True, blank=True)
     status = EnumField(submission_statuses)
+
+
+class CompilationCacheConfig(models.Model):
+    """Per-contest switch of the compilation cache (see
+       :class:`CompiledBinary`). The cache is disabled in contests
+       without the config.
+    """
+    contest = models.OneToOneField(Contest, primary_key=True)
+    enabled = models.BooleanField(default=False,
+            verbose_name=_("use compilation cache"),
+            help_text=_("Reuse the results of compilation of identical "
+                "source files, e.g. when rejudging submissions."))
+
+    class Meta(object):
+        verbose_name = _("compilation cache config")
+        verbose_name_plural = _("compilation cache configs")
+
+
+def is_compilation_cache_enabled(contest_id):
+    return CompilationCacheConfig.objects.filter(contest_id=contest_id,
+            enabled=True).exists()
+
+
+class CompiledBinary(models.Model):
+    """A cached result of a compilation.
+
+       ``key`` identifies the compilation job (see
+       :func:`oioioi.programs.handlers.compilation_cache_key`).
+       ``compiled_file`` is the filetracker path of the executable (empty if
+       the compilation failed) and ``size`` is its size in bytes.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    compiled_file = models.CharField(max_length=255, blank=True)
+    size = models.IntegerField(default=0)
+    compilation_result = models.CharField(max_length=8)
+    compilation_message = models.TextField(blank=True)
+    last_used = models.DateTimeField(default=timezone.now, db_index=True)
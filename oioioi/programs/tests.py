@@ -1,19 +1,31 @@
 import os
+import tempfile
+import uuid
+from datetime import timedelta
 
+from django.core.cache import cache
 from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
 from django.utils.html import strip_tags, escape
 from django.core.urlresolvers import reverse
 
 from oioioi.filetracker.tests import TestStreamingMixin
-from oioioi.programs import utils
+from oioioi.programs import utils, handlers, views
 from oioioi.base.tests import check_not_accessible
-from oioioi.contests.models import Submission, ProblemInstance, Contest
+from oioioi.contests.models import Submission, ProblemInstance, Contest, \
+        SubmissionReport
 from oioioi.contests.tests import PrivateRegistrationController
-from oioioi.programs.models import Test, ModelSolution, ProgramSubmission
+from oioioi.programs.models import Test, ModelSolution, ProgramSubmission, \
+        TestReport, GroupReport, CompiledBinary, CompilationCacheConfig, \
+        is_compilation_cache_enabled, TestsVersion
 from oioioi.programs.controllers import ProgrammingContestController
 from oioioi.sinolpack.tests import get_test_filename
 from oioioi.contests.scores import IntegerScore
 from oioioi.base.utils import memoized_property
+from oioioi.sioworkers.backends import LocalBackend
+from oioioi.sioworkers.jobs import is_batch_job, run_batch_job
+from oioioi.filetracker.client import get_client
 
 
 # Don't Repeat Yourself.
@@ -236,6 +248,38 @@ class TestDiffView(TestCase):
         self.assertIn('diff-num left', response.content)
         self.assertIn('diff-num right', response.content)
 
+        cache_key = views._source_cache_key('diff',
+                ProgramSubmission.objects.get(pk=1).source_file,
+                ProgramSubmission.objects.get(pk=2).source_file)
+        self.assertIsNotNone(cache.get(cache_key))
+        diff_lines = views.diff_lines
+        views.diff_lines = None
+        try:
+            response = self.client.get(reverse('source_diff', kwargs=kwargs))
+            self.assertIn('diff-line left', response.content)
+        finally:
+            views.diff_lines = diff_lines
+
+
+class TestDiffLines(TestCase):
+    def test_diff_lines(self):
+        lines1 = ['a', 'b', 'c', 'd', 'e']
+        lines2 = ['a', 'x', 'c', 'd', 'y', 'e']
+        self.assertEqual(utils.diff_lines(lines1, lines2),
+                [(' ', 'a'), ('-', 'b'), ('+', 'x'), (' ', 'c'), (' ', 'd'),
+                 ('+', 'y'), (' ', 'e')])
+        self.assertEqual(utils.diff_lines([], ['a']), [('+', 'a')])
+        self.assertEqual(utils.diff_lines(['a'], ['a']), [(' ', 'a')])
+
+    def test_max_changes(self):
+        lines1 = ['a', 'b', 'c', 'd']
+        lines2 = ['a', 'x', 'c', 'y']
+        self.assertEqual(utils.diff_lines(lines1, lines2, max_changes=2),
+                [(' ', 'a'), ('-', 'b'), ('-', 'c'), ('-', 'd'),
+                 ('+', 'x'), ('+', 'c'), ('+', 'y')])
+        self.assertEqual(len(utils.diff_lines(lines1, lines2,
+                max_changes=4)), 6)
+
 
 class TestSubmissionAdmin(TestCase):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
@@ -550,3 +594,363 @@ class TestScorers(TestCase):
                 utils.sum_score_aggregator(self.g_results_wrong))
         self.assertEqual((359, 630, 'WA'),
                 utils.sum_score_aggregator(self.g_results_unequal_max_scores))
+
+
+class WrongAnswerInGroupOneBackend(LocalBackend):
+    def run_job(self, job, **kwargs):
+        job = job.copy()
+        job['result_code'] = job['group'] == '1' and 'WA' or 'OK'
+        job['time_used'] = 100
+        return job
+
+
+def _make_two_groups_env(**kwargs):
+    env = {
+        'compiled_file': '/compiled',
+        'tests': {},
+        'group_scorer': 'oioioi.programs.utils.min_group_scorer',
+    }
+    for name, group in [('1a', '1'), ('1b', '1'), ('1c', '1'),
+                        ('2a', '2'), ('2b', '2')]:
+        env['tests'][name] = {'name': name, 'group': group,
+                              'kind': 'NORMAL', 'max_score': 10}
+    env.update(kwargs)
+    return env
+
+
+@override_settings(SIOWORKERS_BACKEND=
+        'oioioi.programs.tests.WrongAnswerInGroupOneBackend')
+class TestAbortFailedGroups(TestCase):
+    def test_all_tests_run_by_default(self):
+        env = handlers.run_tests(_make_two_groups_env())
+        statuses = [r['result_code'] for r in env['test_results'].values()]
+        self.assertEqual(sorted(statuses), ['OK', 'OK', 'WA', 'WA', 'WA'])
+
+    def test_failed_group_is_aborted(self):
+        env = handlers.run_tests(
+                _make_two_groups_env(abort_failed_groups=True))
+        results = env['test_results']
+        self.assertEqual(len(results), 5)
+        group1 = sorted(results[name]['result_code']
+                        for name in ('1a', '1b', '1c'))
+        self.assertEqual(group1, ['SKIP', 'SKIP', 'WA'])
+        self.assertEqual(results['2a']['result_code'], 'OK')
+        self.assertEqual(results['2b']['result_code'], 'OK')
+
+        env = handlers.grade_tests(env)
+        env = handlers.grade_groups(env)
+        self.assertEqual(env['group_results']['1']['status'], 'WA')
+        self.assertEqual(env['group_results']['1']['score'],
+                IntegerScore(0).serialize())
+        self.assertEqual(env['group_results']['2']['status'], 'OK')
+
+    def test_other_scorers_are_not_aborted(self):
+        env = handlers.run_tests(_make_two_groups_env(
+                abort_failed_groups=True,
+                group_scorer='oioioi.programs.utils.sum_group_scorer'))
+        statuses = [r['result_code'] for r in env['test_results'].values()]
+        self.assertNotIn('SKIP', statuses)
+
+
+class BatchingBackend(WrongAnswerInGroupOneBackend):
+    jobs_run = 0
+
+    def run_job(self, job, **kwargs):
+        BatchingBackend.jobs_run += 1
+        if is_batch_job(job):
+            return run_batch_job(job, super(BatchingBackend, self).run_job)
+        return super(BatchingBackend, self).run_job(job)
+
+
+@override_settings(SIOWORKERS_BACKEND=
+        'oioioi.programs.tests.BatchingBackend',
+        SIOWORKERS_BATCH_MAX_TIME=1000)
+class TestBatchedTests(TestCase):
+    def test_batched_run_tests(self):
+        env = _make_two_groups_env()
+        for test_env in env['tests'].itervalues():
+            test_env['exec_time_limit'] = 300
+        jobs_run = BatchingBackend.jobs_run
+        env = handlers.run_tests(env)
+        self.assertEqual(BatchingBackend.jobs_run, jobs_run + 2)
+        self.assertEqual(sorted(env['test_results']),
+                ['1a', '1b', '1c', '2a', '2b'])
+        self.assertEqual(env['test_results']['1a']['result_code'], 'WA')
+        self.assertEqual(env['test_results']['2b']['result_code'], 'OK')
+
+
+@override_settings(SIOWORKERS_BACKEND=
+        'oioioi.programs.tests.WrongAnswerInGroupOneBackend')
+class TestMakeReport(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_submission']
+
+    def test_report_ids(self):
+        env = _make_two_groups_env(submission_id=1)
+        env['compilation_result'] = 'OK'
+        env['compilation_message'] = ''
+        env['status'] = 'WA'
+        env['score'] = IntegerScore(20).serialize()
+        env = handlers.run_tests(env)
+        env = handlers.grade_tests(env)
+        env = handlers.grade_groups(env)
+        env = handlers.make_report(env)
+
+        submission_report = SubmissionReport.objects.get(id=env['report_id'])
+        test_reports = TestReport.objects \
+                .filter(submission_report=submission_report)
+        self.assertEqual(test_reports.count(), 5)
+        for test_report in test_reports:
+            result = env['test_results'][test_report.test_name]
+            self.assertEqual(result['report_id'], test_report.id)
+            self.assertEqual(test_report.status, result['status'])
+        group_reports = GroupReport.objects \
+                .filter(submission_report=submission_report)
+        self.assertEqual(group_reports.count(), 2)
+        for group_report in group_reports:
+            result = env['group_results'][group_report.group]
+            self.assertEqual(result['result_id'], group_report.id)
+
+
+class TestCollectTestsCache(TestCase):
+    fixtures = ['test_full_package']
+
+    def test_tests_cache(self):
+        stats = handlers.get_tests_cache_stats()
+        env = handlers.collect_tests({'problem_id': 1})
+        self.assertEqual(len(env['tests']), 6)
+        env = handlers.collect_tests({'problem_id': 1})
+        self.assertEqual(len(env['tests']), 6)
+        new_stats = handlers.get_tests_cache_stats()
+        self.assertEqual(new_stats['hits'], stats['hits'] + 1)
+
+        test = Test.objects.get(problem_id=1, name='1a')
+        test.time_limit = 4321
+        test.save()
+        env = handlers.collect_tests({'problem_id': 1})
+        self.assertEqual(env['tests']['1a']['exec_time_limit'], 4321)
+        self.assertEqual(handlers.get_tests_cache_stats()['misses'],
+                new_stats['misses'] + 1)
+
+        test.delete()
+        env = handlers.collect_tests({'problem_id': 1})
+        self.assertNotIn('1a', env['tests'])
+
+        env['tests']['0']['max_score'] = 1000
+        env = handlers.collect_tests({'problem_id': 1})
+        self.assertNotEqual(env['tests']['0']['max_score'], 1000)
+
+    def test_tests_version(self):
+        version = handlers.get_tests_version(1)
+        with self.assertNumQueries(1):
+            self.assertEqual(handlers.get_tests_version(1), version)
+        TestsVersion.objects.filter(problem=1).delete()
+        version = handlers.get_tests_version(1)
+        self.assertEqual(TestsVersion.objects.get(problem=1).version,
+                version)
+
+
+class CompileBackend(LocalBackend):
+    compilations = 0
+
+    def run_job(self, job, **kwargs):
+        CompileBackend.compilations += 1
+        get_client().put_file(job['out_file'], job['source_file_path'])
+        return dict(job, result_code='OK', compiler_output='compiled')
+
+
+@override_settings(SIOWORKERS_BACKEND='oioioi.programs.tests.CompileBackend',
+        COMPILATION_CACHE_MAX_ENTRIES=1,
+        COMPILATION_CACHE_EVICTION_INTERVAL=1)
+class TestCompilationCache(TestCase):
+    def _make_env(self, source):
+        source_file = tempfile.NamedTemporaryFile()
+        source_file.write(source)
+        source_file.flush()
+        self.addCleanup(source_file.close)
+        path = '/compilation_cache_test/%s.c' % (uuid.uuid4().hex,)
+        get_client().put_file(path, source_file.name)
+        return {'job_id': uuid.uuid4().hex, 'source_file': path,
+                'source_file_path': source_file.name, 'language': 'c',
+                'use_compilation_cache': True}
+
+    def test_compilation_cache(self):
+        compilations = CompileBackend.compilations
+        env = handlers.compile(self._make_env('int main() {}'))
+        self.assertEqual(env['compilation_result'], 'OK')
+        self.assertTrue(env['compiled_file_cached'])
+        handlers.delete_executable(env)
+
+        other_env = handlers.compile(self._make_env('int main() {}'))
+        self.assertEqual(CompileBackend.compilations, compilations + 1)
+        self.assertEqual(other_env['compiled_file'], env['compiled_file'])
+        self.assertEqual(other_env['compilation_message'], 'compiled')
+        self.assertEqual(get_client().file_size(env['compiled_file']),
+                len('int main() {}'))
+
+        CompiledBinary.objects.update(
+                last_used=timezone.now() - timedelta(days=1))
+        new_env = handlers.compile(self._make_env('int main() { }'))
+        self.assertEqual(CompileBackend.compilations, compilations + 2)
+        self.assertEqual(list(CompiledBinary.objects
+                .values_list('compiled_file', flat=True)),
+                [new_env['compiled_file']])
+
+    def test_cache_key(self):
+        env = self._make_env('int main() {}')
+        env['compiler'] = 'default-c'
+        key = handlers.compilation_cache_key(env)
+        with override_settings(COMPILATION_CACHE_COMPILERS_VERSION='2'):
+            self.assertNotEqual(handlers.compilation_cache_key(env), key)
+
+    def test_compilation_errors_not_cached(self):
+        env = self._make_env('int main() {')
+        env['compilation_cache_key'] = handlers.compilation_cache_key(env)
+        env = handlers.compile_finished(env, {'compile': {
+                'result_code': 'CE', 'compiler_output': 'error'}})
+        self.assertEqual(env['compilation_result'], 'CE')
+        self.assertFalse(env.get('compiled_file_cached'))
+        self.assertFalse(CompiledBinary.objects.exists())
+
+    def test_enabled_per_contest(self):
+        contest = Contest.objects.create(id='c', name='Contest',
+                controller_name='oioioi.programs.controllers.'
+                                'ProgrammingContestController')
+        self.assertFalse(is_compilation_cache_enabled(contest.id))
+        CompilationCacheConfig.objects.create(contest=contest, enabled=True)
+        self.assertTrue(is_compilation_cache_enabled(contest.id))
+
+
+class CountingBackend(LocalBackend):
+    tests_run = []
+
+    def run_job(self, job, **kwargs):
+        CountingBackend.tests_run.append(job['name'])
+        job = job.copy()
+        job['result_code'] = job['name'] == '1b' and 'WA' or 'OK'
+        job['time_used'] = 100
+        return job
+
+
+def _judge_full(submission_id, reuse=False):
+    """Judges the submission to problem 1 on all tests by running
+       the programs handlers directly, and activates the new report.
+    """
+    env = {'problem_id': 1, 'submission_id': submission_id,
+           'compiled_file': '/compiled', 'compilation_result': 'OK',
+           'compilation_message': ''}
+    env = handlers.collect_tests(env)
+    if reuse:
+        env = handlers.reuse_test_results(env)
+    CountingBackend.tests_run = []
+    env = handlers.run_tests(env)
+    env = handlers.grade_tests(env)
+    env = handlers.grade_groups(env)
+    env = handlers.grade_submission(env, kind=None)
+    env = handlers.make_report(env, kind='FULL')
+    SubmissionReport.objects.filter(submission_id=submission_id) \
+            .update(status='SUPERSEDED')
+    SubmissionReport.objects.filter(id=env['report_id']) \
+            .update(status='ACTIVE')
+    return env
+
+
+@override_settings(SIOWORKERS_BACKEND=
+        'oioioi.programs.tests.CountingBackend')
+class TestIncrementalRejudge(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_submission']
+
+    def _judge(self, reuse):
+        return _judge_full(1, reuse)
+
+    def test_only_changed_tests_are_run(self):
+        env = self._judge(reuse=False)
+        self.assertEqual(len(CountingBackend.tests_run), 6)
+
+        test = Test.objects.get(problem_id=1, name='1a')
+        test.time_limit = 4321
+        test.save()
+        new_env = self._judge(reuse=True)
+        self.assertEqual(CountingBackend.tests_run, ['1a'])
+        self.assertEqual(len(new_env['reused_test_results']), 5)
+        self.assertEqual(new_env['score'], env['score'])
+        self.assertEqual(new_env['status'], env['status'])
+        self.assertEqual(new_env['group_results']['1']['status'], 'WA')
+        self.assertEqual(TestReport.objects
+                .filter(submission_report=new_env['report_id']).count(), 6)
+
+        self._judge(reuse=True)
+        self.assertEqual(CountingBackend.tests_run, [])
+
+    def test_recipe(self):
+        problem = ProblemInstance.objects.get().problem
+        environ = {'report_kinds': ['NORMAL'], 'language': 'cpp',
+                   'submission_kind': 'NORMAL',
+                   'extra_args': {'incremental_rejudge': ''}}
+        problem.controller.fill_evaluation_environ(environ)
+        handlers_names = [entry[0] for entry in environ['recipe']]
+        self.assertEqual(handlers_names.index('reuse_test_results'),
+                handlers_names.index('collect_tests') + 1)
+
+
+@override_settings(SIOWORKERS_BACKEND=
+        'oioioi.programs.tests.CountingBackend')
+class TestIdenticalSubmissions(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_submission']
+
+    def _resubmit(self):
+        submission = ProgramSubmission.objects.get(id=1)
+        submission.pk = submission.id = None
+        submission.status = '?'
+        submission.save()
+        return submission
+
+    def _clone_env(self, submission):
+        return {'identical_submission_id': 1, 'submission_id': submission.id,
+                'report_kinds': ['FULL'], 'problem_id': 1,
+                'recipe': [('compile', 'oioioi.programs.handlers.compile'),
+                           ('delete_executable',
+                               'oioioi.programs.handlers.delete_executable'),
+                           ('dump_final_env',
+                               'oioioi.evalmgr.handlers.dump_env')]}
+
+    def test_get_identical_submission(self):
+        ProgramSubmission.objects.filter(id=1).update(source_hash='abc')
+        submission = self._resubmit()
+        controller = submission.problem_instance.contest.controller
+        self.assertEqual(controller.get_identical_submission(submission).id,
+                1)
+        ProgramSubmission.objects.filter(id=1).update(source_hash='def')
+        self.assertIsNone(controller.get_identical_submission(submission))
+
+    def test_clone_reports(self):
+        env = _judge_full(1)
+        submission = self._resubmit()
+        clone_env = handlers.clone_identical_submission_reports(
+                self._clone_env(submission))
+        self.assertEqual([entry[0] for entry in clone_env['recipe']],
+                ['dump_final_env'])
+        report = SubmissionReport.objects.get(
+                id=clone_env['cloned_report_ids'][0])
+        self.assertEqual(report.submission_id, submission.id)
+        self.assertEqual(report.cloned_from_id, env['report_id'])
+        self.assertEqual(report.score_report.score.serialize(), env['score'])
+        self.assertEqual(TestReport.objects
+                .filter(submission_report=report).count(), 6)
+
+        SubmissionReport.objects.filter(id=report.id).update(status='ACTIVE')
+        self.client.login(username='test_admin')
+        response = self.client.get(reverse('submission', kwargs={
+                'contest_id': 'c', 'submission_id': submission.id}))
+        self.assertIn('results have been copied', response.content)
+
+        test = Test.objects.get(problem_id=1, name='1a')
+        test.time_limit = 4321
+        test.save()
+        submission = self._resubmit()
+        clone_env = handlers.clone_identical_submission_reports(
+                self._clone_env(submission))
+        self.assertNotIn('cloned_report_ids', clone_env)
+        self.assertEqual(len(clone_env['recipe']), 3)
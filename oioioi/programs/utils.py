@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.exceptions import PermissionDenied
 from django.shortcuts import get_object_or_404
 from oioioi.contests.scores import ScoreValue, IntegerScore
@@ -111,6 +112,97 @@ def slice_str(str, length):
     # After slicing UTF-8 can be invalid.
     return str[:length].decode('utf-8', 'ignore').encode('utf-8')
 
+
+def _shortest_edit(a, b, max_changes):
+    """Finds the shortest edit script of sequences ``a`` and ``b`` with
+       the Myers' algorithm, in O((len(a) + len(b)) * D) time, where D is
+       the number of changed lines.
+
+       Returns ``None`` if more than ``max_changes`` lines are changed.
+    """
+    n, m = len(a), len(b)
+    max_d = min(n + m, max_changes)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    # Only the diagonals which may be used by the backtracking are saved.
+    trace = []
+    for d in xrange(max_d + 1):
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in xrange(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, a, b)
+    return None
+
+
+def _backtrack(trace, a, b):
+    x, y = len(a), len(b)
+    result = []
+    for d in xrange(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k + d] < v[k + d + 2]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = v[prev_k + d + 1]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            result.append((' ', a[x]))
+        if d > 0:
+            if x == prev_x:
+                result.append(('+', b[prev_y]))
+            else:
+                result.append(('-', a[prev_x]))
+        x, y = prev_x, prev_y
+    result.reverse()
+    return result
+
+
+def diff_lines(lines1, lines2, max_changes=None):
+    """Compares two lists of lines.
+
+       Returns a list of pairs ``(tag, line)``, where the tag is ``' '``
+       for lines present in both lists, ``'-'`` for lines only in
+       ``lines1`` and ``'+'`` for lines only in ``lines2``.
+
+       Unlike :func:`difflib.ndiff`, the time is linear in the length of
+       the lists for a bounded number of changes. If more than
+       ``max_changes`` (by default ``settings.SOURCE_DIFF_MAX_CHANGES``)
+       lines differ, all the lines between the common beginning and end
+       of the lists are reported as changed.
+    """
+    if max_changes is None:
+        max_changes = settings.SOURCE_DIFF_MAX_CHANGES
+    prefix = 0
+    limit = min(len(lines1), len(lines2))
+    while prefix < limit and lines1[prefix] == lines2[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and lines1[-suffix - 1] == lines2[-suffix - 1]:
+        suffix += 1
+    middle1 = lines1[prefix:len(lines1) - suffix]
+    middle2 = lines2[prefix:len(lines2) - suffix]
+
+    middle = _shortest_edit(middle1, middle2, max_changes)
+    if middle is None:
+        middle = [('-', line) for line in middle1] + \
+                [('+', line) for line in middle2]
+    return [(' ', line) for line in lines1[:prefix]] + middle + \
+            [(' ', line) for line in lines1[len(lines1) - suffix:]]
+
+
 def get_submission_source_file_or_error(request, contest_id, submission_id):
     """Returns the submission source and filename
 
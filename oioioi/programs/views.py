@@ -1,8 +1,10 @@
 # pylint: disable=E0611
 # No name 'HtmlFormatter' in module 'pygments.formatters'
-import difflib
+import hashlib
+from collections import namedtuple
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
 from django.core.urlresolvers import reverse
 from django.shortcuts import get_object_or_404
@@ -15,11 +17,12 @@ from pygments.formatters import HtmlFormatter
 from pygments.util import ClassNotFound
 
 from oioioi.programs.models import Test, OutputChecker
-from oioioi.programs.utils import decode_str, \
+from oioioi.programs.utils import decode_str, diff_lines, \
     get_submission_source_file_or_error
 from oioioi.contests.utils import contest_exists, can_enter_contest
 from oioioi.base.permissions import enforce_condition
-from oioioi.filetracker.utils import stream_file
+from oioioi.filetracker.utils import stream_file, \
+        django_to_filetracker_path
 
 # Workaround for race condition in fnmatchcase which is used by pygments
 import fnmatch
@@ -27,10 +30,17 @@ import sys
 fnmatch._MAXCACHE = sys.maxint
 
 
-@enforce_condition(contest_exists & can_enter_contest)
-def show_submission_source_view(request, contest_id, submission_id):
-    source_file = get_submission_source_file_or_error(request, contest_id,
-            submission_id)
+def _source_cache_key(prefix, *source_files):
+    """Returns a cache key for data computed from the given submission
+       sources, which changes with their versions.
+    """
+    paths = [django_to_filetracker_path(f) for f in source_files]
+    return 'programs:%s:%s:%s' % (prefix,
+            '-'.join(str(f.instance.id) for f in source_files),
+            hashlib.sha1('\0'.join(paths).encode('utf-8')).hexdigest())
+
+
+def _highlight_source(source_file):
     raw_source, decode_error = decode_str(source_file.read())
     filename = source_file.file.name
     is_source_safe = False
@@ -48,52 +58,41 @@ def show_submission_source_view(request, contest_id, submission_id):
     except ClassNotFound:
         formatted_source = raw_source
         formatted_source_css = ''
-    download_url = reverse('download_submission_source',
-            kwargs={'contest_id': request.contest.id,
-                    'submission_id': submission_id})
-    return TemplateResponse(request, 'programs/source.html', {
+    return {
         'source': formatted_source,
         'css': formatted_source_css,
         'is_source_safe': is_source_safe,
-        'download_url': download_url,
         'decode_error': decode_error,
-        'submission_id': submission_id
-    })
+    }
 
 
 @enforce_condition(contest_exists & can_enter_contest)
-def save_diff_id_view(request, contest_id, submission_id):
-    # Verify user's access to the submission
-    get_submission_source_file_or_error(request, contest_id, submission_id)
-    request.session['saved_diff_id'] = submission_id
-    return HttpResponse()
+def show_submission_source_view(request, contest_id, submission_id):
+    source_file = get_submission_source_file_or_error(request, contest_id,
+            submission_id)
+    cache_key = _source_cache_key('source', source_file)
+    context = cache.get(cache_key)
+    if context is None:
+        context = _highlight_source(source_file)
+        cache.set(cache_key, context, settings.SOURCE_VIEW_CACHE_TIMEOUT)
+    download_url = reverse('download_submission_source',
+            kwargs={'contest_id': request.contest.id,
+                    'submission_id': submission_id})
+    return TemplateResponse(request, 'programs/source.html',
+            dict(context, download_url=download_url,
+                 submission_id=submission_id))
 
 
-@enforce_condition(contest_exists & can_enter_contest)
-def source_diff_view(request, contest_id, submission1_id, submission2_id):
-    if request.session.get('saved_diff_id'):
-        request.session.pop('saved_diff_id')
-    source1 = get_submission_source_file_or_error(request, contest_id,
-        submission1_id).read()
-    source2 = get_submission_source_file_or_error(request, contest_id,
-        submission2_id).read()
+DiffLine = namedtuple('DiffLine', ['css_class', 'text', 'number'])
 
+
+def _source_diff(source1, source2):
     source1, decode_error1 = decode_str(source1)
     source2, decode_error2 = decode_str(source2)
     source1 = source1.splitlines()
     source2 = source2.splitlines()
 
     numwidth = len(str(max(len(source1), len(source2))))
-    ndiff = difflib.ndiff(source1, source2)
-
-    class DiffLine(object):
-        def __init__(self, css_class, text, number):
-            self.css_class = css_class
-            self.text = text
-            self.number = number
-
-    def diffstrip(line):
-        return line[2:]
 
     def numformat(num):
         return str(num).rjust(numwidth)
@@ -101,29 +100,54 @@ def source_diff_view(request, contest_id, submission1_id, submission2_id):
     diff1, diff2 = [], []
     count1, count2 = 1, 1
 
-    for diffline in ndiff:
-        line = diffstrip(diffline)
+    maxlen = getattr(settings, 'CHARACTERS_IN_LINE', 80)
+    for tag, line in diff_lines(source1, source2):
         line = line.expandtabs(4)
-        maxlen = getattr(settings, 'CHARACTERS_IN_LINE', 80)
         parts = (len(line) + maxlen) / maxlen
         line = line.ljust(parts * maxlen)
         for i in xrange(parts):
             f, t = i * maxlen, ((i + 1) * maxlen)
             c1, c2 = numformat(count1), numformat(count2)
-            if diffline.startswith('- '):
+            if tag == '-':
                 diff1.append(DiffLine('left', line[f:t], '' if i else c1))
                 diff2.append(DiffLine('empty', '', ''))
-            elif diffline.startswith('+ '):
+            elif tag == '+':
                 diff1.append(DiffLine('empty', '', ''))
                 diff2.append(DiffLine('right', line[f:t], '' if i else c2))
-            elif diffline.startswith('  '):
+            else:
                 diff1.append(DiffLine('both', line[f:t], '' if i else c1))
                 diff2.append(DiffLine('both', line[f:t], '' if i else c2))
-        if diffline.startswith('- ') or diffline.startswith('  '):
+        if tag != '+':
             count1 += 1
-        if diffline.startswith('+ ') or diffline.startswith('  '):
+        if tag != '-':
             count2 += 1
 
+    return {'source1': diff1, 'decode_error1': decode_error1,
+            'source2': diff2, 'decode_error2': decode_error2}
+
+
+@enforce_condition(contest_exists & can_enter_contest)
+def save_diff_id_view(request, contest_id, submission_id):
+    # Verify user's access to the submission
+    get_submission_source_file_or_error(request, contest_id, submission_id)
+    request.session['saved_diff_id'] = submission_id
+    return HttpResponse()
+
+
+@enforce_condition(contest_exists & can_enter_contest)
+def source_diff_view(request, contest_id, submission1_id, submission2_id):
+    if request.session.get('saved_diff_id'):
+        request.session.pop('saved_diff_id')
+    source_file1 = get_submission_source_file_or_error(request, contest_id,
+        submission1_id)
+    source_file2 = get_submission_source_file_or_error(request, contest_id,
+        submission2_id)
+    cache_key = _source_cache_key('diff', source_file1, source_file2)
+    context = cache.get(cache_key)
+    if context is None:
+        context = _source_diff(source_file1.read(), source_file2.read())
+        cache.set(cache_key, context, settings.SOURCE_VIEW_CACHE_TIMEOUT)
+
     download_url1 = reverse('download_submission_source',
             kwargs={'contest_id': request.contest.id,
                     'submission_id': submission1_id})
@@ -132,37 +156,35 @@ def source_diff_view(request, contest_id, submission1_id, submission2_id):
                     'submission_id': submission2_id})
 
     return TemplateResponse(request, 'programs/source_diff.html',
-            {'source1': diff1, 'decode_error1': decode_error1,
-             'download_url1': download_url1,
-             'source2': diff2, 'decode_error2': decode_error2,
-             'download_url2': download_url2,
-             'submission1_id': submission1_id,
-             'submission2_id': submission2_id,
-             'reverse_diff_url': reverse('source_diff', kwargs={
-                 'contest_id': contest_id,
-                 'submission1_id': submission2_id,
-                 'submission2_id': submission1_id})})
+            dict(context, download_url1=download_url1,
+                 download_url2=download_url2,
+                 submission1_id=submission1_id,
+                 submission2_id=submission2_id,
+                 reverse_diff_url=reverse('source_diff', kwargs={
+                     'contest_id': contest_id,
+                     'submission1_id': submission2_id,
+                     'submission2_id': submission1_id})))
 
 
 @enforce_condition(contest_exists & can_enter_contest)
 def download_submission_source_view(request, contest_id, submission_id):
     source_file = get_submission_source_file_or_error(request, contest_id,
         submission_id)
-    return stream_file(source_file)
+    return stream_file(source_file, request=request)
 
 
 def download_input_file_view(request, test_id):
     test = get_object_or_404(Test, id=test_id)
     if not request.user.has_perm('problems.problem_admin', test.problem):
         raise PermissionDenied
-    return stream_file(test.input_file)
+    return stream_file(test.input_file, request=request)
 
 
 def download_output_file_view(request, test_id):
     test = get_object_or_404(Test, id=test_id)
     if not request.user.has_perm('problems.problem_admin', test.problem):
         raise PermissionDenied
-    return stream_file(test.output_file)
+    return stream_file(test.output_file, request=request)
 
 
 def download_checker_exe_view(request, checker_id):
@@ -171,4 +193,4 @@ def download_checker_exe_view(request, checker_id):
         raise PermissionDenied
     if not checker.exe_file:
         raise Http404
-    return stream_file(checker.exe_file)
+    return stream_file(checker.exe_file, request=request)
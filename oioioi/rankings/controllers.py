@@ -1,23 +1,42 @@
 from collections import defaultdict
+from datetime import timedelta
 from operator import itemgetter
+from StringIO import StringIO
+import hashlib
+import itertools
+import json
 import unicodecsv
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.db.models import Q
+from django.http import StreamingHttpResponse
 from django.template import RequestContext
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.encoding import force_unicode
-from django.utils.translation import ugettext_lazy as _
+from django.utils.safestring import mark_safe
+from django.utils.translation import ugettext_lazy as _, get_language
 from django.contrib.auth.models import User
 
 from oioioi.base.utils import RegisteredSubclassesBase, ObjectWithMixins
 from oioioi.contests.models import ProblemInstance, UserResultForProblem
 from oioioi.contests.controllers import ContestController
 from oioioi.contests.utils import is_contest_admin, is_contest_observer
+from oioioi.rankings.models import RankingSnapshot
 
 
 CONTEST_RANKING_KEY = 'c'
 
 
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
 class RankingMixinForContestController(object):
     def ranking_controller(self):
         """Return the actual :class:`RankingController` for the contest."""
@@ -46,9 +65,70 @@ class RankingController(RegisteredSubclassesBase, ObjectWithMixins):
     def render_ranking_to_csv(self, request, key):
         raise NotImplementedError
 
+    def render_ranking_to_jsonl(self, request, key):
+        """Returns an HTTP response with the ranking in JSON lines format:
+           one JSON object per ranked user.
+        """
+        raise NotImplementedError
+
     def serialize_ranking(self, request, key):
         raise NotImplementedError
 
+    def get_ranking_visibility(self, request, key):
+        """Returns a string identifying the group of users who see exactly
+           the same version of the ranking ``key`` as the current user.
+
+           Rankings are materialized as
+           :class:`~oioioi.rankings.models.RankingSnapshot` instances, one
+           for each visibility class.
+        """
+        raise NotImplementedError
+
+    def _get_snapshot(self, request, key):
+        """Returns an up-to-date
+           :class:`~oioioi.rankings.models.RankingSnapshot` of the ranking
+           ``key``, recalculating it if necessary.
+
+           Stale snapshots are still served for
+           ``settings.RANKING_RECALCULATION_DEBOUNCE`` seconds after their
+           calculation, so that a burst of result changes during a contest
+           triggers at most one recalculation per period.
+        """
+        visibility = self.get_ranking_visibility(request, key)
+        if len(visibility) > RankingSnapshot._meta \
+                .get_field('visibility').max_length:
+            visibility = hashlib.sha1(visibility).hexdigest()
+        snapshot, _created = RankingSnapshot.objects.get_or_create(
+                contest=self.contest, key=key, visibility=visibility)
+        now = timezone.now()
+        debounce = timedelta(seconds=settings.RANKING_RECALCULATION_DEBOUNCE)
+        if not snapshot.is_stale() or \
+                (snapshot.calculation_date is not None and
+                 snapshot.calculation_date + debounce > now):
+            return snapshot
+
+        # Only one process recalculates the snapshot, the others serve the
+        # stale version in the meantime. A claim older than
+        # RANKING_RECALCULATION_TIMEOUT is assumed to be abandoned.
+        timeout = timedelta(seconds=settings.RANKING_RECALCULATION_TIMEOUT)
+        claimed = RankingSnapshot.objects.filter(id=snapshot.id) \
+                .filter(Q(recalculation_date__isnull=True) |
+                        Q(recalculation_date__lt=now - timeout)) \
+                .update(recalculation_date=now)
+        if not claimed and snapshot.calculation_date is not None:
+            return snapshot
+
+        data = self.serialize_ranking(request, key)
+        snapshot.set_data(data)
+        snapshot.html = self._render_ranking_data(request, data)
+        # Results changed during the recalculation must invalidate it, hence
+        # the calculation date is the time when we started.
+        snapshot.calculation_date = now
+        snapshot.recalculation_date = None
+        snapshot.save(update_fields=['serialized_data', 'html',
+                                     'calculation_date', 'recalculation_date'])
+        return snapshot
+
 
 class DefaultRankingController(RankingController):
     description = _("Default ranking")
@@ -76,11 +156,24 @@ class DefaultRankingController(RankingController):
             return rankings[:1]
         return rankings
 
-    def render_ranking(self, request, key):
-        data = self.serialize_ranking(request, key)
+    def get_ranking_visibility(self, request, key):
+        if is_contest_admin(request):
+            level = 'admin'
+        elif is_contest_observer(request):
+            level = 'observer'
+        else:
+            level = 'user'
+        rounds = [str(round.id)
+                  for round in self._rounds_for_ranking(request, key)]
+        return '%s:%s:%s' % (level, get_language(), ','.join(rounds))
+
+    def _render_ranking_data(self, request, data):
         return render_to_string('rankings/default_ranking.html',
                 context_instance=RequestContext(request, data))
 
+    def render_ranking(self, request, key):
+        return mark_safe(self._get_snapshot(request, key).html)
+
     def _render_ranking_csv_line(self, row):
         line = [row['place'], row['user'].username, row['user'].first_name,
                 row['user'].last_name]
@@ -89,26 +182,62 @@ class DefaultRankingController(RankingController):
         line.append(row['sum'])
         return line
 
-    def render_ranking_to_csv(self, request, key):
-        data = self.serialize_ranking(request, key)
-
-        response = HttpResponse(mimetype='text/csv')
-        response['Content-Disposition'] = \
-            'attachment; filename=%s-%s-%s.csv' % \
-            ("ranking", request.contest.id, key)
-        writer = unicodecsv.writer(response)
-
+    def _render_ranking_csv_header(self, pis):
         header = [_("#"), _("Username"), _("First name"), _("Last name")]
-        for pi in data['problem_instances']:
+        for pi in pis:
             header.append(pi.get_short_name_display())
         header.append(_("Sum"))
-        writer.writerow(map(force_unicode, header))
+        return header
+
+    def _render_ranking_json_line(self, pis, row):
+        return {
+            'place': row['place'],
+            'username': row['user'].username,
+            'first_name': row['user'].first_name,
+            'last_name': row['user'].last_name,
+            'results': dict((pi.short_name,
+                             unicode(r.score)
+                             if r and r.score is not None else None)
+                            for pi, r in zip(pis, row['results'])),
+            'sum': unicode(row['sum']),
+        }
+
+    def _iter_ranking_csv(self, header, rows):
+        buf = StringIO()
+        writer = unicodecsv.writer(buf)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(map(force_unicode,
+                                self._render_ranking_csv_line(row)))
+            if buf.tell() >= 64 * 1024:
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue()
+
+    def _iter_ranking_jsonl(self, pis, rows):
+        for row in rows:
+            yield json.dumps(self._render_ranking_json_line(pis, row)) + '\n'
+
+    def _export_response(self, request, key, content, content_type,
+            extension):
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = \
+            'attachment; filename=%s-%s-%s.%s' % \
+            ("ranking", request.contest.id, key, extension)
+        return response
 
-        for row in data['rows']:
-            line = self._render_ranking_csv_line(row)
-            writer.writerow(map(force_unicode, line))
+    def render_ranking_to_csv(self, request, key):
+        pis, rows = self.iter_ranking(request, key)
+        header = map(force_unicode, self._render_ranking_csv_header(pis))
+        return self._export_response(request, key,
+                self._iter_ranking_csv(header, rows), 'text/csv', 'csv')
 
-        return response
+    def render_ranking_to_jsonl(self, request, key):
+        pis, rows = self.iter_ranking(request, key)
+        return self._export_response(request, key,
+                self._iter_ranking_jsonl(pis, rows),
+                'application/x-json-lines', 'jsonl')
 
     def filter_users_for_ranking(self, request, key, queryset):
         return queryset.filter(is_superuser=False)
@@ -162,15 +291,73 @@ class DefaultRankingController(RankingController):
                 prev_sum = extractor(row)
             row['place'] = place
 
-    def serialize_ranking(self, request, key):
-        rounds = list(self._rounds_for_ranking(request, key))
-        pis = list(ProblemInstance.objects.filter(round__in=rounds)
+    def _ranked_rounds(self, request, key):
+        return list(self._rounds_for_ranking(request, key))
+
+    def _ranked_problem_instances(self, rounds):
+        return list(ProblemInstance.objects.filter(round__in=rounds)
                 .select_related('problem').prefetch_related('round'))
-        users = self.filter_users_for_ranking(request, key, User.objects.all())
-        results = UserResultForProblem.objects \
+
+    def _get_results(self, request, key, rounds, pis, users):
+        """Returns the results for problems ``pis`` of users from the
+           ``users`` queryset, which should be shown in the ranking.
+        """
+        return UserResultForProblem.objects \
                 .filter(problem_instance__in=pis, user__in=users) \
                 .prefetch_related('problem_instance__round')
 
+    def serialize_ranking(self, request, key):
+        rounds = self._ranked_rounds(request, key)
+        pis = self._ranked_problem_instances(rounds)
+        users = self.filter_users_for_ranking(request, key, User.objects.all())
+        results = self._get_results(request, key, rounds, pis, users)
+
         data = self._get_users_results(pis, results, rounds, users)
         self._assign_places(data, itemgetter('sum'))
         return {'rows': data, 'problem_instances': pis}
+
+    def iter_ranking(self, request, key):
+        """Returns a pair ``(problem_instances, rows)``, where ``rows`` is
+           an iterator over the rows of the ranking, as in
+           :meth:`serialize_ranking`.
+
+           Users are processed in chunks of
+           ``settings.RANKING_EXPORT_CHUNK_SIZE``, in two passes: the first
+           one computes the places, the second one builds the rows in the
+           ranking order. Only the sum of scores of each user is kept in
+           memory between the passes.
+        """
+        rounds = self._ranked_rounds(request, key)
+        pis = self._ranked_problem_instances(rounds)
+        users = self.filter_users_for_ranking(request, key, User.objects.all())
+        chunk_size = settings.RANKING_EXPORT_CHUNK_SIZE
+
+        def chunk_rows(user_ids):
+            chunk_users = User.objects.filter(id__in=user_ids)
+            results = self._get_results(request, key, rounds, pis,
+                    chunk_users)
+            return self._get_users_results(pis, results, rounds, chunk_users)
+
+        def rows():
+            # The users are ordered as in _get_users_results, so that the
+            # (stable) sort in _assign_places orders ties the same way as
+            # serialize_ranking does.
+            user_ids = users.order_by('last_name', 'first_name', 'username') \
+                    .values_list('id', flat=True)
+            places = []
+            for ids in _chunks(user_ids, chunk_size):
+                places.extend({'user_id': row['user'].id, 'sum': row['sum']}
+                              for row in chunk_rows(ids))
+            self._assign_places(places, itemgetter('sum'))
+
+            for chunk in _chunks(places, chunk_size):
+                by_user = dict((row['user'].id, row)
+                        for row in chunk_rows([p['user_id'] for p in chunk]))
+                for place in chunk:
+                    # The results might have changed since the first pass.
+                    row = by_user.get(place['user_id'])
+                    if row is not None:
+                        row['place'] = place['place']
+                        yield row
+
+        return pis, rows()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'RankingSnapshot'
+        db.create_table(u'rankings_rankingsnapshot', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('contest', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['contests.Contest'])),
+            ('key', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('visibility', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('serialized_data', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('html', self.gf('django.db.models.fields.TextField')(blank=True)),
+            ('calculation_date', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True)),
+            ('invalidation_date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.now)),
+        ))
+        db.send_create_signal(u'rankings', ['RankingSnapshot'])
+
+        # Adding unique constraint on 'RankingSnapshot', fields ['contest', 'key', 'visibility']
+        db.create_unique(u'rankings_rankingsnapshot', ['contest_id', 'key', 'visibility'])
+
+
+    def backwards(self, orm):
+        # Removing unique constraint on 'RankingSnapshot', fields ['contest', 'key', 'visibility']
+        db.delete_unique(u'rankings_rankingsnapshot', ['contest_id', 'key', 'visibility'])
+
+        # Deleting model 'RankingSnapshot'
+        db.delete_table(u'rankings_rankingsnapshot')
+
+
+    models = {
+        u'contests.contest': {
+            'Meta': {'object_name': 'Contest'},
+            'controller_name': ('oioioi.base.fields.DottedNameField', [], {'max_length': '255', 'superclass': "'oioioi.contests.controllers.ContestController'"}),
+            'creation_date': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_index': 'True', 'blank': 'True'}),
+            'default_submissions_limit': ('django.db.models.fields.IntegerField', [], {'default': '10', 'blank': 'True'}),
+            'id': ('django.db.models.fields.CharField', [], {'max_length': '32', 'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        },
+        u'rankings.rankingsnapshot': {
+            'Meta': {'unique_together': "(('contest', 'key', 'visibility'),)", 'object_name': 'RankingSnapshot'},
+            'calculation_date': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'contest': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contests.Contest']"}),
+            'html': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'invalidation_date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'key': ('django.db.models.fields.CharField', [], {'max_length': '255'}),
+            'serialized_data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'visibility': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        }
+    }
+
+    complete_apps = ['rankings']
\ No newline at end of file
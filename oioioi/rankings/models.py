@@ -0,0 +1,112 @@
+import base64
+import cPickle as pickle
+
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from oioioi.contests.models import Contest, Round, ProblemInstance, \
+        UserResultForProblem
+
+
+class RankingSnapshot(models.Model):
+    """A materialized ranking.
+
+       Each snapshot holds the ranking ``key`` of the ``contest`` as seen by
+       a single visibility class of users (see
+       :meth:`~oioioi.rankings.controllers.RankingController.get_ranking_visibility`).
+
+       A snapshot is stale when it has been invalidated after it was
+       calculated. Snapshots are invalidated by :func:`invalidate_rankings`.
+    """
+    contest = models.ForeignKey(Contest)
+    key = models.CharField(max_length=255)
+    visibility = models.CharField(max_length=255)
+    serialized_data = models.TextField(blank=True)
+    html = models.TextField(blank=True)
+    calculation_date = models.DateTimeField(null=True, blank=True)
+    invalidation_date = models.DateTimeField(default=timezone.now)
+    # Set while the snapshot is being recalculated by some process.
+    recalculation_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta(object):
+        unique_together = ('contest', 'key', 'visibility')
+
+    def is_stale(self):
+        return self.calculation_date is None or \
+                self.invalidation_date >= self.calculation_date
+
+    def get_data(self):
+        return pickle.loads(base64.b64decode(self.serialized_data))
+
+    def set_data(self, data):
+        self.serialized_data = base64.b64encode(
+                pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+
+
+def invalidate_rankings(contest=None, **filters):
+    """Marks all ranking snapshots of the given contest (or of all contests,
+       if ``contest`` is ``None``) as stale.
+
+       Additional ``filters`` are applied to the
+       :class:`RankingSnapshot` queryset.
+    """
+    queryset = RankingSnapshot.objects.filter(**filters)
+    if contest is not None:
+        queryset = queryset.filter(contest=contest)
+    queryset.update(invalidation_date=timezone.now())
+
+
+@receiver(post_save, sender=UserResultForProblem)
+@receiver(post_delete, sender=UserResultForProblem)
+def _invalidate_rankings_on_result_change(sender, instance, raw=False,
+        **kwargs):
+    if not raw:
+        invalidate_rankings(
+                contest__probleminstance__id=instance.problem_instance_id)
+
+
+@receiver(post_save, sender=Round)
+@receiver(post_delete, sender=Round)
+@receiver(post_save, sender=ProblemInstance)
+@receiver(post_delete, sender=ProblemInstance)
+def _invalidate_rankings_on_contest_change(sender, instance, raw=False,
+        **kwargs):
+    if not raw:
+        invalidate_rankings(instance.contest_id)
+
+
+# Fields of users which are shown in rankings or decide whether users are
+# shown at all.
+RANKING_USER_FIELDS = ('username', 'first_name', 'last_name', 'is_active',
+        'is_superuser')
+
+
+@receiver(pre_save, sender=User)
+def _check_user_name_change(sender, instance, raw, update_fields=None,
+        **kwargs):
+    instance._ranking_fields_changed = False
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and \
+            not set(update_fields) & set(RANKING_USER_FIELDS):
+        # E.g. logging in, which only touches last_login.
+        return
+    old_values = User.objects.filter(pk=instance.pk) \
+            .values_list(*RANKING_USER_FIELDS)
+    instance._ranking_fields_changed = bool(old_values) and \
+            old_values[0] != tuple(getattr(instance, field)
+                                   for field in RANKING_USER_FIELDS)
+
+
+@receiver(post_save, sender=User)
+def _invalidate_rankings_on_user_change(sender, instance, raw, **kwargs):
+    if not getattr(instance, '_ranking_fields_changed', False):
+        return
+    instance._ranking_fields_changed = False
+    contest_ids = set(UserResultForProblem.objects.filter(user=instance)
+            .values_list('problem_instance__contest', flat=True))
+    if contest_ids:
+        invalidate_rankings(contest__in=contest_ids)
@@ -1,13 +1,20 @@
-from django.test import TestCase
+import json
+
+from django.conf import settings
+from django.test import TestCase, RequestFactory
+from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
+from django.utils import timezone
 from django.utils.timezone import utc
 from django.contrib.auth.models import User
 from oioioi.base.tests import fake_time, check_not_accessible
-from oioioi.contests.models import Contest
-from datetime import datetime
+from oioioi.contests.models import Contest, UserResultForProblem
+from oioioi.filetracker.tests import TestStreamingMixin
+from oioioi.rankings.models import RankingSnapshot, invalidate_rankings
+from datetime import datetime, timedelta
 
 
-class TestRankingViews(TestCase):
+class TestRankingViews(TestCase, TestStreamingMixin):
     fixtures = ['test_users', 'test_contest', 'test_full_package',
             'test_submission', 'test_extra_rounds', 'test_ranking_data']
 
@@ -69,25 +76,142 @@ class TestRankingViews(TestCase):
         self.client.login(username='test_admin')
         with fake_time(datetime(2012, 8, 5, tzinfo=utc)):
             response = self.client.get(url)
-            self.assertContains(response, 'User,')
+            content = self.streamingContent(response)
+            self.assertIn('User,', content)
             # Check that Admin is filtered out.
-            self.assertNotContains(response, 'Admin')
+            self.assertNotIn('Admin', content)
 
             expected_order = ['Test,User', 'Test,User 2']
             prev_pos = 0
             for user in expected_order:
                 pattern = '%s,' % (user,)
-                self.assertIn(user, response.content)
-                pos = response.content.find(pattern)
+                self.assertIn(user, content)
+                pos = content.find(pattern)
                 self.assertGreater(pos, prev_pos, msg=('User %s has incorrect '
                        'position' % (user,)))
                 prev_pos = pos
 
             for task in ['zad1', 'zad2', 'zad3', 'zad3']:
-                self.assertContains(response, task)
+                self.assertIn(task, content)
 
             response = self.client.get(reverse('ranking',
                 kwargs={'contest_id': contest.id, 'key': '1'}))
             self.assertContains(response, 'zad1')
             for task in ['zad2', 'zad3', 'zad3']:
                 self.assertNotContains(response, task)
+
+    @override_settings(RANKING_EXPORT_CHUNK_SIZE=1)
+    def test_ranking_jsonl_view(self):
+        contest = Contest.objects.get()
+        url = reverse('ranking_jsonl', kwargs={'contest_id': contest.id,
+                                              'key': 'c'})
+
+        self.client.login(username='test_user')
+        with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
+            check_not_accessible(self, url)
+
+        self.client.login(username='test_admin')
+        with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
+            rows = [json.loads(line) for line in
+                    self.streamingContent(self.client.get(url)).splitlines()]
+            data = contest.controller.ranking_controller() \
+                    .serialize_ranking(self._get_request(contest), 'c')
+            self.assertEqual([row['username'] for row in rows],
+                    [row['user'].username for row in data['rows']])
+            self.assertEqual([row['place'] for row in rows],
+                    [row['place'] for row in data['rows']])
+            self.assertEqual(set(rows[0]['results'].keys()),
+                    set(pi.short_name for pi in data['problem_instances']))
+
+    def _get_request(self, contest):
+        request = RequestFactory().request()
+        request.contest = contest
+        request.user = User.objects.get(username='test_admin')
+        request.timestamp = datetime(2015, 8, 5, tzinfo=utc)
+        return request
+
+
+class TestRankingSnapshots(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+            'test_submission', 'test_extra_rounds', 'test_ranking_data']
+
+    def test_snapshot_invalidation(self):
+        contest = Contest.objects.get()
+        url = reverse('default_ranking', kwargs={'contest_id': contest.id})
+
+        self.client.login(username='test_user')
+        with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
+            self.client.get(url)
+            snapshot = RankingSnapshot.objects.get()
+            self.assertFalse(snapshot.is_stale())
+            self.assertIn('Test User', snapshot.html)
+
+            # The same visibility class is served from the snapshot.
+            self.client.login(username='test_user2')
+            response = self.client.get(url)
+            self.assertEqual(RankingSnapshot.objects.count(), 1)
+            self.assertContains(response, 'Test User 2')
+
+            result = UserResultForProblem.objects \
+                    .filter(user__username='test_user2')[0]
+            result.score = None
+            result.save()
+            self.assertTrue(RankingSnapshot.objects.get().is_stale())
+
+            self.client.get(url)
+            snapshot = RankingSnapshot.objects.get()
+            self.assertFalse(snapshot.is_stale())
+
+        self.client.login(username='test_admin')
+        with fake_time(datetime(2015, 8, 5, tzinfo=utc)):
+            self.client.get(url)
+            self.assertEqual(RankingSnapshot.objects.count(), 2)
+
+    def test_concurrent_recalculation(self):
+        contest = Contest.objects.get()
+        url = reverse('default_ranking', kwargs={'contest_id': contest.id})
+
+        self.client.login(username='test_user')
+        self.client.get(url)
+        snapshot = RankingSnapshot.objects.get()
+        calculation_date = snapshot.calculation_date
+
+        # Another process is recalculating the ranking, so the stale
+        # snapshot is served.
+        invalidate_rankings()
+        RankingSnapshot.objects.update(recalculation_date=timezone.now(),
+                calculation_date=calculation_date - timedelta(hours=1))
+        self.client.get(url)
+        snapshot = RankingSnapshot.objects.get()
+        self.assertTrue(snapshot.is_stale())
+
+        # An abandoned recalculation is taken over.
+        timeout = timedelta(seconds=settings.RANKING_RECALCULATION_TIMEOUT)
+        RankingSnapshot.objects.update(
+                recalculation_date=timezone.now() - timeout * 2)
+        self.client.get(url)
+        snapshot = RankingSnapshot.objects.get()
+        self.assertFalse(snapshot.is_stale())
+        self.assertIsNone(snapshot.recalculation_date)
+
+    def test_user_change_invalidation(self):
+        contest = Contest.objects.get()
+        url = reverse('default_ranking', kwargs={'contest_id': contest.id})
+        self.client.login(username='test_user')
+        self.client.get(url)
+        self.assertFalse(RankingSnapshot.objects.get().is_stale())
+
+        user = User.objects.get(username='test_user')
+        user.email = 'changed@example.com'
+        user.save()
+        self.assertFalse(RankingSnapshot.objects.get().is_stale())
+
+        # Users without results are not shown in the ranking.
+        other = User.objects.get(username='test_user3')
+        other.first_name = 'Changed'
+        other.save()
+        self.assertFalse(RankingSnapshot.objects.get().is_stale())
+
+        user.first_name = 'Changed'
+        user.save()
+        self.assertTrue(RankingSnapshot.objects.get().is_stale())
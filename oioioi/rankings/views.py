@@ -32,11 +32,21 @@ def ranking_view(request, contest_id, key=None):
                 {'choices': choices, 'ranking': ranking, 'key': key})
 
 
-@enforce_condition(contest_exists & is_contest_admin)
-def ranking_csv_view(request, contest_id, key):
+def _get_exported_ranking_controller(request, key):
     rcontroller = request.contest.controller.ranking_controller()
     choices = rcontroller.available_rankings(request)
     if not choices or key not in zip(*choices)[0]:
         raise Http404
+    return rcontroller
 
+
+@enforce_condition(contest_exists & is_contest_admin)
+def ranking_csv_view(request, contest_id, key):
+    rcontroller = _get_exported_ranking_controller(request, key)
     return rcontroller.render_ranking_to_csv(request, key)
+
+
+@enforce_condition(contest_exists & is_contest_admin)
+def ranking_jsonl_view(request, contest_id, key):
+    rcontroller = _get_exported_ranking_controller(request, key)
+    return rcontroller.render_ranking_to_jsonl(request, key)
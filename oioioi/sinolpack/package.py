@@ -5,8 +5,12 @@ import logging
 import re
 import shutil
 import tempfile
+import time
 import os
 import zipfile
+from collections import defaultdict
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -21,8 +25,10 @@ from oioioi.base.utils.execute import execute, ExecuteError
 from oioioi.problems.models import Problem, ProblemStatement
 from oioioi.problems.package import ProblemPackageBackend, \
         ProblemPackageError
-from oioioi.programs.models import Test, OutputChecker, ModelSolution
+from oioioi.programs.models import Test, OutputChecker, ModelSolution, \
+        bump_tests_version
 from oioioi.sinolpack.models import ExtraConfig, ExtraFile, OriginalPackage
+from oioioi.filetracker.storage import file_digest
 from oioioi.filetracker.utils import stream_file
 
 
@@ -67,6 +73,36 @@ class SinolPackage(object):
         self.problem = None
         self.rootdir = None
         self.short_name = self._find_main_folder()
+        self.stage_timings = []
+
+    @contextmanager
+    def _stage(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            self.stage_timings.append((name, duration))
+            logger.info('%s: %s took %.2fs', self.filename, name, duration)
+
+    def _run_concurrently(self, stages):
+        """Runs the given ``(name, function)`` pairs in separate threads
+           and waits for all of them to finish.
+
+           The stages must not touch the database, as Django database
+           connections are not shared between threads. The first exception
+           raised by a stage is re-raised.
+        """
+        def run(stage):
+            name, function = stage
+            with self._stage(name):
+                function()
+
+        pool = ThreadPool(len(stages))
+        try:
+            pool.map(run, stages)
+        finally:
+            pool.terminate()
 
     def _find_main_folder(self):
         # Looks for the only folder which has at least the in/ and out/
@@ -163,6 +199,12 @@ class SinolPackage(object):
             logger.warning('%s: failed to compile statement', self.filename,
                     exc_info=True)
 
+    def _compile_statements(self):
+        docdir = os.path.join(self.rootdir, 'doc')
+        pdffile = os.path.join(docdir, self.short_name + 'zad.pdf')
+        if os.path.isdir(docdir) and not os.path.isfile(pdffile):
+            self._compile_docs(docdir)
+
     def _process_statements(self):
         docdir = os.path.join(self.rootdir, 'doc')
         if not os.path.isdir(docdir):
@@ -178,9 +220,6 @@ class SinolPackage(object):
                     File(open(htmlzipfile, 'rb')))
 
         pdffile = os.path.join(docdir, self.short_name + 'zad.pdf')
-
-        if not os.path.isfile(pdffile):
-            self._compile_docs(docdir)
         if not os.path.isfile(pdffile):
             logger.warning('%s: no problem statement', self.filename)
             return
@@ -228,7 +267,8 @@ class SinolPackage(object):
     def _process_tests(self, total_score=100):
         indir = os.path.join(self.rootdir, 'in')
         outdir = os.path.join(self.rootdir, 'out')
-        test_names = []
+        tests = []
+        uploads = []
         scored_groups = set()
         names_re = re.compile(r'^(%s(([0-9]+)([a-z]?[a-z0-9]*))).in$'
                 % (re.escape(self.short_name),))
@@ -237,6 +277,9 @@ class SinolPackage(object):
         memory_limits = _stringify_keys(self.config.get('memory_limits', {}))
         statement_memory_limit = self._detect_statement_memory_limit()
 
+        existing_tests = dict((test.name, test) for test in
+                Test.objects.filter(problem=self.problem))
+
         # Find tests and create objects
         for order, test in enumerate(sorted(os.listdir(indir),
                                             key=naturalsort_key)):
@@ -252,12 +295,14 @@ class SinolPackage(object):
             group = match.group(3)       # 0
             suffix = match.group(4)      # ocen
 
-            instance, created = Test.objects.get_or_create(
-                problem=self.problem, name=name)
-            instance.input_file.save(basename + '.in',
-                    File(open(os.path.join(indir, basename + '.in'), 'rb')))
-            instance.output_file.save(basename + '.out',
-                    File(open(os.path.join(outdir, basename + '.out'), 'rb')))
+            instance = existing_tests.get(name)
+            created = instance is None
+            if created:
+                instance = Test(problem=self.problem, name=name)
+            uploads.append((instance, 'input_file', basename + '.in',
+                    os.path.join(indir, basename + '.in')))
+            uploads.append((instance, 'output_file', basename + '.out',
+                    os.path.join(outdir, basename + '.out')))
             if group == '0' or 'ocen' in suffix:
                 # Example tests
                 instance.kind = 'EXAMPLE'
@@ -285,37 +330,141 @@ class SinolPackage(object):
                 instance.memory_limit = DEFAULT_MEMORY_LIMIT
 
             instance.order = order
-            try:
-                instance.full_clean()
-            except ValidationError as e:
-                raise ProblemPackageError(e.messages[0])
-            instance.save()
-            test_names.append(name)
-
-        # Delete nonexistent tests
-        for test in Test.objects.filter(problem=self.problem) \
-                .exclude(name__in=test_names):
-            logger.info('%s: deleting test %s', self.filename, test.name)
-            test.delete()
+            tests.append(instance)
 
         # Assign scores
         if scored_groups:
-            Test.objects.filter(problem=self.problem).update(max_score=0)
             num_groups = len(scored_groups)
             group_score = total_score / num_groups
             extra_score_groups = sorted(scored_groups, key=naturalsort_key)[
                     num_groups - (total_score - num_groups * group_score):]
-            for group in scored_groups:
-                score = group_score
-                if group in extra_score_groups:
-                    score += 1
-                Test.objects.filter(problem=self.problem, group=group) \
-                        .update(max_score=score)
+            for instance in tests:
+                if instance.group not in scored_groups:
+                    instance.max_score = 0
+                elif instance.group in extra_score_groups:
+                    instance.max_score = group_score + 1
+                else:
+                    instance.max_score = group_score
+
+        # Validate the tests before uploading their files, so that nothing
+        # is left in the storage if the package is rejected.
+        for instance in tests:
+            try:
+                # Like full_clean, but without checking uniqueness: test
+                # names are unique, as they come from file names.
+                instance.clean_fields(exclude=['input_file', 'output_file'])
+                instance.clean()
+            except ValidationError as e:
+                raise ProblemPackageError(e.messages[0])
+        for _instance, _field_name, filename, path in uploads:
+            if not os.path.isfile(path):
+                raise ProblemPackageError(_("Missing test file: %s")
+                        % (filename,))
+
+        with self._stage('upload tests'):
+            self._upload_test_files(uploads)
+
+        # Save tests. Querysets are used instead of Test.save, so that the
+        # tests version is bumped only once.
+        with self._stage('save tests'):
+            test_names = [instance.name for instance in tests]
+            stale_tests = Test.objects.filter(problem=self.problem) \
+                    .exclude(name__in=test_names)
+            for name in stale_tests.values_list('name', flat=True):
+                logger.info('%s: deleting test %s', self.filename, name)
+            stale_tests.delete()
+
+            fields = [field for field in Test._meta.local_fields
+                      if not field.primary_key and field.name != 'problem']
+            for instance in tests:
+                if instance.pk is not None:
+                    Test.objects.filter(pk=instance.pk).update(**dict(
+                            (field.name, getattr(instance, field.attname))
+                            for field in fields))
+            Test.objects.bulk_create([instance for instance in tests
+                                      if instance.pk is None])
+            bump_tests_version(self.problem.id)
+
+    def _upload_test_files(self, uploads):
+        """Uploads test files to the storage, using a pool of
+           ``SINOLPACK_UPLOAD_THREADS`` threads.
+
+           ``uploads`` is a list of ``(instance, field_name, filename,
+           path)`` tuples. The stored files are assigned to the fields
+           of the instances, which are not saved.
+        """
+        def upload(args):
+            storage, name, path = args
+            return storage.save(name, File(open(path, 'rb')))
 
-    def _process_checkers(self):
+        def upload_blob(args):
+            storage, digest, path = args
+            storage.upload_blob(digest, path)
+
+        if not uploads:
+            return
+        # Storage names are generated here, as generating them may need
+        # the database.
+        files = []
+        for instance, field_name, filename, path in uploads:
+            field = instance._meta.get_field(field_name)
+            files.append((field.storage,
+                    field.generate_filename(instance, filename), path))
+        # Files stored by their content (see FiletrackerStorage) are
+        # uploaded only if the same content is not stored yet. References
+        # to the stored contents are added here, as the database is not
+        # used in the upload threads.
+        names = [None] * len(files)
+        plain_files = []
+        digests = defaultdict(list)
+        blob_paths = {}
+        for i, (storage, name, path) in enumerate(files):
+            if getattr(storage, 'deduplicate', False):
+                digest = file_digest(path)
+                names[i] = storage.blob_name(digest, name)
+                digests[storage].append(digest)
+                blob_paths[(storage, digest)] = path
+            else:
+                plain_files.append(i)
+        missing_blobs = []
+        for storage, storage_digests in digests.iteritems():
+            missing_blobs.extend((storage, digest,
+                                  blob_paths[(storage, digest)])
+                    for digest in storage.add_references(storage_digests))
+        if digests:
+            logger.info('%s: %d of %d test files already stored',
+                    self.filename, len(files) - len(plain_files) -
+                    len(missing_blobs), len(files) - len(plain_files))
+
+        pool = ThreadPool(min(len(uploads), settings.SINOLPACK_UPLOAD_THREADS))
+        try:
+            pool.map(upload_blob, missing_blobs)
+            for i, name in zip(plain_files,
+                    pool.map(upload, [files[i] for i in plain_files])):
+                names[i] = name
+        except:
+            # The files will not be assigned to the tests.
+            for storage, storage_digests in digests.iteritems():
+                storage.remove_references(storage_digests)
+            raise
+        finally:
+            pool.terminate()
+        for storage in digests:
+            storage.blobs_uploaded([blob_digest for s, blob_digest, _path
+                                    in missing_blobs if s is storage])
+        for (instance, field_name, _filename, _path), name in \
+                zip(uploads, names):
+            setattr(instance, field_name, name)
+
+    def _build_programs(self):
+        with self._stage('generate tests'):
+            self._generate_tests()
+        with self._stage('compile checker'):
+            self._compile_checker()
+
+    def _compile_checker(self):
         checker_prefix = os.path.join(self.rootdir, 'prog',
                 self.short_name + 'chk')
-        checker = None
 
         source_candidates = [
                 checker_prefix + '.cpp',
@@ -330,6 +479,11 @@ class SinolPackage(object):
                         cwd=os.path.join(self.rootdir, 'prog'))
                 break
 
+    def _process_checkers(self):
+        checker_prefix = os.path.join(self.rootdir, 'prog',
+                self.short_name + 'chk')
+        checker = None
+
         exe_candidates = [
                 checker_prefix + '.e',
                 checker_prefix + '.sh',
@@ -423,21 +577,42 @@ class SinolPackage(object):
 
         tmpdir = tempfile.mkdtemp()
         logger.info('%s: tmpdir is %s', self.filename, tmpdir)
+        self.stage_timings = []
         try:
-            self.archive.extract(to_path=tmpdir)
-            self.rootdir = os.path.join(tmpdir, self.short_name)
-            self._process_config_yml()
-            self._detect_full_name()
-            self._extract_makefiles()
-            self._process_statements()
-            self._generate_tests()
-            self._process_tests()
-            self._process_checkers()
-            self._process_extra_files()
-            self._process_model_solutions()
-            self._save_original_package()
+            with self._stage('extract'):
+                self.archive.extract(to_path=tmpdir)
+                self.rootdir = os.path.join(tmpdir, self.short_name)
+                self._process_config_yml()
+                self._detect_full_name()
+                self._extract_makefiles()
+
+            # Statements are compiled in doc/, independently of the other
+            # stages, so they may be compiled while the programs in prog/
+            # are built. Tests and the checker are built by the same
+            # makefiles, so they are built one after another.
+            with self._stage('build'):
+                self._run_concurrently([
+                        ('compile statements', self._compile_statements),
+                        ('build programs', self._build_programs),
+                    ])
+
+            with self._stage('statements'):
+                self._process_statements()
+            with self._stage('tests'):
+                self._process_tests()
+            with self._stage('checkers'):
+                self._process_checkers()
+            with self._stage('extra files'):
+                self._process_extra_files()
+            with self._stage('model solutions'):
+                self._process_model_solutions()
+            with self._stage('original package'):
+                self._save_original_package()
             return self.problem
         finally:
+            logger.info('%s: import stage timings: %s', self.filename,
+                    ', '.join('%s %.2fs' % timing
+                              for timing in self.stage_timings))
             shutil.rmtree(tmpdir)
 
 
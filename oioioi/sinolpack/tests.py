@@ -1,10 +1,13 @@
 # coding: utf-8
 
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core.management import call_command
 from django.core.urlresolvers import reverse
+from oioioi.filetracker.models import FileBlob
 from oioioi.filetracker.tests import TestStreamingMixin
-from oioioi.sinolpack.package import SinolPackageBackend, \
+from oioioi.problems.package import ProblemPackageError
+from oioioi.sinolpack.package import SinolPackage, SinolPackageBackend, \
         DEFAULT_TIME_LIMIT
 from oioioi.contests.models import ProblemInstance, Contest, \
         Submission, UserResultForContest
@@ -12,10 +15,12 @@ from oioioi.contests.scores import IntegerScore
 from oioioi.problems.models import Problem, ProblemStatement
 from oioioi.programs.models import Test, OutputChecker, ModelSolution, \
         TestReport
+from oioioi.programs import models as programs_models
 from oioioi.sinolpack.models import ExtraConfig, ExtraFile
 from nose.plugins.attrib import attr
 from nose.tools import nottest
 import os.path
+import tempfile
 from cStringIO import StringIO
 import urllib
 import zipfile
@@ -163,11 +168,18 @@ class TestSinolPackage(TestCase):
         call_command('addproblem', filename)
         problem = Problem.objects.get()
         self._check_full_package(problem)
+        test_ids = dict(Test.objects.filter(problem=problem)
+                .values_list('name', 'id'))
+        tests_version = programs_models.get_tests_version(problem.id)
 
         # Rudimentary test of package updating
         call_command('updateproblem', str(problem.id), filename)
         problem = Problem.objects.get()
         self._check_full_package(problem)
+        self.assertEqual(test_ids, dict(Test.objects.filter(problem=problem)
+                .values_list('name', 'id')))
+        self.assertNotEqual(tests_version,
+                programs_models.get_tests_version(problem.id))
 
     @attr('slow')
     def test_huge_unpack_update(self):
@@ -220,6 +232,48 @@ class TestSinolPackage(TestCase):
         test = Test.objects.filter(memory_limit=132000)
         self.assertEqual(test.count(), 5)
 
+    @override_settings(FILETRACKER_DEDUPLICATION=True)
+    def test_deduplicated_test_files(self):
+        filename = get_test_filename('test_simple_package.zip')
+        call_command('addproblem', filename)
+        call_command('addproblem', filename)
+        first, second = [Test.objects.filter(problem=problem).order_by('name')
+                         for problem in Problem.objects.all()]
+        self.assertEqual(len(first), 5)
+        for test, same_test in zip(first, second):
+            self.assertTrue(test.input_file.name.startswith('blobs/'))
+            self.assertTrue(test.input_file.name.endswith('.in'))
+            self.assertEqual(test.input_file.name, same_test.input_file.name)
+            self.assertEqual(test.output_file.name,
+                    same_test.output_file.name)
+            self.assertEqual(test.input_file.read(),
+                    same_test.input_file.read())
+        blobs = FileBlob.objects.all()
+        self.assertTrue(blobs)
+        self.assertGreaterEqual(sum(blob.refcount for blob in blobs), 20)
+        self.assertTrue(all(blob.uploaded for blob in blobs))
+
+    def test_invalid_tests_not_uploaded(self):
+        source = zipfile.ZipFile(get_test_filename('test_simple_package.zip'))
+        tmp = tempfile.NamedTemporaryFile(suffix='.zip')
+        self.addCleanup(tmp.close)
+        archive = zipfile.ZipFile(tmp, 'w')
+        for info in source.infolist():
+            content = source.read(info)
+            if info.filename == 'tst/config.yml':
+                content += 'time_limits:\n  1a: 0\n'
+            archive.writestr(info, content)
+        archive.close()
+        tmp.flush()
+
+        package = SinolPackage(tmp.name)
+        self.assertEqual(package.stage_timings, [])
+        uploads = []
+        package._upload_test_files = uploads.append
+        with self.assertRaises(ProblemPackageError):
+            package.unpack()
+        self.assertEqual(uploads, [])
+
 
 class TestSinolPackageInContest(TestCase, TestStreamingMixin):
     fixtures = ['test_users', 'test_contest']
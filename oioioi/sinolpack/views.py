@@ -8,4 +8,4 @@ def download_extra_file_view(request, file_id):
     file = get_object_or_404(ExtraFile, id=file_id)
     if not request.user.has_perm('problems.problem_admin', file.problem):
         raise PermissionDenied
-    return stream_file(file.file)
+    return stream_file(file.file, request=request)
@@ -1,6 +1,27 @@
+import cPickle as pickle
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from multiprocessing.pool import ThreadPool
+
+from celery import chord, group
+from celery.exceptions import TimeoutError
+from celery.task import task
+from django.conf import settings
+
 import sio.workers.runner
 import sio.celery.job
 
+from oioioi.filetracker.client import get_client
+from oioioi.sioworkers.jobs import is_batch_job, run_batch_job
+
 # This is a workaround for SIO-915. We assume that other parts of OIOIOI code
 # do not rely on particular directory being the current directory. Without
 # this assumption, even a single call to LocalClient.build would break that
@@ -9,6 +30,20 @@ from threading import Lock
 _local_backend_lock = Lock()
 
 
+def _run_job(job):
+    if is_batch_job(job):
+        return run_batch_job(job, sio.workers.runner.run)
+    return sio.workers.runner.run(job)
+
+
+@task
+def sioworkers_batch_job(job):
+    """Runs a batch job (see :func:`oioioi.sioworkers.jobs.pack_jobs`)
+       on a sioworkers Celery worker.
+    """
+    return run_batch_job(job, sio.workers.runner.run)
+
+
 class LocalBackend(object):
     """A simple sioworkers backend which executes the work in the calling
        process.
@@ -18,30 +53,310 @@ class LocalBackend(object):
 
     def run_job(self, job, **kwargs):
         with _local_backend_lock:
-            return sio.workers.runner.run(job)
+            return _run_job(job)
 
     def run_jobs(self, dict_of_jobs, **kwargs):
-        results = {}
+        return dict(self.run_jobs_iter(dict_of_jobs, **kwargs))
+
+    def run_jobs_iter(self, dict_of_jobs, skip_job=None, **kwargs):
         for key, value in dict_of_jobs.iteritems():
-            results[key] = self.run_job(value, **kwargs)
-        return results
+            if skip_job and skip_job(key):
+                continue
+            yield key, self.run_job(value, **kwargs)
+
+
+def _random_verdict(weights):
+    total = sum(weights.itervalues())
+    point = random.uniform(0, total)
+    for verdict, weight in sorted(weights.iteritems()):
+        point -= weight
+        if point <= 0:
+            return verdict
+    return verdict
+
+
+class FakeBackend(LocalBackend):
+    """A sioworkers backend which does not run anything, but returns
+       synthetic results of ``compile`` and ``*exec`` jobs, for measuring
+       the performance of OIOIOI itself.
+
+       Each job takes ``settings.SIOWORKERS_FAKE_LATENCY[kind]`` seconds,
+       where ``kind`` is either ``compile`` or ``exec``. The result code is
+       chosen at random according to the weights from
+       ``settings.SIOWORKERS_FAKE_VERDICTS[kind]``.
+
+       Empty output files (including compiled programs) are stored in the
+       filetracker, so that the handlers may use them as usual.
+    """
+
+    def _put_file(self, path):
+        with tempfile.NamedTemporaryFile() as f:
+            get_client().put_file(path, f.name)
+
+    def _compile(self, job):
+        result = dict(job, compiler_output='')
+        result['result_code'] = _random_verdict(
+                settings.SIOWORKERS_FAKE_VERDICTS['compile'])
+        # Like sioworkers, the out_file stays in the environment even if
+        # the compilation fails.
+        if result['result_code'] == 'OK':
+            self._put_file(job['out_file'])
+        else:
+            result['compiler_output'] = 'Fake compilation error'
+        return result
+
+    def _exec(self, job):
+        time_limit = job.get('exec_time_limit', 10000)
+        result_code = _random_verdict(
+                settings.SIOWORKERS_FAKE_VERDICTS['exec'])
+        if result_code == 'TLE':
+            time_used = time_limit
+        else:
+            time_used = random.randint(0, time_limit)
+        if job.get('upload_out'):
+            self._put_file(job['out_file'])
+        return dict(job, result_code=result_code, result_string='',
+                time_used=time_used, mem_used=0, num_syscalls=0)
+
+    def _run_fake_job(self, job):
+        job_type = job['job_type']
+        if job_type == 'ping':
+            return dict(job, pong=job['ping'])
+        if job_type == 'compile':
+            kind = 'compile'
+        elif job_type.endswith('exec'):
+            kind = 'exec'
+        else:
+            raise RuntimeError("FakeBackend does not support %s jobs"
+                    % (job_type,))
+        time.sleep(settings.SIOWORKERS_FAKE_LATENCY[kind])
+        return getattr(self, '_' + kind)(job)
+
+    def run_job(self, job, **kwargs):
+        if is_batch_job(job):
+            return run_batch_job(job, self._run_fake_job)
+        return self._run_fake_job(job)
+
+
+def _run_job_in_child_process(job):
+    """Runs a sioworkers job in a child process
+       (see :mod:`oioioi.sioworkers.local_runner`).
+
+       The child works in its own temporary directory, so the working
+       directory of the calling process is never changed and jobs may run
+       concurrently. It is a new Python process rather than a fork, as
+       forking a multithreaded process (this is called from a thread pool)
+       is unsafe. The child is killed if it runs for longer than
+       ``settings.SIOWORKERS_LOCAL_JOB_TIMEOUT`` seconds.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix='oioioi-sioworkers-')
+    try:
+        job_path = os.path.join(tmp_dir, 'job')
+        result_path = os.path.join(tmp_dir, 'result')
+        workdir = os.path.join(tmp_dir, 'work')
+        os.mkdir(workdir)
+        with open(job_path, 'wb') as f:
+            pickle.dump(job, f, pickle.HIGHEST_PROTOCOL)
+
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        process = subprocess.Popen([sys.executable, '-m',
+                'oioioi.sioworkers.local_runner', job_path, result_path],
+                cwd=workdir, env=env, close_fds=True)
+        timed_out = []
+
+        def kill():
+            if process.returncode is None:
+                timed_out.append(True)
+                try:
+                    process.kill()
+                except OSError:
+                    pass
+
+        timer = threading.Timer(settings.SIOWORKERS_LOCAL_JOB_TIMEOUT, kill)
+        timer.start()
+        try:
+            process.wait()
+        finally:
+            timer.cancel()
+            if process.returncode is None:
+                process.kill()
+                process.wait()
+
+        if timed_out:
+            raise RuntimeError("sioworkers job killed after %d seconds"
+                    % (settings.SIOWORKERS_LOCAL_JOB_TIMEOUT,))
+        try:
+            with open(result_path, 'rb') as f:
+                success, result = pickle.load(f)
+        except (IOError, EOFError):
+            raise RuntimeError("sioworkers job process died unexpectedly "
+                    "(exit code %d)" % (process.returncode,))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if not success:
+        raise RuntimeError("sioworkers job failed:\n" + result)
+    return result
+
+
+class ParallelLocalBackend(LocalBackend):
+    """A sioworkers backend which executes the jobs on the local machine,
+       running up to ``settings.SIOWORKERS_LOCAL_CONCURRENCY`` of them
+       at once (all available CPUs by default).
+
+       Every job is run in a separate process in an isolated working
+       directory, so that no locking is needed. Jobs running for longer than
+       ``settings.SIOWORKERS_LOCAL_JOB_TIMEOUT`` seconds are killed.
+
+       Suitable for a single-machine OIOIOI setup. It should not be used in
+       tests, as files saved in the filetracker by the jobs are not visible
+       to the calling process when a non-shared filetracker client is used.
+    """
+
+    def _concurrency(self):
+        return settings.SIOWORKERS_LOCAL_CONCURRENCY or \
+                multiprocessing.cpu_count()
+
+    def run_job(self, job, **kwargs):
+        return _run_job_in_child_process(job)
+
+    def run_jobs_iter(self, dict_of_jobs, skip_job=None, **kwargs):
+        def _run(item):
+            key, job = item
+            if skip_job and skip_job(key):
+                return key, None, True
+            return key, _run_job_in_child_process(job), False
+
+        pool = ThreadPool(min(self._concurrency(), len(dict_of_jobs)) or 1)
+        try:
+            for key, result, skipped in \
+                    pool.imap_unordered(_run, dict_of_jobs.iteritems()):
+                if not skipped:
+                    yield key, result
+        finally:
+            pool.terminate()
 
 
 class CeleryBackend(object):
-    """A backend which uses Celery for sioworkers jobs."""
+    """A backend which uses Celery for sioworkers jobs.
+
+       Multiple jobs are dispatched as Celery groups, so that at most
+       ``settings.SIOWORKERS_BATCH_SIZE`` jobs per call are in flight at
+       any time (see :meth:`run_jobs_iter`).
+
+       Batch jobs are run by the :func:`sioworkers_batch_job` task, so the
+       workers must be able to import this module.
+    """
+
+    def _job_task(self, job):
+        if is_batch_job(job):
+            return sioworkers_batch_job
+        return sio.celery.job.sioworkers_job
 
     def _delayed_job(self, job, **kwargs):
-        return sio.celery.job.sioworkers_job.apply_async(args=[job], **kwargs)
+        return self._job_task(job).apply_async(args=[job], **kwargs)
+
+    def _delayed_jobs(self, jobs, **kwargs):
+        """Dispatches a list of ``(key, job)`` pairs as a single group and
+           returns a list of ``(key, async_result)`` pairs.
+        """
+        keys = [key for key, _job in jobs]
+        group_result = group(self._job_task(job).s(job)
+                             for _key, job in jobs).apply_async(**kwargs)
+        return zip(keys, group_result.results)
 
     def run_job(self, job, **kwargs):
         return self._delayed_job(job, **kwargs).get()
 
     def run_jobs(self, dict_of_jobs, **kwargs):
-        async_jobs = dict()
-        for key, env in dict_of_jobs.iteritems():
-            async_jobs[key] = sio.celery.job.sioworkers_job.apply_async(
-                args=[env], **kwargs)
-        results = dict()
-        for key, async_job in async_jobs.iteritems():
-            results[key] = async_job.get()
-        return results
+        return dict(self.run_jobs_iter(dict_of_jobs, **kwargs))
+
+    def send_jobs(self, list_of_jobs, callback, **kwargs):
+        """Sends the jobs as a Celery chord with the given ``callback``.
+
+           Exceptions of failed jobs are passed to the callback instead of
+           failing the whole chord.
+        """
+        header = group(self._job_task(job).s(job).set(**kwargs)
+                       for job in list_of_jobs)
+        return chord(header)(callback, propagate=False)
+
+    def _finished_jobs(self, in_flight, timeout):
+        """Waits at most ``timeout`` seconds for some of the in-flight
+           ``(key, async_result)`` pairs to finish and returns the finished
+           ones.
+
+           Result backends which fetch the states of many tasks at once
+           (key-value stores and AMQP, see ``get_many``) are asked about
+           all the jobs together. Other backends are asked about every job
+           separately, so they are asked only once per ``timeout``.
+        """
+        backend = in_flight[0][1].backend
+        if not hasattr(backend, 'get_many'):
+            finished = [(key, async_job) for key, async_job in in_flight
+                        if async_job.ready()]
+            if not finished:
+                time.sleep(timeout)
+            return finished
+
+        by_id = dict((async_job.id, (key, async_job))
+                     for key, async_job in in_flight)
+        finished = []
+        try:
+            for task_id, _meta in backend.get_many(by_id.keys(),
+                    timeout=timeout, interval=timeout):
+                finished.append(by_id[task_id])
+        except TimeoutError:
+            pass
+        return finished
+
+    def run_jobs_iter(self, dict_of_jobs, skip_job=None, **kwargs):
+        """Runs the jobs and yields ``(key, result)`` pairs in the order
+           in which the jobs finish.
+
+           If ``skip_job`` is given, it is called with job keys before
+           dispatching the jobs and while waiting for them. Jobs for which
+           it returns ``True`` are not sent (or are revoked if they were
+           already sent) and their results are not yielded.
+
+           New jobs are sent when at least a quarter of
+           ``settings.SIOWORKERS_BATCH_SIZE`` slots are free (or all the
+           remaining jobs fit), so that they go in reasonably large groups.
+           The results are polled every ``settings.SIOWORKERS_POLL_INTERVAL``
+           seconds, backing off up to ``SIOWORKERS_MAX_POLL_INTERVAL`` while
+           no job finishes.
+        """
+        batch_size = settings.SIOWORKERS_BATCH_SIZE
+        min_refill = max(1, batch_size // 4)
+        poll_interval = settings.SIOWORKERS_POLL_INTERVAL
+        pending = deque(dict_of_jobs.iteritems())
+        in_flight = []
+        while True:
+            if skip_job:
+                for key, async_job in list(in_flight):
+                    if skip_job(key):
+                        async_job.revoke()
+                        in_flight.remove((key, async_job))
+            free_slots = batch_size - len(in_flight)
+            if pending and free_slots >= min(min_refill, len(pending)):
+                batch = []
+                while pending and len(batch) < free_slots:
+                    key, job = pending.popleft()
+                    if not (skip_job and skip_job(key)):
+                        batch.append((key, job))
+                if batch:
+                    in_flight.extend(self._delayed_jobs(batch, **kwargs))
+            if not in_flight:
+                if pending:
+                    continue
+                break
+
+            finished = self._finished_jobs(in_flight, poll_interval)
+            if not finished:
+                poll_interval = min(2 * poll_interval,
+                        settings.SIOWORKERS_MAX_POLL_INTERVAL)
+                continue
+            poll_interval = settings.SIOWORKERS_POLL_INTERVAL
+            for entry in finished:
+                in_flight.remove(entry)
+            for key, async_job in finished:
+                yield key, async_job.get()
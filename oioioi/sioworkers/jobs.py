@@ -1,14 +1,195 @@
+import logging
+import threading
+import time
+
 from django.conf import settings
 from oioioi.base.utils import get_object_by_dotted_name
 
 
+logger = logging.getLogger(__name__)
+
+_wait_time = threading.local()
+
+
+def get_sioworkers_wait_time():
+    """Returns the total time (in seconds) the current thread has spent
+       waiting for the results of sioworkers jobs.
+    """
+    return getattr(_wait_time, 'total', 0.)
+
+
+def _add_wait_time(start):
+    _wait_time.total = get_sioworkers_wait_time() + time.time() - start
+
+
 def _get_backend():
     return get_object_by_dotted_name(settings.SIOWORKERS_BACKEND)()
 
 
 def run_sioworkers_job(job, **kwargs):
-    return _get_backend().run_job(job, **kwargs)
+    start = time.time()
+    try:
+        return _get_backend().run_job(job, **kwargs)
+    finally:
+        _add_wait_time(start)
 
 
 def run_sioworkers_jobs(dict_of_jobs, **kwargs):
-    return _get_backend().run_jobs(dict_of_jobs, **kwargs)
+    start = time.time()
+    try:
+        return _get_backend().run_jobs(dict_of_jobs, **kwargs)
+    finally:
+        _add_wait_time(start)
+
+
+def _timed_iter(iterable):
+    iterator = iter(iterable)
+    while True:
+        start = time.time()
+        try:
+            item = next(iterator)
+        finally:
+            _add_wait_time(start)
+        yield item
+
+
+def pack_jobs(dict_of_jobs, max_time=None):
+    """Packs jobs with small time limits into batch jobs, which are run by
+       a single worker one after another, to save the overhead of
+       dispatching each job separately (e.g. a Celery message and task per
+       job). Only the dispatch overhead is reduced: each job of a batch is
+       still run by sioworkers on its own, with its own files and sandbox.
+
+       The sum of the time limits (``exec_time_limit``) of the jobs in
+       a batch does not exceed ``max_time`` milliseconds (by default
+       ``settings.SIOWORKERS_BATCH_MAX_TIME``). Jobs without a time limit
+       are not packed. If ``max_time`` is zero, the jobs are returned as
+       they are.
+
+       Returns a new dictionary of jobs. The results of the batch jobs
+       should be unpacked with :func:`unpack_results`.
+    """
+    if max_time is None:
+        max_time = settings.SIOWORKERS_BATCH_MAX_TIME
+    if not max_time:
+        return dict_of_jobs
+
+    packed = {}
+    batches = []
+    batch, batch_time = {}, 0
+    for key, job in sorted(dict_of_jobs.iteritems()):
+        time_limit = job.get('exec_time_limit')
+        if not time_limit or time_limit > max_time:
+            packed[key] = job
+            continue
+        if batch_time + time_limit > max_time:
+            batches.append(batch)
+            batch, batch_time = {}, 0
+        batch[key] = job
+        batch_time += time_limit
+    batches.append(batch)
+
+    for i, batch in enumerate(batches):
+        if len(batch) == 1:
+            packed.update(batch)
+        elif batch:
+            packed['__batch%d' % (i,)] = {'job_type': 'batch', 'jobs': batch}
+    return packed
+
+
+def is_batch_job(job):
+    return job.get('job_type') == 'batch'
+
+
+def _failed_job_result(exc):
+    return {
+        'result_code': 'SE',
+        'result_string': ('System error: %s' % (exc,))[:255],
+        'time_used': 0,
+        'mem_used': 0,
+        'num_syscalls': 0,
+    }
+
+
+def run_batch_job(job, run_job):
+    """Runs the jobs of a batch job made by :func:`pack_jobs` one after
+       another, using the ``run_job`` function.
+
+       A job which fails gets a result with the ``SE`` (system error)
+       result code, so that it does not discard the results of the other
+       jobs of the batch.
+    """
+    results = {}
+    for key, subjob in sorted(job['jobs'].iteritems()):
+        try:
+            results[key] = run_job(subjob)
+        except Exception as e:
+            logger.error("Job %s of a batch failed", key, exc_info=True)
+            results[key] = _failed_job_result(e)
+    return {'job_type': 'batch', 'batch_results': results}
+
+
+def unpack_results(results):
+    """Converts the ``(key, result)`` pairs of jobs packed by
+       :func:`pack_jobs` to the pairs of the original jobs.
+    """
+    for key, result in results:
+        if isinstance(result, dict) and 'batch_results' in result:
+            for item in result['batch_results'].iteritems():
+                yield item
+        else:
+            yield key, result
+
+
+def run_sioworkers_jobs_iter(dict_of_jobs, skip_job=None, **kwargs):
+    """Runs the given jobs, yielding ``(key, result)`` pairs as soon as
+       the results are available.
+
+       ``skip_job`` may be a function, which gets a job key and returns
+       ``True`` if the job is no longer needed. Such jobs are not run (if
+       they have not started yet) and their results are not returned.
+
+       Jobs may be run in batches (see :func:`pack_jobs`). A batch is
+       skipped only if all its jobs are, and yields all its results.
+
+       Backends without streaming support (i.e. without ``run_jobs_iter``
+       method) run all the jobs and return all the results at once.
+    """
+    jobs = pack_jobs(dict_of_jobs)
+    if skip_job and jobs is not dict_of_jobs:
+        job_skip_job = skip_job
+
+        def skip_job(key):
+            job = jobs[key]
+            if is_batch_job(job):
+                return all(job_skip_job(subkey) for subkey in job['jobs'])
+            return job_skip_job(key)
+
+    backend = _get_backend()
+    if hasattr(backend, 'run_jobs_iter'):
+        results = _timed_iter(backend.run_jobs_iter(jobs,
+                skip_job=skip_job, **kwargs))
+    else:
+        results = run_sioworkers_jobs(jobs, **kwargs).iteritems()
+    return unpack_results(results)
+
+
+def send_sioworkers_jobs(list_of_jobs, callback, **kwargs):
+    """Runs the given jobs in the background, without waiting for them.
+
+       ``callback`` is a Celery subtask, which is called with the list of
+       results (in the order of ``list_of_jobs``) as its first argument
+       once all the jobs finish. Failed jobs are represented in the list by
+       their exceptions.
+
+       Returns the :class:`~celery.result.AsyncResult` of the callback.
+
+       Backends without support for this (i.e. without ``send_jobs``
+       method) run the jobs before returning.
+    """
+    backend = _get_backend()
+    if hasattr(backend, 'send_jobs'):
+        return backend.send_jobs(list_of_jobs, callback, **kwargs)
+    results = backend.run_jobs(dict(enumerate(list_of_jobs)), **kwargs)
+    return callback.apply_async(
+            ([results[i] for i in xrange(len(list_of_jobs))],))
@@ -0,0 +1,34 @@
+"""Runs a single sioworkers job for
+   :class:`~oioioi.sioworkers.backends.ParallelLocalBackend`.
+
+   Usage::
+
+       python -m oioioi.sioworkers.local_runner <job_file> <result_file>
+
+   The job is read from ``job_file`` and the pickled pair ``(True, result)``
+   or ``(False, traceback)`` is written to ``result_file``. The job is run
+   in the current working directory.
+"""
+import cPickle as pickle
+import sys
+import traceback
+
+
+def main(job_path, result_path):
+    try:
+        with open(job_path, 'rb') as f:
+            job = pickle.load(f)
+        # Sets up the filetracker client of sioworkers like in the parent
+        # process.
+        from oioioi.filetracker.client import get_client
+        get_client()
+        from oioioi.sioworkers.backends import _run_job
+        result = (True, _run_job(job))
+    except BaseException:
+        result = (False, traceback.format_exc())
+    with open(result_path, 'wb') as f:
+        pickle.dump(result, f, pickle.HIGHEST_PROTOCOL)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,51 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from oioioi.sioworkers.jobs import _get_backend, pack_jobs, unpack_results
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('-n', '--jobs', type='int', dest='jobs', default=200,
+            help="Number of jobs to run"),
+        make_option('-t', '--batch-time', type='int', dest='batch_time',
+            default=2000,
+            help="Maximum total time limit of a batch, in milliseconds"),
+        make_option('-l', '--time-limit', type='int', dest='time_limit',
+            default=10,
+            help="Time limit of a single job, in milliseconds"),
+    )
+
+    help = "Measures the overhead of running many tiny sioworkers jobs " \
+           "separately and in batches (see SIOWORKERS_BATCH_MAX_TIME), " \
+           "using ping jobs and the configured SIOWORKERS_BACKEND."
+
+    requires_model_validation = False
+
+    def _run(self, jobs, max_time):
+        packed = pack_jobs(jobs, max_time=max_time)
+        start = time.time()
+        results = dict(unpack_results(
+                _get_backend().run_jobs_iter(packed)))
+        elapsed = time.time() - start
+        if sorted(results) != sorted(jobs):
+            raise CommandError("Some results are missing")
+        self.stdout.write("%-10s %6d jobs sent, %8.3f s, %7.2f ms per test"
+                % (max_time and 'batched' or 'separate', len(packed),
+                   elapsed, 1000 * elapsed / len(jobs)))
+        return elapsed
+
+    def handle(self, *args, **options):
+        if options['jobs'] <= 0:
+            raise CommandError("Number of jobs must be positive")
+        time_limit = options['time_limit']
+        jobs = dict(('job%d' % (i,), dict(job_type='ping', ping=str(i),
+                                          exec_time_limit=time_limit))
+                    for i in xrange(options['jobs']))
+
+        separate = self._run(jobs, 0)
+        batched = self._run(jobs, options['batch_time'])
+        self.stdout.write("Overhead reduction: %.1fx"
+                % (separate / max(batched, 1e-6),))
@@ -1,6 +1,15 @@
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
 from django.utils import unittest
 
-from oioioi.sioworkers.jobs import run_sioworkers_job, run_sioworkers_jobs
+from oioioi.filetracker.client import get_client
+from celery.exceptions import TimeoutError
+
+from oioioi.sioworkers.backends import ParallelLocalBackend, FakeBackend, \
+        CeleryBackend
+from oioioi.sioworkers.jobs import run_sioworkers_job, \
+        run_sioworkers_jobs, run_sioworkers_jobs_iter, pack_jobs, \
+        run_batch_job, unpack_results
 
 
 class TestSioworkersBindings(unittest.TestCase):
@@ -13,3 +22,216 @@ class TestSioworkersBindings(unittest.TestCase):
         self.assertEqual(envs['key1'].get('pong'), 'e1')
         self.assertEqual(envs['key2'].get('pong'), 'e2')
         self.assertEqual(len(envs), 2)
+
+    def test_sioworkers_results_streaming(self):
+        jobs = dict(('key%d' % i, dict(job_type='ping', ping='e%d' % i))
+                    for i in xrange(5))
+        results = list(run_sioworkers_jobs_iter(jobs))
+        self.assertEqual(len(results), 5)
+        for key, env in results:
+            self.assertEqual(env.get('pong'), jobs[key]['ping'])
+
+
+class TestParallelLocalBackend(unittest.TestCase):
+    def test_parallel_local_backend(self):
+        backend = ParallelLocalBackend()
+        env = backend.run_job(dict(job_type='ping', ping='e1'))
+        self.assertEqual(env.get('pong'), 'e1')
+
+        jobs = dict(('key%d' % i, dict(job_type='ping', ping='e%d' % i))
+                    for i in xrange(5))
+        envs = backend.run_jobs(jobs)
+        self.assertEqual(len(envs), 5)
+        for key, env in envs.iteritems():
+            self.assertEqual(env.get('pong'), jobs[key]['ping'])
+
+        results = dict(backend.run_jobs_iter(jobs,
+                skip_job=lambda key: key != 'key3'))
+        self.assertEqual(results.keys(), ['key3'])
+
+    def test_job_timeout(self):
+        backend = ParallelLocalBackend()
+        with override_settings(SIOWORKERS_LOCAL_JOB_TIMEOUT=0):
+            with self.assertRaisesRegexp(RuntimeError, 'killed'):
+                backend.run_job(dict(job_type='ping', ping='e1'))
+
+
+class TestFakeBackend(unittest.TestCase):
+    @override_settings(SIOWORKERS_FAKE_VERDICTS={'compile': {'OK': 1},
+                                                 'exec': {'TLE': 1}})
+    def test_fake_backend(self):
+        backend = FakeBackend()
+        env = backend.run_job(dict(job_type='compile', out_file='/fake/exe'))
+        self.assertEqual(env['result_code'], 'OK')
+        self.assertEqual(get_client().file_size('/fake/exe'), 0)
+
+        jobs = dict(('key%d' % i, dict(job_type='unsafe-exec',
+                                       exe_file='/fake/exe',
+                                       exec_time_limit=100))
+                    for i in xrange(3))
+        envs = backend.run_jobs(jobs)
+        self.assertEqual(sorted(envs), sorted(jobs))
+        for env in envs.itervalues():
+            self.assertEqual(env['result_code'], 'TLE')
+            self.assertEqual(env['time_used'], 100)
+        get_client().delete_file('/fake/exe')
+
+    @override_settings(SIOWORKERS_FAKE_VERDICTS={'compile': {'CE': 1},
+                                                 'exec': {'OK': 1}})
+    def test_fake_compilation_error(self):
+        env = FakeBackend().run_job(dict(job_type='compile',
+                                         out_file='/fake/exe'))
+        self.assertEqual(env['result_code'], 'CE')
+        self.assertEqual(env['out_file'], '/fake/exe')
+        self.assertTrue(env['compiler_output'])
+
+
+class _FakeAsyncResult(object):
+    def __init__(self, backend, key, job):
+        self.backend = backend
+        self.id = key
+        self.job = job
+        self.revoked = False
+
+    def ready(self):
+        self.backend.polls += 1
+        return self.backend.poll(self.id)
+
+    def get(self):
+        return dict(self.job, result_code='OK')
+
+    def revoke(self):
+        self.revoked = True
+
+
+class _FakeResultBackend(object):
+    """Simulates a result backend, in which every job finishes after it
+       has been polled as many times as its ``polls``.
+    """
+    def __init__(self):
+        self.polls = 0
+        self.counters = {}
+        self.jobs = {}
+
+    def poll(self, task_id):
+        self.counters[task_id] += 1
+        return self.counters[task_id] >= self.jobs[task_id]['polls']
+
+
+class _FakeManyResultBackend(_FakeResultBackend):
+    def __init__(self):
+        super(_FakeManyResultBackend, self).__init__()
+        self.get_many_calls = 0
+
+    def get_many(self, task_ids, timeout=None, interval=None):
+        self.get_many_calls += 1
+        finished = [task_id for task_id in task_ids if self.poll(task_id)]
+        for task_id in finished:
+            yield task_id, {'status': 'SUCCESS'}
+        if len(finished) < len(task_ids):
+            raise TimeoutError
+
+
+class _FakeCeleryBackend(CeleryBackend):
+    def __init__(self, result_backend):
+        self.result_backend = result_backend
+        self.groups = []
+
+    def _delayed_jobs(self, jobs, **kwargs):
+        self.groups.append(len(jobs))
+        results = []
+        for key, job in jobs:
+            self.result_backend.counters[key] = 0
+            self.result_backend.jobs[key] = job
+            results.append((key,
+                    _FakeAsyncResult(self.result_backend, key, job)))
+        return results
+
+
+@override_settings(SIOWORKERS_BATCH_SIZE=8, SIOWORKERS_POLL_INTERVAL=0,
+                   SIOWORKERS_MAX_POLL_INTERVAL=0)
+class TestCeleryBackend(SimpleTestCase):
+    def _run(self, result_backend, **kwargs):
+        jobs = dict(('key%d' % i, {'polls': 1 + i % 5}) for i in xrange(30))
+        backend = _FakeCeleryBackend(result_backend)
+        results = dict(backend.run_jobs_iter(jobs, **kwargs))
+        self.assertTrue(all(env['result_code'] == 'OK'
+                            for env in results.itervalues()))
+        self.assertLessEqual(max(backend.groups), 8)
+        # Slots are refilled only when at least a quarter of them is free.
+        self.assertGreaterEqual(min(backend.groups[:-1]), 2)
+        return results
+
+    def test_polling(self):
+        result_backend = _FakeResultBackend()
+        results = self._run(result_backend)
+        self.assertEqual(len(results), 30)
+
+    def test_get_many(self):
+        result_backend = _FakeManyResultBackend()
+        results = self._run(result_backend)
+        self.assertEqual(len(results), 30)
+        self.assertEqual(result_backend.polls, 0)
+        self.assertGreater(result_backend.get_many_calls, 0)
+
+    def test_skip_job(self):
+        results = self._run(_FakeManyResultBackend(),
+                skip_job=lambda key: key.endswith('7'))
+        self.assertEqual(len(results), 27)
+
+
+class TestJobBatches(unittest.TestCase):
+    def _make_jobs(self):
+        jobs = dict(('key%d' % i, dict(job_type='ping', ping='e%d' % i,
+                                       exec_time_limit=300))
+                    for i in xrange(5))
+        jobs['slow'] = dict(job_type='ping', ping='slow',
+                            exec_time_limit=5000)
+        jobs['nolimit'] = dict(job_type='ping', ping='nolimit')
+        return jobs
+
+    def test_pack_jobs(self):
+        jobs = self._make_jobs()
+        self.assertIs(pack_jobs(jobs, max_time=0), jobs)
+
+        packed = pack_jobs(jobs, max_time=1000)
+        self.assertEqual(len(packed), 4)
+        self.assertEqual(packed['slow'], jobs['slow'])
+        self.assertEqual(packed['nolimit'], jobs['nolimit'])
+        batches = [job for job in packed.itervalues()
+                   if job['job_type'] == 'batch']
+        self.assertEqual(sorted(len(batch['jobs']) for batch in batches),
+                [2, 3])
+
+        run_job = lambda job: dict(job, pong=job['ping'])
+        results = [(key, job['job_type'] == 'batch' and
+                         run_batch_job(job, run_job) or run_job(job))
+                   for key, job in packed.iteritems()]
+        results = dict(unpack_results(results))
+        self.assertEqual(sorted(results), sorted(jobs))
+        for key, env in results.iteritems():
+            self.assertEqual(env['pong'], jobs[key]['ping'])
+
+    def test_failed_job_in_batch(self):
+        def run_job(job):
+            if job['ping'] == 'fail':
+                raise RuntimeError('EXPECTED FAILURE')
+            return dict(job, pong=job['ping'])
+
+        job = {'job_type': 'batch', 'jobs': {
+            'ok': dict(job_type='ping', ping='ok'),
+            'fail': dict(job_type='ping', ping='fail'),
+        }}
+        results = dict(unpack_results([('__batch0',
+                                        run_batch_job(job, run_job))]))
+        self.assertEqual(results['ok']['pong'], 'ok')
+        self.assertEqual(results['fail']['result_code'], 'SE')
+        self.assertIn('EXPECTED FAILURE', results['fail']['result_string'])
+
+    @override_settings(SIOWORKERS_BATCH_MAX_TIME=1000)
+    def test_batched_results_streaming(self):
+        jobs = self._make_jobs()
+        results = dict(run_sioworkers_jobs_iter(jobs))
+        self.assertEqual(sorted(results), sorted(jobs))
+        for key, env in results.iteritems():
+            self.assertEqual(env.get('pong'), jobs[key]['ping'])
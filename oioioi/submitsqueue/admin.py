@@ -3,12 +3,15 @@ from django.core.urlresolvers import reverse
 from django.contrib.admin import SimpleListFilter
 from django.utils.encoding import force_unicode
 from django.db import transaction
+from django.db.models import Count, Min
 
 from oioioi.base import admin
 from oioioi.base.admin import system_admin_menu_registry
 from oioioi.base.utils import make_html_link
 from oioioi.contests.menu import contest_admin_menu_registry
-from oioioi.submitsqueue.models import QueuedSubmit
+from oioioi.submitsqueue.models import QueuedSubmit, queued_submit_kinds
+from oioioi.submitsqueue.scheduler import is_fair_scheduling_enabled, \
+        get_max_in_flight
 
 
 class UserListFilter(SimpleListFilter):
@@ -59,11 +62,12 @@ class ProblemNameListFilter(SimpleListFilter):
 
 
 class SystemSubmitsQueueAdmin(admin.ModelAdmin):
-    list_display = ['submit_id', 'colored_state', 'contest',
+    list_display = ['submit_id', 'colored_state', 'kind', 'contest',
                     'problem_instance', 'user', 'creation_date',
                     'celery_task_id']
-    list_filter = ['state', ProblemNameListFilter]
+    list_filter = ['state', 'kind', ProblemNameListFilter]
     actions = ['remove_from_queue', 'delete_selected']
+    change_list_template = 'submitsqueue/admin/change_list.html'
 
     def __init__(self, *args, **kwargs):
         super(SystemSubmitsQueueAdmin, self).__init__(*args, **kwargs)
@@ -112,7 +116,7 @@ class SystemSubmitsQueueAdmin(admin.ModelAdmin):
 
     def colored_state(self, instance):
         subm_state = 'in_progress'
-        if instance.state == 'QUEUED':
+        if instance.state in ('WAITING', 'QUEUED'):
             subm_state = 'queued'
         return '<span class="subm_admin subm_%s">%s</span>' % \
             (subm_state, force_unicode(instance.get_state_display()))
@@ -123,6 +127,10 @@ class SystemSubmitsQueueAdmin(admin.ModelAdmin):
     @transaction.commit_on_success
     def remove_from_queue(self, request, queryset):
         for obj in queryset:
+            if obj.state == 'WAITING':
+                # Not sent to evalmgr yet, so nobody else would delete it.
+                obj.delete()
+                continue
             obj.state = 'CANCELLED'
             obj.save()
     remove_from_queue.short_description = \
@@ -132,6 +140,31 @@ class SystemSubmitsQueueAdmin(admin.ModelAdmin):
         qs = super(SystemSubmitsQueueAdmin, self).queryset(request)
         return qs.exclude(state='CANCELLED')
 
+    def get_queue_depth(self, request):
+        """Returns the numbers of submits of each kind in each state and
+           the creation date of the oldest waiting one.
+        """
+        depth = dict((kind, {'kind': name, 'WAITING': 0, 'QUEUED': 0,
+                             'PROGRESS': 0, 'oldest_waiting': None})
+                     for kind, name in queued_submit_kinds.entries)
+        for row in self.queryset(request).values('kind', 'state') \
+                .annotate(count=Count('id'), oldest=Min('creation_date')):
+            kind_depth = depth.get(row['kind'])
+            if kind_depth is None or row['state'] not in kind_depth:
+                continue
+            kind_depth[row['state']] = row['count']
+            if row['state'] == 'WAITING':
+                kind_depth['oldest_waiting'] = row['oldest']
+        return [depth[kind] for kind, _name in queued_submit_kinds.entries]
+
+    def changelist_view(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        extra_context['queue_depth'] = self.get_queue_depth(request)
+        if is_fair_scheduling_enabled():
+            extra_context['max_in_flight'] = get_max_in_flight()
+        return super(SystemSubmitsQueueAdmin, self) \
+                .changelist_view(request, extra_context)
+
     def has_delete_permission(self, request, obj=None):
         return True
 
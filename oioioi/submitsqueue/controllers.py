@@ -1,5 +1,8 @@
 from oioioi.programs.controllers import ProgrammingContestController
+from oioioi.programs.models import ModelProgramSubmission
 from oioioi.submitsqueue.models import QueuedSubmit
+from oioioi.submitsqueue.scheduler import is_fair_scheduling_enabled, \
+        queue_submission, release_queued_submits
 
 
 class SubmitsQueueContestControllerMixin(object):
@@ -19,6 +22,28 @@ class SubmitsQueueContestControllerMixin(object):
                 'remove_submission_on_error',
                 'oioioi.submitsqueue.handlers.remove_submission_on_error'))
 
+    def get_queued_submit_kind(self, submission, environ):
+        """Returns the kind of
+           :class:`~oioioi.submitsqueue.models.QueuedSubmit` used for
+           scheduling the evaluation of the submission.
+        """
+        if submission.kind == 'TESTRUN':
+            return 'TESTRUN'
+        if isinstance(submission, ModelProgramSubmission) or \
+                ModelProgramSubmission.objects \
+                    .filter(id=submission.id).exists():
+            return 'MODEL'
+        if environ.get('is_rejudge'):
+            return 'REJUDGE'
+        return 'NORMAL'
+
+    def enqueue_evaluation(self, submission, environ):
+        if not is_fair_scheduling_enabled():
+            return super(SubmitsQueueContestControllerMixin, self) \
+                    .enqueue_evaluation(submission, environ)
+        queue_submission(submission, environ,
+                self.get_queued_submit_kind(submission, environ))
+
     def submission_queued(self, submission, async_result):
         super(SubmitsQueueContestControllerMixin, self).\
             submission_queued(submission, async_result)
@@ -30,6 +55,8 @@ class SubmitsQueueContestControllerMixin(object):
             submission_unqueued(submission, job_id)
         QueuedSubmit.objects.filter(submission=submission,
                                     celery_task_id=job_id).delete()
+        if is_fair_scheduling_enabled():
+            release_queued_submits()
 
 
 ProgrammingContestController.mix_in(SubmitsQueueContestControllerMixin)
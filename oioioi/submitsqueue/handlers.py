@@ -2,11 +2,14 @@ from celery.exceptions import Ignore
 from django.db import transaction
 
 from oioioi.submitsqueue.models import QueuedSubmit
+from oioioi.submitsqueue.scheduler import is_fair_scheduling_enabled, \
+        release_queued_submits
 from oioioi.contests.models import Submission
 
 
 @transaction.commit_manually
-def mark_submission_in_progress(env, **kwargs):
+def _mark_submission_in_progress(env):
+    """Returns ``False`` if the evaluation has been cancelled."""
     try:
         submission = Submission.objects.get(id=env['submission_id'])
         qs, _created = QueuedSubmit.objects.get_or_create(
@@ -14,11 +17,19 @@ def mark_submission_in_progress(env, **kwargs):
 
         if qs.state == 'CANCELLED':
             qs.delete()
-            raise Ignore
+            return False
         qs.state = 'PROGRESS'
         qs.save()
+        return True
     finally:
         transaction.commit()
+
+
+def mark_submission_in_progress(env, **kwargs):
+    if not _mark_submission_in_progress(env):
+        if is_fair_scheduling_enabled():
+            release_queued_submits()
+        raise Ignore
     return env
 
 
@@ -33,7 +44,9 @@ def update_celery_task_id(env, **kwargs):
     return env
 
 
-@transaction.commit_on_success
 def remove_submission_on_error(env, **kwargs):
-    QueuedSubmit.objects.filter(celery_task_id=env['job_id']).delete()
+    with transaction.commit_on_success():
+        QueuedSubmit.objects.filter(celery_task_id=env['job_id']).delete()
+    if is_fair_scheduling_enabled():
+        release_queued_submits()
     return env
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import ugettext as _
+
+from oioioi.submitsqueue.scheduler import is_fair_scheduling_enabled, \
+        reclaim_lost_submits
+
+
+class Command(BaseCommand):
+    help = _("Deletes the queued submits which have been in progress for "
+             "longer than SUBMITSQUEUE_IN_FLIGHT_TIMEOUT and releases "
+             "waiting submits to evalmgr. Should be run periodically "
+             "(e.g. every minute from cron) when SUBMITSQUEUE_FAIR_SCHEDULING "
+             "is enabled.")
+
+    requires_model_validation = True
+
+    def handle(self, *args, **options):
+        if args:
+            raise CommandError(_("Unexpected arguments"))
+        if not is_fair_scheduling_enabled():
+            raise CommandError(_("SUBMITSQUEUE_FAIR_SCHEDULING is disabled"))
+        reclaimed = reclaim_lost_submits()
+        self.stdout.write(_("%d lost submits reclaimed\n") % (reclaimed,))
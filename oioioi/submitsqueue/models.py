@@ -1,3 +1,6 @@
+import base64
+import cPickle as pickle
+
 from django.db import models
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
@@ -7,20 +10,41 @@ from oioioi.base.fields import EnumRegistry, EnumField
 
 
 submission_states = EnumRegistry()
+submission_states.register('WAITING', _("Waiting"))
 submission_states.register('QUEUED', _("Queued"))
 submission_states.register('PROGRESS', _("In progress"))
 submission_states.register('CANCELLED', _("Cancelled"))
 
+# Kinds of evaluations, used by the scheduler to weigh them
+# (see settings.SUBMITSQUEUE_KIND_WEIGHTS).
+queued_submit_kinds = EnumRegistry()
+queued_submit_kinds.register('NORMAL', _("Normal"))
+queued_submit_kinds.register('REJUDGE', _("Rejudge"))
+queued_submit_kinds.register('MODEL', _("Model solution"))
+queued_submit_kinds.register('TESTRUN', _("Test run"))
+
 
 class QueuedSubmit(models.Model):
     submission = models.ForeignKey(Submission)
-    state = EnumField(submission_states, default='QUEUED')
+    state = EnumField(submission_states, default='QUEUED', db_index=True)
     creation_date = models.DateTimeField(default=timezone.now)
     celery_task_id = models.CharField(max_length=50, unique=True, null=True,
                                       blank=True)
+    kind = EnumField(queued_submit_kinds, default='NORMAL')
+    release_date = models.DateTimeField(null=True, blank=True)
+    # Evaluation environment of a submission waiting to be released to
+    # evalmgr, see oioioi.submitsqueue.scheduler.
+    serialized_environ = models.TextField(blank=True)
 
     creation_date.short_description = _("Creation date")
 
     class Meta(object):
         verbose_name = _("Queued Submit")
         ordering = ['pk']
+
+    def get_environ(self):
+        return pickle.loads(base64.b64decode(self.serialized_environ))
+
+    def set_environ(self, env):
+        self.serialized_environ = base64.b64encode(
+                pickle.dumps(env, pickle.HIGHEST_PROTOCOL))
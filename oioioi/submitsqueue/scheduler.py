@@ -0,0 +1,216 @@
+"""Fair-share scheduling of evaluations.
+
+   If ``settings.SUBMITSQUEUE_FAIR_SCHEDULING`` is set, submissions to be
+   judged are not sent to evalmgr right away. Instead they are stored as
+   ``WAITING`` :class:`~oioioi.submitsqueue.models.QueuedSubmit` objects and
+   released, at most ``SUBMITSQUEUE_MAX_IN_FLIGHT`` at a time, in an order
+   which shares evalmgr fairly between contests and, within a contest,
+   between users.
+
+   Each released evaluation is charged to its contest and to its user
+   with the cost of ``1 / weight``, where the weight depends on the kind
+   of the evaluation (see ``settings.SUBMITSQUEUE_KIND_WEIGHTS``). The next
+   released evaluation is the one whose contest, and then user, would have
+   the lowest total cost, so that a single user sending many submissions
+   (or a rejudge) does not delay the others.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from celery.utils import uuid
+from django.conf import settings
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from oioioi import evalmgr
+from oioioi.contests.controllers import get_evalmgr_job_options
+from oioioi.submitsqueue.models import QueuedSubmit
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_fair_scheduling_enabled():
+    return settings.SUBMITSQUEUE_FAIR_SCHEDULING
+
+
+def get_max_in_flight():
+    """Returns the maximum number of evaluations released to evalmgr at
+       a time.
+    """
+    return settings.SUBMITSQUEUE_MAX_IN_FLIGHT or \
+            2 * settings.EVALMGR_CONCURRENCY
+
+
+def _kind_weight(kind):
+    return float(settings.SUBMITSQUEUE_KIND_WEIGHTS.get(kind, 1))
+
+
+def _in_flight():
+    # Submits released long ago are most probably lost (e.g. because of
+    # a worker crash) and should not block the queue forever.
+    timeout = timezone.now() - \
+            timedelta(seconds=settings.SUBMITSQUEUE_IN_FLIGHT_TIMEOUT)
+    return QueuedSubmit.objects.filter(state__in=['QUEUED', 'PROGRESS'],
+            release_date__gte=timeout)
+
+
+def queue_submission(submission, environ, kind):
+    """Stores the evaluation environment of the submission until it is
+       released to evalmgr.
+    """
+    queued_submit = QueuedSubmit(submission=submission, state='WAITING',
+            kind=kind)
+    queued_submit.set_environ(environ)
+    queued_submit.save()
+    release_queued_submits()
+
+
+def reclaim_lost_submits():
+    """Deletes the released submits which have been in progress for
+       longer than ``settings.SUBMITSQUEUE_IN_FLIGHT_TIMEOUT`` (most
+       probably lost, e.g. because of a worker crash) and releases waiting
+       submits in their place.
+
+       Returns the number of the deleted submits.
+    """
+    timeout = timezone.now() - \
+            timedelta(seconds=settings.SUBMITSQUEUE_IN_FLIGHT_TIMEOUT)
+    lost = QueuedSubmit.objects.filter(state__in=['QUEUED', 'PROGRESS'],
+            release_date__lt=timeout)
+    count = lost.count()
+    if count:
+        logger.warning("Reclaiming %d lost queued submits", count)
+        lost.delete()
+    release_queued_submits()
+    return count
+
+
+def _claim(queued_submit_id):
+    """Marks the waiting submit as released. Returns the id of its celery
+       task, or ``None`` if it has already been released (or cancelled) by
+       someone else.
+    """
+    task_id = uuid()
+    if not QueuedSubmit.objects.filter(id=queued_submit_id, state='WAITING') \
+            .update(state='QUEUED', celery_task_id=task_id,
+                    release_date=timezone.now()):
+        return None
+    return task_id
+
+
+def _unclaim(queued_submit_id):
+    QueuedSubmit.objects.filter(id=queued_submit_id) \
+            .update(state='WAITING', celery_task_id=None, release_date=None)
+
+
+def _has_free_slot(queued_submit_id):
+    """Checks if the claimed submit fits in the limit of evaluations in
+       progress.
+
+       Callers releasing submits concurrently may all have seen the same
+       free slot, so the claimed submits are ordered by their release
+       date (and id) and only the first ones fitting in the limit are
+       sent.
+    """
+    release_date = QueuedSubmit.objects.filter(id=queued_submit_id) \
+            .values_list('release_date', flat=True)[0]
+    earlier = _in_flight().filter(Q(release_date__lt=release_date) |
+            Q(release_date=release_date, id__lt=queued_submit_id)).count()
+    return earlier < get_max_in_flight()
+
+
+def _send(queued_submit_id, task_id):
+    queued_submit = QueuedSubmit.objects.select_related('submission') \
+            .get(id=queued_submit_id)
+    submission = queued_submit.submission
+    environ = queued_submit.get_environ()
+    controller = submission.problem_instance.contest.controller
+    # The submit is already marked as sent, as the evaluation may finish
+    # before apply_async returns.
+    controller.submission_queued(submission,
+            evalmgr.evalmgr_job.AsyncResult(task_id))
+    try:
+        evalmgr.evalmgr_job.apply_async((environ,), task_id=task_id,
+                **get_evalmgr_job_options(environ))
+    except Exception:
+        _unclaim(queued_submit_id)
+        raise
+
+
+_GROUP_FIELDS = ('kind', 'submission__problem_instance__contest',
+                 'submission__user')
+
+
+def _first_waiting():
+    """Returns the first waiting submit of each kind of each user in each
+       contest, as tuples ``(id, kind, contest_id, user_id)``.
+
+       The scheduler always picks the first submit of such a group, so it
+       does not need to look at the whole queue.
+    """
+    return [(row['first_id'],) + tuple(row[f] for f in _GROUP_FIELDS)
+            for row in QueuedSubmit.objects.filter(state='WAITING')
+                .values(*_GROUP_FIELDS).annotate(first_id=Min('id'))
+                .order_by()]
+
+
+def _next_waiting(entry):
+    """Returns the waiting submit following ``entry`` in its group, or
+       ``None``.
+    """
+    queued_submit_id, kind, contest_id, user_id = entry
+    next_ids = QueuedSubmit.objects.filter(state='WAITING', kind=kind,
+            submission__problem_instance__contest=contest_id,
+            submission__user=user_id, id__gt=queued_submit_id) \
+            .order_by('id').values_list('id', flat=True)[:1]
+    if not next_ids:
+        return None
+    return (next_ids[0], kind, contest_id, user_id)
+
+
+def release_queued_submits():
+    """Releases as many waiting submits as the limit of evaluations in
+       progress allows, in the fair-share order.
+    """
+    in_flight = list(_in_flight().values_list(*_GROUP_FIELDS))
+    free_slots = get_max_in_flight() - len(in_flight)
+    if free_slots <= 0:
+        return 0
+
+    contest_costs = defaultdict(float)
+    user_costs = defaultdict(float)
+    for kind, contest_id, user_id in in_flight:
+        contest_costs[contest_id] += 1 / _kind_weight(kind)
+        user_costs[(contest_id, user_id)] += 1 / _kind_weight(kind)
+
+    def cost(entry):
+        queued_submit_id, kind, contest_id, user_id = entry
+        charge = 1 / _kind_weight(kind)
+        return (contest_costs[contest_id] + charge,
+                user_costs[(contest_id, user_id)] + charge,
+                queued_submit_id)
+
+    waiting = _first_waiting()
+    released = 0
+    while waiting and released < free_slots:
+        entry = min(waiting, key=cost)
+        waiting.remove(entry)
+        next_entry = _next_waiting(entry)
+        if next_entry is not None:
+            waiting.append(next_entry)
+        queued_submit_id, kind, contest_id, user_id = entry
+        task_id = _claim(queued_submit_id)
+        if task_id is None:
+            continue
+        if not _has_free_slot(queued_submit_id):
+            _unclaim(queued_submit_id)
+            break
+        _send(queued_submit_id, task_id)
+        logger.debug("Released queued submit %d (%s) of user %s in "
+                "contest %s", queued_submit_id, kind, user_id, contest_id)
+        contest_costs[contest_id] += 1 / _kind_weight(kind)
+        user_costs[(contest_id, user_id)] += 1 / _kind_weight(kind)
+        released += 1
+    return released
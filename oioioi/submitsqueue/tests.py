@@ -1,10 +1,20 @@
+from datetime import timedelta
+from StringIO import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.test.utils import override_settings
 from django.core.urlresolvers import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
 from celery.exceptions import Ignore
 
 from oioioi.submitsqueue.models import QueuedSubmit
-from oioioi.submitsqueue.handlers import mark_submission_in_progress
-from oioioi.contests.models import Submission, Contest
+from oioioi.submitsqueue.handlers import mark_submission_in_progress, \
+        remove_submission_on_error
+from oioioi.submitsqueue.scheduler import release_queued_submits, \
+        _has_free_slot
+from oioioi.contests.models import Submission, Contest, ProblemInstance
 from oioioi.programs.controllers import ProgrammingContestController
 
 
@@ -97,3 +107,102 @@ class TestEval(TestCase):
 
         with self.assertRaises(Ignore):
             mark_submission_in_progress(env)
+
+
+@override_settings(SUBMITSQUEUE_FAIR_SCHEDULING=True,
+                   SUBMITSQUEUE_MAX_IN_FLIGHT=2)
+class TestFairScheduling(TestCase):
+    fixtures = ['test_users', 'test_contest', 'test_full_package',
+                'test_submission']
+
+    def _queue(self, username, kind='NORMAL', state='WAITING'):
+        submission = Submission.objects.create(
+                problem_instance=ProblemInstance.objects.get(),
+                user=User.objects.get(username=username))
+        qs = QueuedSubmit(submission=submission, kind=kind, state=state)
+        if state == 'WAITING':
+            qs.set_environ({'recipe': []})
+        else:
+            qs.release_date = timezone.now()
+        qs.save()
+        return qs
+
+    def _released(self):
+        return [(qs.submission.user.username, qs.kind) for qs in
+                QueuedSubmit.objects.filter(state='QUEUED')
+                    .order_by('release_date', 'id')]
+
+    def test_fair_release(self):
+        spam = [self._queue('test_user') for _i in xrange(3)]
+        self._queue('test_user3', kind='REJUDGE')
+        self._queue('test_user2')
+
+        self.assertEqual(release_queued_submits(), 2)
+        self.assertEqual(self._released(), [('test_user', 'NORMAL'),
+                                             ('test_user2', 'NORMAL')])
+        self.assertEqual(release_queued_submits(), 0)
+
+        QueuedSubmit.objects.filter(id=spam[0].id).delete()
+        release_queued_submits()
+        self.assertEqual(QueuedSubmit.objects.get(id=spam[1].id).state,
+                         'QUEUED')
+
+        QueuedSubmit.objects.filter(state='QUEUED').delete()
+        release_queued_submits()
+        self.assertEqual(sorted(self._released()),
+                         [('test_user', 'NORMAL'),
+                          ('test_user3', 'REJUDGE')])
+
+    def test_release_after_error(self):
+        running = self._queue('test_user2', state='PROGRESS')
+        running.celery_task_id = 'job'
+        running.save()
+        self._queue('test_user2', state='QUEUED')
+        waiting = self._queue('test_user')
+        remove_submission_on_error({'job_id': 'job'})
+        self.assertFalse(QueuedSubmit.objects.filter(id=running.id).exists())
+        self.assertEqual(QueuedSubmit.objects.get(id=waiting.id).state,
+                         'QUEUED')
+
+    def test_reclaim_lost_submits(self):
+        lost = self._queue('test_user2', state='PROGRESS')
+        QueuedSubmit.objects.filter(id=lost.id).update(
+                release_date=timezone.now() - timedelta(days=1))
+        self._queue('test_user2', state='QUEUED')
+        waiting = self._queue('test_user')
+        out = StringIO()
+        call_command('release_queued_submits', stdout=out)
+        self.assertIn('1 lost', out.getvalue())
+        self.assertFalse(QueuedSubmit.objects.filter(id=lost.id).exists())
+        self.assertEqual(QueuedSubmit.objects.get(id=waiting.id).state,
+                         'QUEUED')
+
+    def test_concurrent_release(self):
+        self._queue('test_user2', state='QUEUED')
+        self._queue('test_user2', state='QUEUED')
+        # Claimed by a concurrent caller which has seen a free slot.
+        waiting = self._queue('test_user')
+        QueuedSubmit.objects.filter(id=waiting.id).update(state='QUEUED',
+                release_date=timezone.now() + timedelta(seconds=1))
+        self.assertFalse(_has_free_slot(waiting.id))
+
+    def test_enqueue_evaluation(self):
+        self._queue('test_user2', state='PROGRESS')
+        self._queue('test_user2', state='QUEUED')
+        submission = Submission.objects.get(pk=1)
+        controller = submission.problem_instance.contest.controller
+        controller.enqueue_evaluation(submission,
+                {'recipe': [], 'is_rejudge': True})
+        qs = QueuedSubmit.objects.get(submission=submission)
+        self.assertEqual(qs.state, 'WAITING')
+        self.assertEqual(qs.kind, 'REJUDGE')
+        self.assertEqual(qs.get_environ()['recipe'], [])
+
+        self.client.login(username='test_admin')
+        response = self.client.get(reverse(
+                'oioioiadmin:submitsqueue_queuedsubmit_changelist'))
+        depth = dict((row['kind'], row)
+                     for row in response.context['queue_depth'])
+        self.assertEqual(depth['Rejudge']['WAITING'], 1)
+        self.assertEqual(depth['Normal']['PROGRESS'], 1)
+        self.assertEqual(response.context['max_in_flight'], 2)
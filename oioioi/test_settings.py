@@ -73,6 +73,8 @@ COMPLAINTS_SUBJECT_PREFIX = '[oioioi-complaints] '
 
 WARN_ABOUT_REPEATED_SUBMISSION = False
 
+RANKING_RECALCULATION_DEBOUNCE = 0
+
 ZEUS_INSTANCES = {
     'zeus_correct': ('__use_object__',
                      'oioioi.zeus.tests.ZeusCorrectServer', ''),
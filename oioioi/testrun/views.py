@@ -77,7 +77,7 @@ def download_input_file_view(request, contest_id, submission_id):
     submission = get_submission_or_error(request, contest_id, submission_id,
                                          TestRunProgramSubmission)
 
-    return stream_file(submission.input_file, name='input.in')
+    return stream_file(submission.input_file, name='input.in', request=request)
 
 
 @enforce_condition(contest_exists & can_enter_contest)
@@ -107,4 +107,4 @@ def download_output_file_view(request, contest_id, submission_id,
     submission = get_submission_or_error(request, contest_id, submission_id,
                                          TestRunProgramSubmission)
     result = get_testrun_report_or_404(request, submission, testrun_report_id)
-    return stream_file(result.output_file, name='output.out')
+    return stream_file(result.output_file, name='output.out', request=request)
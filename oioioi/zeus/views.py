@@ -38,7 +38,7 @@ def download_library_file_view(request, contest_id, submission_id):
             ZeusTestRunProgramSubmission)
 
     # TODO: filename
-    return stream_file(submission.library_file, name='lib.h')
+    return stream_file(submission.library_file, name='lib.h', request=request)
 
 
 @enforce_condition(contest_exists & can_enter_contest)
@@ -77,4 +77,4 @@ def download_output_file_view(request, contest_id, submission_id,
         file = zeus_server.download_output(int(result.full_out_handle))
         result.output_file.save('full_out', ContentFile(file))
 
-    return stream_file(result.output_file, name='output.out')
+    return stream_file(result.output_file, name='output.out', request=request)